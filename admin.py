@@ -6,8 +6,11 @@ __license__ = 'GPLv3, see LICENSE'
 
 __all__ = [
     'api_admin_has_access',
+    'rule_admin_api_metrics',
 ]
 
+import os
+
 from util import *
 
 
@@ -27,3 +30,34 @@ def api_admin_has_access(ctx):
     in_priv_group = user.is_member_of(ctx, "priv-admin")
 
     return is_admin or in_priv_group
+
+
+@rule.make(inputs=[0], outputs=[1])
+def rule_admin_api_metrics(ctx, reset):
+    """Summarize recorded API metrics (see the api_metrics_file configuration option) to the log.
+
+    :param ctx:   Combined type of a ctx and rei struct
+    :param reset: Whether to remove the recorded metrics after summarizing ('1')
+
+    :returns: JSON summary of API metrics, per API
+    """
+    if user.user_type(ctx) != 'rodsadmin':
+        log.write(ctx, "API metrics - Insufficient permissions - should only be called by rodsadmin")
+        return '{}'
+
+    if not config.api_metrics_file or not os.path.isfile(config.api_metrics_file):
+        log.write(ctx, "API metrics - No metrics recorded")
+        return '{}'
+
+    summary = api.metrics_summary(config.api_metrics_file)
+
+    # Slowest APIs first.
+    for name, s in sorted(summary.items(), key=lambda x: x[1]['time_total'], reverse=True):
+        log.write(ctx, "API metrics - {}: {} calls, {} errors, avg {}ms, max {}ms, avg {:.1f} genqueries (+{:.1f} pages), avg {:.1f} msi calls, histogram {}".format(
+            name, s['calls'], s['errors'], s['time_avg'], s['time_max'], s['genquery_avg'], s['genquery_pages_avg'], s['msi_avg'],
+            ' '.join('{}ms:{}'.format(k, v) for k, v in s['histogram'].items())))
+
+    if reset == '1':
+        os.remove(config.api_metrics_file)
+
+    return jsonutil.dump(summary, separators=(',', ':'))
@@ -1,11 +1,12 @@
 # -*- coding: utf-8 -*-
 """Functions for token management."""
 
-__copyright__ = 'Copyright (c) 2021, Utrecht University'
+__copyright__ = 'Copyright (c) 2021-2024, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
 import os
 import secrets
+import threading
 from datetime import datetime, timedelta
 from traceback import print_exc
 
@@ -18,6 +19,54 @@ __all__ = ['api_token_generate',
            'api_token_delete',
            'api_token_delete_expired']
 
+# Connection to the token database, reused for all token operations in this process.
+# Opening the encrypted database (PRAGMA key) involves an expensive key derivation.
+# The connection is process-local and may only be used by the thread that opened it
+# (sqlite3 check_same_thread), so a call from another thread opens a new connection.
+_connection = None
+_connection_key = None
+
+
+def _connect():
+    """Get a connection to the token database, reusing the connection of this process if possible.
+
+    Statements executed on the connection are prepared once and cached by sqlite.
+    The connection is only reused by the thread that opened it.
+
+    :returns: Keyed connection to the token database
+    """
+    global _connection, _connection_key
+
+    key = (config.token_database, config.token_database_password, threading.current_thread().ident)
+    if _connection is not None and _connection_key == key:
+        return _connection
+
+    _disconnect()
+    conn = sqlite3.connect(config.token_database)
+    try:
+        conn.execute("PRAGMA key='%s'" % (config.token_database_password))
+        with conn:
+            conn.execute('''CREATE INDEX IF NOT EXISTS tokens_user_label ON tokens (user, label)''')
+            conn.execute('''CREATE INDEX IF NOT EXISTS tokens_exp_time ON tokens (exp_time)''')
+    except Exception:
+        conn.close()
+        raise
+
+    _connection, _connection_key = conn, key
+    return conn
+
+
+def _disconnect():
+    """Close the cached connection to the token database, e.g. after an error."""
+    global _connection, _connection_key
+
+    if _connection is not None:
+        try:
+            _connection.close()
+        except Exception:
+            pass
+    _connection, _connection_key = None, None
+
 
 @api.make()
 def api_token_generate(ctx, label=None):
@@ -42,24 +91,20 @@ def api_token_generate(ctx, label=None):
     gen_time = datetime.now()
     token_lifetime = timedelta(hours=config.token_lifetime)
     exp_time = gen_time + token_lifetime
-    conn = sqlite3.connect(config.token_database)
     result = None
 
     try:
+        conn = _connect()
         with conn:
-            conn.execute("PRAGMA key='%s'" % (config.token_database_password))
             conn.execute('''INSERT INTO tokens VALUES (?, ?, ?, ?, ?)''', (user_id, label, token, gen_time, exp_time))
             result = token
     except sqlite3.IntegrityError:
         result = api.Error('TokenExistsError', 'Token with this label already exists')
     except Exception:
         print_exc()
+        _disconnect()
         result = api.Error('DatabaseError', 'Error occurred while writing to database')
 
-    # Connection object used as context manager only commits or rollbacks transactions,
-    # so the connection object should be closed manually
-    conn.close()
-
     return result
 
 
@@ -76,12 +121,11 @@ def api_token_load(ctx):
         return api.Error('DatabaseError', 'Internal error: token database unavailable')
 
     user_id = user.name(ctx)
-    conn = sqlite3.connect(config.token_database)
     result = []
 
     try:
+        conn = _connect()
         with conn:
-            conn.execute("PRAGMA key='%s'" % (config.token_database_password))
             for row in conn.execute('''SELECT label, exp_time FROM tokens WHERE user=:user_id AND exp_time > :now''',
                                     {"user_id": user_id, "now": datetime.now()}):
                 exp_time = datetime.strptime(row[1], '%Y-%m-%d %H:%M:%S.%f')
@@ -89,12 +133,9 @@ def api_token_load(ctx):
                 result.append({"label": row[0], "exp_time": exp_time})
     except Exception:
         print_exc()
+        _disconnect()
         result = api.Error('DatabaseError', 'Error occurred while reading database')
 
-    # Connection object used as context manager only commits or rollbacks transactions,
-    # so the connection object should be closed manually
-    conn.close()
-
     return result
 
 
@@ -111,22 +152,18 @@ def api_token_delete(ctx, label):
         return api.Error('DatabaseError', 'Internal error: token database unavailable')
 
     user_id = user.name(ctx)
-    conn = sqlite3.connect(config.token_database)
     result = None
 
     try:
+        conn = _connect()
         with conn:
-            conn.execute("PRAGMA key='%s'" % (config.token_database_password))
             conn.execute('''DELETE FROM tokens WHERE user = ? AND label = ?''', (user_id, label))
             result = api.Result.ok()
     except Exception:
         print_exc()
+        _disconnect()
         result = api.Error('DatabaseError', 'Error during deletion from database')
 
-    # Connection object used as context manager only commits or rollbacks transactions,
-    # so the connection object should be closed manually
-    conn.close()
-
     return result
 
 
@@ -142,22 +179,18 @@ def api_token_delete_expired(ctx):
         return api.Error('DatabaseError', 'Internal error: token database unavailable')
 
     user_id = user.name(ctx)
-    conn = sqlite3.connect(config.token_database)
     result = None
 
     try:
+        conn = _connect()
         with conn:
-            conn.execute("PRAGMA key='%s'" % (config.token_database_password))
             conn.execute('''DELETE FROM tokens WHERE user = ? AND exp_time < ? ''', (user_id, datetime.now()))
             result = api.Result.ok()
     except Exception:
         print_exc()
+        _disconnect()
         result = api.Error('DatabaseError', 'Error during deletion from database')
 
-    # Connection object used as context manager only commits or rollbacks transactions,
-    # so the connection object should be closed manually
-    conn.close()
-
     return result
 
 
@@ -174,22 +207,18 @@ def get_all_tokens(ctx):
     if not token_database_initialized():
         return []
 
-    conn = sqlite3.connect(config.token_database)
     result = []
     try:
+        conn = _connect()
         with conn:
-            conn.execute("PRAGMA key='%s'" % (config.token_database_password))
             for row in conn.execute('''SELECT user, label, exp_time FROM tokens WHERE exp_time > :now''',
                                     {"now": datetime.now()}):
                 result.append({"user": row[0], "label": row[1], "exp_time": row[2]})
     except Exception:
         print_exc()
+        _disconnect()
         result = api.Error('DatabaseError', 'Error occurred while reading database')
 
-    # Connection object used as context manager only commits or rollbacks transactions,
-    # so the connection object should be closed manually
-    conn.close()
-
     return result
 
 
@@ -774,20 +774,6 @@ def api_datarequest_browse(ctx, sort_on='name', sort_order='asc', offset=0, limi
                 'create_time': int(x['COLL_CREATE_TIME']),
                 'status':      x['META_DATA_ATTR_VALUE']}
 
-    def transform_title(row):
-        # Remove ORDER_BY etc. wrappers from column names.
-        x = {re.sub('.*\((.*)\)', '\\1', k): v for k, v in row.items()}
-
-        return {'id':          x['COLL_NAME'].split('/')[-1],
-                'title':       x['META_DATA_ATTR_VALUE']}
-
-    def transform_status(row):
-        # Remove ORDER_BY etc. wrappers from column names.
-        x = {re.sub('.*\((.*)\)', '\\1', k): v for k, v in row.items()}
-
-        return {'id':          x['COLL_NAME'].split('/')[-1],
-                'status':      x['META_DATA_ATTR_VALUE']}
-
     if sort_on == 'modified':
         # FIXME: Sorting on modify date is borked: There appears to be no
         # reliable way to filter out replicas this way - multiple entries for
@@ -796,7 +782,8 @@ def api_datarequest_browse(ctx, sort_on='name', sort_order='asc', offset=0, limi
         # We would want to take the max modify time *per* data name.
         # (or not? replication may take place a long time after a modification,
         #  resulting in a 'too new' date)
-        ccols = ['COLL_NAME', 'ORDER(COLL_CREATE_TIME)', "COLL_OWNER_NAME", "META_DATA_ATTR_VALUE"]
+        # Order on name as well, so that data requests with equal create times have a stable order.
+        ccols = ['ORDER(COLL_CREATE_TIME)', 'ORDER(COLL_NAME)', "COLL_OWNER_NAME", "META_DATA_ATTR_VALUE"]
     else:
         ccols = ['ORDER(COLL_NAME)', 'COLL_CREATE_TIME', "COLL_OWNER_NAME", "META_DATA_ATTR_VALUE"]
 
@@ -824,31 +811,21 @@ def api_datarequest_browse(ctx, sort_on='name', sort_order='asc', offset=0, limi
         criteria = "COLL_PARENT_NAME = '{}' AND DATA_NAME = '{}' AND META_DATA_ATTR_NAME = 'reviewedBy' AND META_DATA_ATTR_VALUE in '{}'".format(coll, DATAREQUEST + JSON_EXT, user.name(ctx))
     # Execute query
     qcoll = Query(ctx, ccols, criteria, offset=offset, limit=limit, output=AS_DICT)
-    if len(list(qcoll)) > 0:
-        qcoll_title  = Query(ctx, ccols, "META_DATA_ATTR_NAME = 'title' AND COLL_PARENT_NAME = '{}'".format(coll), offset=offset, limit=limit, output=AS_DICT)
-        qcoll_status = Query(ctx, ccols, "META_DATA_ATTR_NAME = 'status' AND COLL_PARENT_NAME = '{}'".format(coll), offset=offset, limit=limit, output=AS_DICT)
-    else:
-        return OrderedDict([('total', 0), ('items', [])])
-
-    # Merge datarequest title and status into results.
-    colls = map(transform, list(qcoll))
-    colls_title = map(transform_title, list(qcoll_title))
-    colls_status = map(transform_status, list(qcoll_status))
-    for datarequest in colls:
-        for datarequest_title in colls_title:
-            if datarequest_title['id'] == datarequest['id']:
-                datarequest['title'] = datarequest_title['title']
-                break
-
-        for datarequest_status in colls_status:
-            if datarequest_status['id'] == datarequest['id']:
-                datarequest['status'] = datarequest_status['status']
-                break
-
-    # No results at all? Make sure the collection actually exists.
-    if len(colls) == 0 and not collection.exists(ctx, coll):
-        return api.Error('nonexistent', 'The given path does not exist')
-        # (checking this beforehand would waste a query in the most common situation)
+    rows = list(qcoll)
+    if len(rows) == 0:
+        return OrderedDict([('total', qcoll.total_rows()), ('items', [])])
+
+    colls = map(transform, rows)
+
+    # Fetch title and status of all data requests on this page at once and merge them into the results.
+    colls_by_path = {'{}/{}'.format(coll, datarequest['id']): datarequest for datarequest in colls}
+    for chunk in misc.chunks(colls_by_path.keys(), constants.GENQUERY_CHUNK_SIZE):
+        iter = row_iterator(
+            "COLL_NAME, META_DATA_ATTR_NAME, META_DATA_ATTR_VALUE",
+            "COLL_NAME in ('{}') AND DATA_NAME = '{}' AND META_DATA_ATTR_NAME in ('title', 'status')".format("', '".join(chunk), DATAREQUEST + JSON_EXT),
+            AS_LIST, ctx)
+        for row in iter:
+            colls_by_path[row[0]][row[1]] = row[2]
 
     return OrderedDict([('total', qcoll.total_rows()), ('items', colls)])
 
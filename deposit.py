@@ -160,8 +160,9 @@ def api_deposit_status(ctx, path):
     meta_path = '{}/{}'.format(coll, constants.IIJSONMETADATA)
 
     data = False
-    if not collection.empty(ctx, coll):
-        if collection.data_count(ctx, coll) == 1 and data_object.exists(ctx, meta_path):
+    data_count = collection.stats(ctx, coll)['data_count']
+    if data_count > 0:
+        if data_count == 1 and data_object.exists(ctx, meta_path):
             # Only file is yoda-metadata.json.
             data = False
         else:
@@ -195,6 +196,51 @@ def api_deposit_submit(ctx, path):
     return folder.set_status(ctx, coll, constants.research_package_state.SUBMITTED)
 
 
+def list_deposits(ctx, sort_on='name', sort_order='asc', offset=0, limit=10):
+    """List a page of deposits across all deposit groups the client user can see.
+
+    Deposits in all deposit groups are listed with a single query, so that
+    sorting and paging are done by the catalog.
+
+    :param ctx:        Combined type of a callback and rei struct
+    :param sort_on:    Column to sort on ('name' or 'modified', other values do not sort)
+    :param sort_order: Column sort order ('asc' or 'desc')
+    :param offset:     Offset to start listing from
+    :param limit:      Limit number of results
+
+    :returns: Tuple with total number of deposits and list of dicts with COLL_NAME and COLL_MODIFY_TIME of this page
+    """
+    if sort_on == 'modified':
+        # FIXME: Sorting on modify date is borked: There appears to be no
+        # reliable way to filter out replicas this way - multiple entries for
+        # the same file may be returned when replication takes place on a
+        # minute boundary, for example.
+        # We would want to take the max modify time *per* data name.
+        # (or not? replication may take place a long time after a modification,
+        #  resulting in a 'too new' date)
+        ccols = ['COLL_NAME', 'ORDER(COLL_MODIFY_TIME)']
+    elif sort_on == 'size':
+        # Sizes are not known to the catalog per collection, so these are not sorted.
+        ccols = ['COLL_NAME', 'COLL_MODIFY_TIME']
+    else:
+        ccols = ['ORDER(COLL_NAME)', 'COLL_MODIFY_TIME']
+
+    if sort_order == 'desc':
+        ccols = [x.replace('ORDER(', 'ORDER_DESC(') for x in ccols]
+
+    zone = user.zone(ctx)
+
+    # Deposits are the collections directly under a deposit group.
+    qcoll = Query(ctx, ccols,
+                  "COLL_PARENT_NAME like '/{0}/home/deposit-%' AND COLL_PARENT_NAME not like '/{0}/home/deposit-%/%'".format(zone),
+                  offset=offset, limit=limit, output=AS_DICT)
+
+    # Remove ORDER_BY etc. wrappers from column names.
+    rows = [{re.sub('.*\((.*)\)', '\\1', k): v for k, v in row.items()} for row in qcoll]
+
+    return qcoll.total_rows(), rows
+
+
 @api.make()
 def api_deposit_overview(ctx,
                          sort_on='name',
@@ -216,29 +262,14 @@ def api_deposit_overview(ctx,
 
     :returns: Dict with paginated collection contents
     """
-    def transform(row):
-        # Remove ORDER_BY etc. wrappers from column names.
-        x = {re.sub('.*\((.*)\)', '\\1', k): v for k, v in row.items()}
-
-        deposit_size = collection.size(ctx, x['COLL_NAME'])
-
+    def transform(x, avus, size):
         deposit_title = '(no title)'
-        iter = genquery.row_iterator(
-            "META_COLL_ATTR_VALUE",
-            "COLL_NAME = '{}' AND META_COLL_ATTR_NAME = 'Title'".format(x['COLL_NAME']),
-            genquery.AS_LIST, ctx
-        )
-        for row in iter:
-            deposit_title = row[0]
-
         deposit_access = ''
-        iter = genquery.row_iterator(
-            "META_COLL_ATTR_VALUE",
-            "COLL_NAME = '{}' AND META_COLL_ATTR_NAME = 'Data_Access_Restriction'".format(x['COLL_NAME']),
-            genquery.AS_LIST, ctx
-        )
-        for row in iter:
-            deposit_access = row[0].split("-")[0].strip()
+        for item in avus:
+            if item.attr == 'Title':
+                deposit_title = item.value
+            elif item.attr == 'Data_Access_Restriction':
+                deposit_access = item.value.split("-")[0].strip()
 
         pending_deposit_name = x['COLL_NAME'].split('/')[-1]
         deposit_group = x['COLL_NAME'].split('/')[-2]
@@ -249,42 +280,15 @@ def api_deposit_overview(ctx,
                 'modify_time':   int(x['COLL_MODIFY_TIME']),
                 'deposit_title': deposit_title,
                 'deposit_access': deposit_access,
-                'deposit_size':  deposit_size}
+                'deposit_size':  size}
 
-    if sort_on == 'modified':
-        # FIXME: Sorting on modify date is borked: There appears to be no
-        # reliable way to filter out replicas this way - multiple entries for
-        # the same file may be returned when replication takes place on a
-        # minute boundary, for example.
-        # We would want to take the max modify time *per* data name.
-        # (or not? replication may take place a long time after a modification,
-        #  resulting in a 'too new' date)
-        ccols = ['COLL_NAME', 'ORDER(COLL_MODIFY_TIME)']
-    elif sort_on == 'size':
-        ccols = ['COLL_NAME', 'COLL_MODIFY_TIME']
-    else:
-        ccols = ['ORDER(COLL_NAME)', 'COLL_MODIFY_TIME']
-
-    if sort_order == 'desc':
-        ccols = [x.replace('ORDER(', 'ORDER_DESC(') for x in ccols]
+    total, rows = list_deposits(ctx, sort_on, sort_order, offset, limit)
 
-    zone = user.zone(ctx)
+    # Enrich all deposits on this page with title, access and size in grouped queries.
+    paths = [x['COLL_NAME'] for x in rows]
+    avus = avu.of_colls(ctx, paths, ['Title', 'Data_Access_Restriction'])
+    stats = collection.multi_stats(ctx, paths)
+    all_colls = [transform(x, avus[x['COLL_NAME']], stats[x['COLL_NAME']]['size']) for x in rows]
 
-    # First collect the names of the deposit groups directly under home
-    qcoll_above = Query(ctx, ["COLL_NAME"],
-                        "COLL_PARENT_NAME = '/{}/home' AND COLL_NAME not like '/{}/home/vault-%' AND COLL_NAME not like '/{}/home/grp-vault-%'".format(zone, zone, zone),
-                        offset=offset, limit=limit, output=AS_DICT)
-
-    all_colls = []
-    # Then collect the deposits that are directly under the deposit groups
-    for item in qcoll_above:
-        coll_name = item['COLL_NAME']
-        if "deposit-" in coll_name:
-            qcoll = Query(ctx, ccols,
-                          "COLL_PARENT_NAME = '{}' AND COLL_NAME not like '/{}/home/vault-%' AND COLL_NAME not like '/{}/home/grp-vault-%'".format(coll_name, zone, zone),
-                          offset=offset, limit=limit, output=AS_DICT)
-            colls = map(transform, list(qcoll))
-            all_colls += colls
-
-    return OrderedDict([('total', len(all_colls)),
+    return OrderedDict([('total', total),
                         ('items', all_colls)])
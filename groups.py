@@ -14,7 +14,8 @@ import session_vars
 
 import schema
 import sram
-from groups_import import parse_data
+from groups_import import parse_data, plan_import
+from sram_utils import sram_sync_plan
 from util import *
 
 __all__ = ['api_group_data',
@@ -501,7 +502,7 @@ def user_is_a_datamanager(ctx):
 
 
 @api.make()
-def api_group_process_csv(ctx, csv_header_and_data, allow_update, delete_users):
+def api_group_process_csv(ctx, csv_header_and_data, allow_update, delete_users, dry_run=False):
     """Process contents of CSV file containing group definitions.
 
     Parsing is stopped immediately when an error is found and the rownumber is returned to the user.
@@ -510,8 +511,9 @@ def api_group_process_csv(ctx, csv_header_and_data, allow_update, delete_users):
     :param csv_header_and_data: CSV data holding a head conform description and the actual row data
     :param allow_update:        Allow updates in groups
     :param delete_users:        Allow for deleting of users from groups
+    :param dry_run:             Only report the changes that would be made, without making them
 
-    :returns: Dict containing status, error(s) and the resulting group definitions so the frontend can present the results
+    :returns: Dict containing status, error(s) and a summary of the changes (and in dry run mode the changes themselves)
 
     """
     # Only admins and datamanagers are allowed to use this functionality.
@@ -524,24 +526,26 @@ def api_group_process_csv(ctx, csv_header_and_data, allow_update, delete_users):
         return api.Error('errors', [error])
 
     # Step 2: Validate the data.
-    validation_errors = validate_data(ctx, data, allow_update)
+    state = group_import_state(ctx)
+    validation_errors = validate_data(ctx, data, allow_update, state[0])
     if len(validation_errors) > 0:
         return api.Error('errors', validation_errors)
 
     # Step 3: Create / update groups.
-    error = apply_data(ctx, data, allow_update, delete_users)
+    result, error = apply_data(ctx, data, allow_update, delete_users, state, dry_run)
     if len(error):
         return api.Error('errors', [error])
 
-    return api.Result.ok()
+    return result
 
 
-def validate_data(ctx, data, allow_update):
+def validate_data(ctx, data, allow_update, groups):
     """Validation of extracted data.
 
     :param ctx:          Combined type of a ctx and rei struct
     :param data:         Data to be processed
     :param allow_update: Allow for updating of groups
+    :param groups:       Set of names of existing groups
 
     :returns: Errors if found any
     """
@@ -552,7 +556,7 @@ def validate_data(ctx, data, allow_update):
 
     for (category, subcategory, groupname, _managers, _members, _viewers, _schema_id, _expiration_date) in data:
 
-        if group.exists(ctx, groupname) and not allow_update:
+        if groupname in groups and not allow_update:
             errors.append('Group "{}" already exists'.format(groupname))
 
         # Is user admin or has category add privileges?
@@ -567,128 +571,146 @@ def validate_data(ctx, data, allow_update):
     return errors
 
 
-def apply_data(ctx, data, allow_update, delete_users):
+def group_import_state(ctx):
+    """Load all groups with their current members and roles in bulk, for importing group data.
+
+    :param ctx: Combined type of a ctx and rei struct
+
+    :returns: Tuple of set of group names, dict of group name to dict of user (user#zone) roles
+              and dict of group name to list of names of members
+    """
+    groups = set(row[0] for row in genquery.row_iterator(
+        "USER_GROUP_NAME",
+        "USER_TYPE = 'rodsgroup'",
+        genquery.AS_LIST, ctx
+    ))
+
+    members = {}
+    roles = {}
+    readers = []
+
+    iter = genquery.row_iterator(
+        "USER_GROUP_NAME, USER_NAME, USER_ZONE",
+        "USER_TYPE != 'rodsgroup'",
+        genquery.AS_LIST, ctx
+    )
+
+    for name, username, zone in iter:
+        if name == username:
+            continue
+        members.setdefault(name, []).append(username)
+
+        if name.startswith("read-"):
+            # Match read-* group with research-* or initial-* group.
+            for prefix in ("research-", "initial-"):
+                if prefix + name[5:] in groups:
+                    readers.append((prefix + name[5:], username + "#" + zone))
+                    break
+        else:
+            roles.setdefault(name, {})[username + "#" + zone] = "normal"
+
+    # Membership of the group takes precedence over read access.
+    for name, username in readers:
+        roles.setdefault(name, {}).setdefault(username, "reader")
+
+    iter = genquery.row_iterator(
+        "USER_GROUP_NAME, META_USER_ATTR_VALUE",
+        "USER_TYPE = 'rodsgroup' AND META_USER_ATTR_NAME = 'manager'",
+        genquery.AS_LIST, ctx
+    )
+
+    for name, username in iter:
+        roles.setdefault(name, {})[username] = "manager"
+
+    return groups, roles, members
+
+
+def apply_data(ctx, data, allow_update, delete_users, state, dry_run=False):
     """ Update groups with the validated data
 
+    Changes are determined from the current state of all groups, loaded in bulk,
+    so that only the required group and membership operations are performed.
+
     :param ctx:          Combined type of a ctx and rei struct
     :param data:         Data to be processed
     :param allow_update: Allow updates in groups
-    :param delete_users:  Allow for deleting of users from groups
+    :param delete_users: Allow for deleting of users from groups
+    :param state:        Current groups, roles and members, as returned by group_import_state
+    :param dry_run:      Only determine the changes, without making them
 
-    :returns: Errors if found any
+    :returns: Tuple of dict with summary of changes (and the changes in dry run mode), and errors if found any
     """
-
-    for (category, subcategory, group_name, managers, members, viewers, schema_id, expiration_date) in data:
-        new_group = False
-
-        log.write(ctx, 'CSV import - Adding and updating group: {}'.format(group_name))
-
-        # First create the group. Note that the actor will become a groupmanager
+    groups, roles, members = state
+    zone = user.zone(ctx)
+    summary = OrderedDict([('groups_created', 0), ('users_added', 0), ('roles_changed', 0), ('users_removed', 0), ('errors', 0)])
+
+    # First create the new groups. Note that the actor will become a groupmanager
+    new_groups = set()
+    for (category, subcategory, group_name, managers, members_, viewers, schema_id, expiration_date) in data:
+        if group_name in groups:
+            if allow_update:
+                log.write(ctx, 'CSV import - WARNING: group "{}" not created, it already exists'.format(group_name))
+            continue
+
+        new_groups.add(group_name)
+        summary['groups_created'] += 1
+        if dry_run:
+            # Plan the group as created, with the actor as its only member and manager.
+            roles[group_name] = {user.full_name(ctx): 'manager'}
+            members[group_name] = [user.name(ctx)]
+            continue
+
+        log.write(ctx, 'CSV import - Adding group: {}'.format(group_name))
         if not len(schema_id):
             schema_id = config.default_yoda_schema
         response = group_create(ctx, group_name, category, subcategory, schema_id, expiration_date, '', 'unspecified')
-
-        if response:
-            new_group = True
-        elif response.status == "error_group_exists" and allow_update:
-            log.write(ctx, 'CSV import - WARNING: group "{}" not created, it already exists'.format(group_name))
-        else:
-            return "Error while attempting to create group {}. Status/message: {} / {}".format(group_name, response.status, response.status_info)
-
-        # Now add the users and set their role if other than member
-        allusers = managers + members + viewers
-        for username in list(set(allusers)):   # duplicates removed
-            currentrole = user_role(ctx, username, group_name)
-            if currentrole == "none":
-                response = group_user_add(ctx, username, group_name)
-                if response:
-                    currentrole = "normal"
-                    log.write(ctx, "CSV import - Notice: added user {} to group {}".format(username, group_name))
-                else:
-                    log.write(ctx, "CSV import - Warning: error occurred while attempting to add user {} to group {}".format(username, group_name))
-                    log.write(ctx, "CSV import - Status: {} , Message: {}".format(response.status, response.status_info))
+        if not response:
+            return summary, "Error while attempting to create group {}. Status/message: {} / {}".format(group_name, response.status, response.status_info)
+
+    # Reload the state to include members of the created groups.
+    if new_groups and not dry_run:
+        groups, roles, members = group_import_state(ctx)
+
+    changes = plan_import(data, roles, members, new_groups, zone, delete_users)
+
+    if dry_run:
+        summary['users_added'] = len([c for c in changes if c[0] == 'add'])
+        summary['roles_changed'] = len([c for c in changes if c[0] == 'role'])
+        summary['users_removed'] = len([c for c in changes if c[0] == 'remove'])
+        return {'summary': summary,
+                'changes': [{'action': action, 'group': group_name, 'user': username, 'role': role}
+                            for action, group_name, username, role in changes]}, ''
+
+    for action, group_name, username, role in changes:
+        if action == 'add':
+            response = group_user_add(ctx, username, group_name)
+            if response:
+                summary['users_added'] += 1
+                log.write(ctx, "CSV import - Notice: added user {} to group {}".format(username, group_name))
             else:
-                log.write(ctx, "CSV import - Notice: user {} is already present in group {}.".format(username, group_name))
-
-            # Set requested role. Note that user could be listed in multiple roles.
-            # In case of multiple roles, manager takes precedence over normal,
-            # and normal over reader
-            role = 'reader'
-            if username in members:
-                role = 'normal'
-            if username in managers:
-                role = 'manager'
-
-            if _are_roles_equivalent(role, currentrole):
-                log.write(ctx, "CSV import - Notice: user {} already has role {} in group {}.".format(username, role, group_name))
+                log.write(ctx, "CSV import - Warning: error occurred while attempting to add user {} to group {}".format(username, group_name))
+        elif action == 'role':
+            response = group_user_update_role(ctx, username, group_name, role)
+            if response:
+                summary['roles_changed'] += 1
+                log.write(ctx, "CSV import - Notice: changed role of user {} in group {} to {}".format(username, group_name, role))
             else:
-                response = group_user_update_role(ctx, username, group_name, role)
-
-                if response:
-                    log.write(ctx, "CSV import - Notice: changed role of user {} in group {} to {}".format(username, group_name, role))
-                else:
-                    log.write(ctx, "CSV import - Warning: error while attempting to change role of user {} in group {} to {}".format(username, group_name, role))
-                    log.write(ctx, "CSV import - Status: {} , Message: {}".format(response.status, response.status_info))
-
-        # Always remove the rods user for new groups, unless it is in the
-        # CSV file.
-        if (new_group and "rods" not in allusers and user_role(ctx, "rods", group_name) != "none"):
-            response = group_remove_user_from_group(ctx, "rods", group_name)
+                log.write(ctx, "CSV import - Warning: error while attempting to change role of user {} in group {} to {}".format(username, group_name, role))
+        elif action == 'remove':
+            response = group_remove_user_from_group(ctx, username, group_name)
             if response:
-                log.write(ctx, "CSV import - Notice: removed rods user from group " + group_name)
+                summary['users_removed'] += 1
+                log.write(ctx, "CSV import - Removing user {} from group {}".format(username, group_name))
             else:
-                log.write(ctx, "CSV import - Warning: error while attempting to remove user rods from group {}".format(group_name))
-                log.write(ctx, "CSV import - Status: {} , Message: {}".format(response.status, response.status_info))
-
-        # Remove users not in sheet
-        if delete_users:
-            # build list of current users
-            currentusers = []
-            for prefix in ['read-', 'initial-', 'research-']:
-                iter = genquery.row_iterator(
-                    "USER_GROUP_NAME, USER_NAME, USER_ZONE",
-                    "USER_TYPE != 'rodsgroup' AND USER_GROUP_NAME = '{}'".format(prefix + '-'.join(group_name.split('-')[1:])),
-                    genquery.AS_LIST, ctx
-                )
-
-                for row in iter:
-                    # append [user,group_name]
-                    currentusers.append([row[1], row[0]])
-
-            for userdata in currentusers:
-                username = userdata[0]
-                usergroupname = userdata[1]
-                if username not in allusers:
-                    if username in managers:
-                        if len(managers) == 1:
-                            log.write(ctx, "CSV import - Error: cannot remove user {} from group {}, because he/she is the only group manager".format(username, usergroupname))
-                            continue
-                        else:
-                            managers.remove(username)
-
-                    response = group_remove_user_from_group(ctx, username, usergroupname)
-                    if response:
-                        log.write(ctx, "CSV import - Removing user {} from group {}".format(username, usergroupname))
-                    else:
-                        log.write(ctx, "CSV import - Warning: error while attempting to remove user {} from group {}".format(username, usergroupname))
-                        log.write(ctx, "CSV import - Status: {} , Message: {}".format(response.status, response.status_info))
-
-    return ''
-
-
-def _are_roles_equivalent(a, b):
-    """Checks whether two roles are equivalent, Yoda and Yoda-clienttools use slightly different names."""
-    r_role_names = ["viewer", "reader"]
-    m_role_names = ["member", "normal"]
-
-    if a == b:
-        return True
-    elif a in r_role_names and b in r_role_names:
-        return True
-    elif a in m_role_names and b in m_role_names:
-        return True
-    else:
-        return False
+                log.write(ctx, "CSV import - Warning: error while attempting to remove user {} from group {}".format(username, group_name))
+
+        if not response:
+            summary['errors'] += 1
+            log.write(ctx, "CSV import - Status: {} , Message: {}".format(response.status, response.status_info))
+
+    log.write(ctx, "CSV import - Finished: {}".format(", ".join("{} {}".format(v, k.replace('_', ' ')) for k, v in summary.items())))
+
+    return {'summary': summary}, ''
 
 
 def group_user_exists(ctx, group_name, username, include_readonly):
@@ -1211,11 +1233,36 @@ def sram_enabled(ctx, group_name):
     return enable_sram_flag, co_identifier
 
 
-@rule.make()
-def rule_group_sram_sync(ctx):
-    """Synchronize groups with SRAM.
+def sram_co_identifiers(ctx):
+    """Get the SRAM CO identifiers of all SRAM enabled groups.
 
     :param ctx: Combined type of a ctx and rei struct
+
+    :returns: Dict of group name to SRAM CO identifier
+    """
+    iter = genquery.row_iterator(
+        "USER_GROUP_NAME, META_USER_ATTR_VALUE",
+        "USER_TYPE = 'rodsgroup' AND META_USER_ATTR_NAME = 'co_identifier'",
+        genquery.AS_LIST, ctx
+    )
+
+    return {row[0]: row[1] for row in iter if row[1]}
+
+
+SRAM_SYNC_ACTIONS = {'accepted': 'remove invitation of',
+                     'invite':   'invite',
+                     'manager':  'make manager'}
+
+
+@rule.make(inputs=[0])
+def rule_group_sram_sync(ctx, dry_run):
+    """Synchronize groups with SRAM.
+
+    Collaborations are fetched from SRAM once per group and concurrently,
+    changes are applied serially.
+
+    :param ctx:     Combined type of a ctx and rei struct
+    :param dry_run: Whether to only log planned changes without making changes ('1')
     """
     if not user.is_admin(ctx):
         return
@@ -1224,78 +1271,84 @@ def rule_group_sram_sync(ctx):
         log.write(ctx, "SRAM needs to be enabled to sync groups")
         return
 
-    log.write(ctx, "Start syncing groups with SRAM")
+    dry_run = (dry_run == '1')
+    log.write(ctx, "Start syncing groups with SRAM{}".format(" (dry run)" if dry_run else ""))
     groups = getGroupsData(ctx)
+    co_identifiers = sram_co_identifiers(ctx)
 
+    # Post collaboration for groups that are not yet SRAM enabled.
     for group in groups:
         group_name = group["name"]
-        members = group['members'] + group['read']
-        managers = group['managers']
-        invited = group['invited']
-        description = group.get('description', '')
+        if group_name in co_identifiers:
+            continue
 
-        log.write(ctx, "Sync group {} with SRAM".format(group_name))
-        sram_group, co_identifier = sram_enabled(ctx, group_name)
+        if dry_run:
+            log.write(ctx, "Would create group {} in SRAM".format(group_name))
+            continue
 
-        # Post collaboration group is not yet already SRAM enabled.
-        if not sram_group:
-            response_sram = sram.sram_post_collaboration(ctx, group_name, description)
+        log.write(ctx, "Create group {} in SRAM".format(group_name))
+        response_sram = sram.sram_post_collaboration(ctx, group_name, group.get('description', ''))
 
-            if "error" in response_sram:
-                message = response_sram['message']
-                log.write(ctx, "Something went wrong creating group {} in SRAM: {}".format(group_name, message))
-                break
-            else:
-                co_identifier = response_sram['identifier']
-                short_name = response_sram['short_name']
-                avu.associate_to_group(ctx, group_name, "co_identifier", co_identifier)
+        if "error" in response_sram:
+            message = response_sram['message']
+            log.write(ctx, "Something went wrong creating group {} in SRAM: {}".format(group_name, message))
+            return
+        else:
+            co_identifier = response_sram['identifier']
+            short_name = response_sram['short_name']
+            avu.associate_to_group(ctx, group_name, "co_identifier", co_identifier)
+            co_identifiers[group_name] = co_identifier
 
-            if not sram.sram_connect_service_collaboration(ctx, short_name):
-                log.write(ctx, "Something went wrong connecting service to group {} in SRAM".format(group_name))
-                break
+        if not sram.sram_connect_service_collaboration(ctx, short_name):
+            log.write(ctx, "Something went wrong connecting service to group {} in SRAM".format(group_name))
+            return
 
-        log.write(ctx, "Get members of group {} from SRAM".format(group_name))
-        co_members = sram.sram_get_co_members(ctx, co_identifier)
+    log.write(ctx, "Get members of {} groups from SRAM".format(len(co_identifiers)))
+    collaborations = sram.sram_get_collaborations(ctx, co_identifiers.values())
+
+    counts = {'invalid': 0, 'accepted': 0, 'invite': 0, 'manager': 0}
+    for group in groups:
+        group_name = group["name"]
+        co_identifier = co_identifiers.get(group_name)
+
+        if co_identifier is None:
+            # Collaboration not created in dry run mode, all members would be invited.
+            co_data = {'collaboration_memberships': []}
+        elif co_identifier in collaborations:
+            co_data = collaborations[co_identifier]
+        else:
+            log.write(ctx, "Skip syncing members of group {}, could not get collaboration from SRAM".format(group_name))
+            continue
+
+        uids = sram.co_member_uids(co_data)
+        plan = sram_sync_plan(group, sram.co_members(co_data), config.sram_flow)
 
         log.write(ctx, "Sync members of group {} with SRAM".format(group_name))
-        for member in members:
-            # Validate email.
-            if not yoda_names.is_email_username(member):
+        for action, member in plan:
+            counts[action] += 1
+            if action == 'invalid':
                 log.write(ctx, "User {} cannot be added to group {} because user email is invalid".format(member, group_name))
-                continue
-
-            # Check if member is invited.
-            if member in invited:
-                if member.split('#')[0] in co_members:
-                    log.write(ctx, "User {} added to group {}".format(member, group_name))
-                    # Remove invitation metadata.
-                    msi.sudo_obj_meta_remove(ctx, member, "-u", "", constants.UUORGMETADATAPREFIX + "sram_invited", group_name, "", "")
-                else:
-                    log.write(ctx, "User {} already invited to group {}".format(member, group_name))
-                    continue
-
-            # Not invited and not yet in the CO.
-            if member not in invited and member.split('#')[0] not in co_members:
+            elif dry_run:
+                log.write(ctx, "Would {} user {} of group {}".format(SRAM_SYNC_ACTIONS[action], member, group_name))
+            elif action == 'accepted':
+                log.write(ctx, "User {} added to group {}".format(member, group_name))
+                # Remove invitation metadata.
+                msi.sudo_obj_meta_remove(ctx, member, "-u", "", constants.UUORGMETADATAPREFIX + "sram_invited", group_name, "", "")
+            elif action == 'invite':
                 if config.sram_flow == 'join_request':
                     sram.invitation_mail_group_add_user(ctx, group_name, member.split('#')[0], co_identifier)
-                    msi.sudo_obj_meta_set(ctx, member, "-u", constants.UUORGMETADATAPREFIX + "sram_invited", group_name, "", "")
-                    log.write(ctx, "User {} invited to group {}".format(member, group_name))
-                    continue
-                elif config.sram_flow == 'invitation':
+                else:
                     sram.sram_put_collaboration_invitation(ctx, group_name, member.split('#')[0], co_identifier)
-                    msi.sudo_obj_meta_set(ctx, member, "-u", constants.UUORGMETADATAPREFIX + "sram_invited", group_name, "", "")
-                    log.write(ctx, "User {} invited to group {}".format(member, group_name))
-                    continue
-
-            # Member is group manager and in the CO.
-            if member in managers and member.split('#')[0] in co_members:
-                uid = sram.sram_get_uid(ctx, co_identifier, member)
+                msi.sudo_obj_meta_set(ctx, member, "-u", constants.UUORGMETADATAPREFIX + "sram_invited", group_name, "", "")
+                log.write(ctx, "User {} invited to group {}".format(member, group_name))
+            elif action == 'manager':
+                uid = uids.get(member.split('#')[0].lower(), '')
                 if uid == '':
                     log.write(ctx, "Something went wrong getting the SRAM user id for user {} of group {}".format(member, group_name))
+                elif sram.sram_update_collaboration_membership(ctx, co_identifier, uid, "manager"):
+                    log.write(ctx, "Updated {} user to manager of group {}".format(member, group_name))
                 else:
-                    if sram.sram_update_collaboration_membership(ctx, co_identifier, uid, "manager"):
-                        log.write(ctx, "Updated {} user to manager of group {}".format(member, group_name))
-                    else:
-                        log.write(ctx, "Something went wrong updating {} user to manager of group {} in SRAM".format(member, group_name))
+                    log.write(ctx, "Something went wrong updating {} user to manager of group {} in SRAM".format(member, group_name))
 
-    log.write(ctx, "Finished syncing groups with SRAM")
+    log.write(ctx, "Finished syncing groups with SRAM: {} invalid users, {} accepted invitations, {} invitations, {} manager updates{}".format(
+        counts['invalid'], counts['accepted'], counts['invite'], counts['manager'], " (dry run)" if dry_run else ""))
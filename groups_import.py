@@ -213,3 +213,74 @@ def parse_data(ctx, csv_header_and_data):
         return [], "CSV data has one or more duplicate groups: " + ",".join(duplicate_groups)
 
     return extracted_data, ''
+
+
+def are_roles_equivalent(a, b):
+    """Checks whether two roles are equivalent, Yoda and Yoda-clienttools use slightly different names."""
+    r_role_names = ["viewer", "reader"]
+    m_role_names = ["member", "normal"]
+
+    if a == b:
+        return True
+    elif a in r_role_names and b in r_role_names:
+        return True
+    elif a in m_role_names and b in m_role_names:
+        return True
+    else:
+        return False
+
+
+def plan_import(data, roles, members, new_groups, zone, delete_users):
+    """Compute the membership changes needed to bring groups in line with imported group data.
+
+    :param data:         Validated group data, as returned by parse_data
+    :param roles:        Dict of group name to dict of current user (user#zone) roles
+    :param members:      Dict of group name to list of names of current members
+    :param new_groups:   Set of names of groups created by this import
+    :param zone:         Zone of users without explicit zone in the group data
+    :param delete_users: Whether to remove users that are not in the group data
+
+    :returns: List of changes, as (action, group name, user name, role) tuples,
+              with action one of 'add', 'role' and 'remove'
+    """
+    changes = []
+
+    for (_category, _subcategory, group_name, managers, members_, viewers, _schema_id, _expiration_date) in data:
+        group_roles = roles.get(group_name, {})
+        allusers = managers + members_ + viewers
+
+        for username in sorted(set(allusers)):
+            currentrole = group_roles.get(username if '#' in username else username + '#' + zone, 'none')
+            if currentrole == 'none':
+                changes.append(('add', group_name, username, None))
+                currentrole = 'normal'
+
+            # Set requested role. Note that user could be listed in multiple roles.
+            # In case of multiple roles, manager takes precedence over normal,
+            # and normal over reader
+            role = 'reader'
+            if username in members_:
+                role = 'normal'
+            if username in managers:
+                role = 'manager'
+
+            if not are_roles_equivalent(role, currentrole):
+                changes.append(('role', group_name, username, role))
+
+        removals = []
+
+        # Always remove the rods user for new groups, unless it is in the group data.
+        if group_name in new_groups and "rods" not in allusers and "rods#" + zone in group_roles:
+            removals.append(("rods", group_name))
+
+        # Remove users not in sheet.
+        if delete_users:
+            base_name = '-'.join(group_name.split('-')[1:])
+            for prefix in ['read-', 'initial-', 'research-']:
+                for username in members.get(prefix + base_name, []):
+                    if username not in allusers and (username, prefix + base_name) not in removals:
+                        removals.append((username, prefix + base_name))
+
+        changes.extend(('remove', usergroupname, username, None) for username, usergroupname in removals)
+
+    return changes
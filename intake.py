@@ -8,6 +8,7 @@ import fnmatch
 import itertools
 import time
 import traceback
+from collections import OrderedDict
 
 import genquery
 
@@ -36,6 +37,30 @@ INTAKE_FILE_EXCLUSION_PATTERNS = ['*.abc', '*.PNG']
 """ List of file patterns not to take into account within INTAKE module."""
 
 
+def intake_user_studies(ctx):
+    """Get the studies the current user is involved in and is datamanager of.
+
+    Both are derived from the (cached) group memberships of the user, with at
+    most one query regardless of the number of studies.
+
+    :param ctx: Combined type of a callback and rei struct
+
+    :returns: Tuple of sorted lists of studies and of studies the user is datamanager of
+    """
+    groups = set(membership_data_manager.MembershipDataManager().get(ctx, user.full_name(ctx)))
+
+    studies = set()
+    for group in groups:
+        if group.startswith('grp-intake-'):
+            studies.add(group[11:])
+        elif group.startswith('intake-'):
+            studies.add(group[7:])
+
+    dm_studies = [study for study in studies if 'grp-datamanager-' + study in groups]
+
+    return sorted(studies), sorted(dm_studies)
+
+
 @api.make()
 def api_intake_list_studies(ctx):
     """Get list of all studies current user is involved in.
@@ -45,24 +70,7 @@ def api_intake_list_studies(ctx):
     :returns: List of studies
 
     """
-    groups = []
-    user_name = user.name(ctx)
-    user_zone = user.zone(ctx)
-
-    iter = genquery.row_iterator(
-        "USER_GROUP_NAME",
-        "USER_NAME = '" + user_name + "' AND USER_ZONE = '" + user_zone + "'",
-        genquery.AS_LIST, ctx
-    )
-
-    for row in iter:
-        if row[0].startswith('grp-intake-'):
-            groups.append(row[0][11:])
-        elif row[0].startswith('intake-'):
-            groups.append(row[0][7:])
-
-    groups.sort()
-    return groups
+    return intake_user_studies(ctx)[0]
 
 
 @api.make()
@@ -73,36 +81,7 @@ def api_intake_list_dm_studies(ctx):
 
     :returns: List of dm studies
     """
-    datamanager_groups = []
-    user_name = user.name(ctx)
-    user_zone = user.zone(ctx)
-
-    iter = genquery.row_iterator(
-        "USER_GROUP_NAME",
-        "USER_NAME = '" + user_name + "' AND USER_ZONE = '" + user_zone + "'",
-        genquery.AS_LIST, ctx
-    )
-
-    for row in iter:
-        study = ''
-        if row[0].startswith('grp-intake-'):
-            study = row[0][11:]
-        elif row[0].startswith('intake-'):
-            study = row[0][7:]
-
-        if study:
-            # Is a member of this study ... check whether member of corresponding datamanager group
-            iter2 = genquery.row_iterator(
-                "USER_NAME",
-                "USER_TYPE = 'rodsgroup' AND USER_NAME like 'grp-datamanager-" + study + "'",
-                genquery.AS_LIST, ctx
-            )
-            for row2 in iter2:
-                datamanager_group = row2[0]
-                if user.is_member_of(ctx, datamanager_group):
-                    datamanager_groups.append(study)
-
-    return datamanager_groups
+    return intake_user_studies(ctx)[1]
 
 
 @api.make()
@@ -199,53 +178,186 @@ def api_intake_list_unrecognized_files(ctx, coll):
     return files
 
 
+DATASET_SORT_KEYS = ['path', 'wave', 'experiment_type', 'pseudocode', 'version',
+                     'datasetStatus', 'datasetCreateName', 'datasetCreateDate']
+"""Dataset attributes datasets can be sorted on when listing datasets."""
+
+
 @api.make()
-def api_intake_list_datasets(ctx, coll):
+def api_intake_list_datasets(ctx, coll, sort_on='path', sort_order='asc', offset=0, limit=0):
     """Get list of datasets for given path.
 
     A dataset is distinguished by attribute name 'dataset_toplevel' which can either reside on a collection or a data object.
-    That is why 2 separate queries have to be performed.
+
+    :param ctx:        Combined type of a callback and rei struct
+    :param coll:       Collection from which to list all datasets
+    :param sort_on:    Dataset attribute to sort on (see DATASET_SORT_KEYS)
+    :param sort_order: Order to sort on ('asc' or 'desc')
+    :param offset:     Offset to start listing from (only when a limit is given)
+    :param limit:      Limit number of datasets to list (0 lists all datasets)
+
+    :returns: list of datasets, or dict with total number of datasets and a page of datasets when a limit is given
+    """
+    if sort_on not in DATASET_SORT_KEYS:
+        return api.Error('invalid_sort', 'Cannot sort on {}'.format(sort_on))
+
+    datasets = list_datasets(ctx, coll)
+    datasets.sort(key=lambda d: (d.get(sort_on), d['path'], d['dataset_id']), reverse=(sort_order == 'desc'))
+
+    if limit > 0:
+        return {'total': len(datasets), 'items': datasets[offset:offset + limit]}
+
+    return datasets
+
+
+def _new_dataset(dataset_id, path):
+    """Returns dataset dict with default attributes, as listed by api_intake_list_datasets."""
+    # Parse dataset_id to get WEPV-items individually
+    dataset_parts = dataset_id.split('\t')
+    return {'dataset_id': dataset_id,
+            'path': path,
+            'wave': dataset_parts[0],
+            'experiment_type': dataset_parts[1],
+            'pseudocode': dataset_parts[2],
+            'version': dataset_parts[3],
+            'datasetStatus': 'scanned',
+            'datasetCreateName': '==UNKNOWN==',
+            'datasetCreateDate': 0,
+            'datasetCreateDateFormatted': '',
+            'datasetErrors': 0,
+            'datasetWarnings': 0,
+            'datasetComments': 0,
+            'objects': 0,
+            'objectErrors': 0,
+            'objectWarnings': 0}
+
+
+def _set_dataset_created(dataset, owner, create_time):
+    dataset['datasetCreateName'] = owner
+    dataset['datasetCreateDate'] = int(create_time)
+    dataset['datasetCreateDateFormatted'] = time.strftime('%Y-%m-%d', time.localtime(int(create_time)))
+    dataset['datasetCreatedByWhen'] = owner + ':' + create_time
+
+
+def list_datasets(ctx, coll):
+    """Get details of all datasets in a collection, with the same details as get_dataset_details.
+
+    Toplevel markers, owners, creation times and metadata of all datasets are
+    retrieved with a fixed number of queries, regardless of the number of datasets.
 
     :param ctx:  Combined type of a callback and rei struct
     :param coll: Collection from which to list all datasets
 
-    :returns: list of datasets
+    :returns: List of dicts holding dataset details
     """
+    in_coll = "COLL_NAME = '{0}' || like '{0}/%'".format(coll)
     datasets = []
 
-    # 1) Query for datasets distinguished by collections
-    c_main_collection_iterator = genquery.row_iterator(
-        "META_COLL_ATTR_VALUE, COLL_NAME",
-        "COLL_NAME = '" + coll + "' AND META_COLL_ATTR_NAME = 'dataset_toplevel' ",
-        genquery.AS_LIST, ctx
-    )
-
-    c_subcollection_iterator = genquery.row_iterator(
-        "META_COLL_ATTR_VALUE, COLL_NAME",
-        "COLL_NAME LIKE '" + coll + "/%' AND META_COLL_ATTR_NAME = 'dataset_toplevel' ",
+    # 1) Datasets distinguished by collections.
+    by_coll = {}
+    iter = genquery.row_iterator(
+        "COLL_NAME, META_COLL_ATTR_VALUE, COLL_OWNER_NAME, COLL_CREATE_TIME",
+        in_coll + " AND META_COLL_ATTR_NAME = 'dataset_toplevel'",
         genquery.AS_LIST, ctx
     )
-
-    for row in itertools.chain(c_main_collection_iterator, c_subcollection_iterator):
-        dataset = get_dataset_details(ctx, row[0], row[1])
+    for path, dataset_id, owner, create_time in iter:
+        dataset = _new_dataset(dataset_id, path)
+        _set_dataset_created(dataset, owner, create_time)
+        by_coll.setdefault(path, []).append(dataset)
         datasets.append(dataset)
 
-    # 2) Query for datasets distinguished dataobjects
-    d_main_collection_iterator = genquery.row_iterator(
-        "META_DATA_ATTR_VALUE, COLL_NAME",
-        "COLL_NAME = '" + coll + "' AND META_DATA_ATTR_NAME = 'dataset_toplevel' ",
-        genquery.AS_LIST, ctx
-    )
+    if by_coll:
+        iter = genquery.row_iterator(
+            "COLL_NAME, META_COLL_ATTR_NAME, COUNT(META_COLL_ATTR_VALUE)",
+            in_coll + " AND META_COLL_ATTR_NAME in ('dataset_error', 'dataset_warning', 'comment', 'to_vault_freeze', 'to_vault_lock')",
+            genquery.AS_LIST, ctx
+        )
+        for path, attr, count in iter:
+            for dataset in by_coll.get(path, []):
+                if attr == 'dataset_error':
+                    dataset['datasetErrors'] += int(count)
+                elif attr == 'dataset_warning':
+                    dataset['datasetWarnings'] += int(count)
+                elif attr == 'comment':
+                    dataset['datasetComments'] += int(count)
+                elif attr == 'to_vault_freeze' and dataset['datasetStatus'] != 'locked':
+                    dataset['datasetStatus'] = 'frozen'
+                elif attr == 'to_vault_lock':
+                    dataset['datasetStatus'] = 'locked'
 
-    d_subcollection_iterator = genquery.row_iterator(
-        "META_DATA_ATTR_VALUE, COLL_NAME",
-        "COLL_NAME LIKE '" + coll + "/%' AND META_DATA_ATTR_NAME = 'dataset_toplevel' ",
+        iter = genquery.row_iterator(
+            "COLL_NAME, META_COLL_ATTR_NAME, META_COLL_ATTR_VALUE",
+            in_coll + " AND META_COLL_ATTR_NAME in ('object_count', 'object_errors', 'object_warnings')",
+            genquery.AS_LIST, ctx
+        )
+        for path, attr, value in iter:
+            for dataset in by_coll.get(path, []):
+                if attr == 'object_count':
+                    dataset['objects'] += int(value)
+                elif attr == 'object_errors':
+                    dataset['objectErrors'] += int(value)
+                elif attr == 'object_warnings':
+                    dataset['objectWarnings'] += int(value)
+
+    # 2) Datasets distinguished by data objects.
+    # A dataset is listed for every collection holding one of its toplevel objects,
+    # with all toplevel objects of the dataset within that collection (or below).
+    objects = OrderedDict()
+    iter = genquery.row_iterator(
+        "COLL_NAME, DATA_NAME, META_DATA_ATTR_VALUE, DATA_OWNER_NAME, DATA_CREATE_TIME",
+        in_coll + " AND META_DATA_ATTR_NAME = 'dataset_toplevel'",
         genquery.AS_LIST, ctx
     )
+    for parent, base_name, dataset_id, owner, create_time in iter:
+        objects.setdefault((parent, base_name, dataset_id), (owner, create_time))
 
-    for row in itertools.chain(d_main_collection_iterator, d_subcollection_iterator):
-        dataset = get_dataset_details(ctx, row[0], row[1])
-        datasets.append(dataset)
+    if objects:
+        attrs = {}
+        iter = genquery.row_iterator(
+            "COLL_NAME, DATA_NAME, META_DATA_ATTR_NAME, META_DATA_ATTR_VALUE",
+            in_coll + " AND META_DATA_ATTR_NAME in ('error', 'warning', 'dataset_error', 'dataset_warning', 'comment', 'to_vault_freeze', 'to_vault_lock')",
+            genquery.AS_LIST, ctx
+        )
+        for parent, base_name, attr, _value in iter:
+            attrs.setdefault((parent, base_name), []).append(attr)
+
+        paths = OrderedDict()
+        by_id = {}
+        for parent, base_name, dataset_id in objects:
+            paths[(dataset_id, parent)] = True
+            by_id.setdefault(dataset_id, []).append((parent, base_name))
+
+        for dataset_id, path in paths:
+            dataset = _new_dataset(dataset_id, path)
+
+            # Objects directly in the dataset path go first, as in get_dataset_toplevel_objects.
+            tl_objects = sorted([(p != path, p, b) for p, b in by_id[dataset_id]
+                                 if p == path or p.startswith(path + '/')])
+
+            for n, (_, parent, base_name) in enumerate(tl_objects):
+                if n == 0:
+                    _set_dataset_created(dataset, *objects[(parent, base_name, dataset_id)])
+
+                for attr in attrs.get((parent, base_name), []):
+                    if attr == 'error':
+                        dataset['objectErrors'] += 1
+                    elif attr == 'warning':
+                        dataset['objectWarnings'] += 1
+                    elif attr == 'to_vault_freeze' and dataset['datasetStatus'] != 'locked':
+                        dataset['datasetStatus'] = 'frozen'
+                    elif attr == 'to_vault_lock':
+                        dataset['datasetStatus'] = 'locked'
+                    elif n == 0:
+                        # Only look at these items for the first object as they are added to each toplevel object present
+                        if attr == 'dataset_error':
+                            dataset['datasetErrors'] += 1
+                        elif attr == 'dataset_warning':
+                            dataset['datasetWarnings'] += 1
+                        elif attr == 'comment':
+                            dataset['datasetComments'] += 1
+
+            dataset['objects'] = len(tl_objects)
+            datasets.append(dataset)
 
     return datasets
 
@@ -259,26 +371,7 @@ def get_dataset_details(ctx, dataset_id, path):
 
     :returns: Dict holding objects for the dataset
     """
-    # Inialise all attributes
-    dataset = {"dataset_id": dataset_id,
-               "path": path}
-
-    # Parse dataset_id to get WEPV-items individually
-    dataset_parts = dataset_id.split('\t')
-    dataset['wave'] = dataset_parts[0]
-    dataset['experiment_type'] = dataset_parts[1]
-    dataset['pseudocode'] = dataset_parts[2]
-    dataset['version'] = dataset_parts[3]
-    dataset['datasetStatus'] = 'scanned'
-    dataset['datasetCreateName'] = '==UNKNOWN=='
-    dataset['datasetCreateDate'] = 0
-    dataset['datasetCreateDateFormatted'] = ''
-    dataset['datasetErrors'] = 0
-    dataset['datasetWarnings'] = 0
-    dataset['datasetComments'] = 0
-    dataset['objects'] = 0
-    dataset['objectErrors'] = 0
-    dataset['objectWarnings'] = 0
+    dataset = _new_dataset(dataset_id, path)
 
     tl_info = get_dataset_toplevel_objects(ctx, path, dataset_id)
     is_collection = tl_info['is_collection']
@@ -293,10 +386,7 @@ def get_dataset_details(ctx, dataset_id, path):
             genquery.AS_LIST, ctx
         )
         for row in iter:
-            dataset['datasetCreateName'] = row[1]
-            dataset['datasetCreateDate'] = int(row[2])
-            dataset['datasetCreateDateFormatted'] = time.strftime('%Y-%m-%d', time.localtime(int(row[2])))
-            dataset['datasetCreatedByWhen'] = row[1] + ':' + row[2]
+            _set_dataset_created(dataset, row[1], row[2])
 
         iter = genquery.row_iterator(
             "COLL_NAME, META_COLL_ATTR_NAME, count(META_COLL_ATTR_VALUE)",
@@ -348,10 +438,7 @@ def get_dataset_details(ctx, dataset_id, path):
                     genquery.AS_LIST, ctx
                 )
                 for row in iter:
-                    dataset['datasetCreateName'] = row[0]
-                    dataset['datasetCreateDate'] = int(row[1])
-                    dataset['datasetCreateDateFormatted'] = time.strftime('%Y-%m-%d', time.localtime(int(row[1])))
-                    dataset['datasetCreatedByWhen'] = row[0] + ':' + row[1]
+                    _set_dataset_created(dataset, row[0], row[1])
 
             iter = genquery.row_iterator(
                 "META_DATA_ATTR_NAME, META_DATA_ATTR_VALUE",
@@ -514,7 +601,8 @@ def _intake_scan_for_datasets(ctx, coll, tl_datasets_log_target=''):
              "experiment_type": "",
              "pseudocode": ""}
     found_datasets = []
-    found_datasets = intake_scan.intake_scan_collection(ctx, coll, scope, False, found_datasets)
+    object_counts = {}
+    found_datasets = intake_scan.intake_scan_collection(ctx, coll, scope, False, found_datasets, object_counts)
 
     if tl_datasets_log_target in ['stdout', 'serverLog']:
         for subscope in found_datasets:
@@ -530,7 +618,7 @@ def _intake_scan_for_datasets(ctx, coll, tl_datasets_log_target=''):
                                                    + "> D<" + subscope['directory']
                                                    + ">"))
 
-    intake_scan.intake_check_datasets(ctx, coll)
+    intake_scan.intake_check_datasets(ctx, coll, object_counts)
 
 
 @api.make()
@@ -8,9 +8,13 @@ import itertools
 
 import genquery
 
+from intake_utils import dataset_file_stats
 from util import *
 
 
+DATASET_EXPORT_ATTRIBUTES = ['dataset_id', 'dataset_date_created', 'wave', 'version', 'experiment_type', 'pseudocode']
+
+
 def intake_report_export_study_data(ctx, study_id):
     """ Get the information for the export functionality
 
@@ -27,49 +31,45 @@ def intake_report_export_study_data(ctx, study_id):
     :param study_id: Unique identifier op study
     :returns: returns datasets
     """
-    zone = user.zone(ctx)
+    return dict(intake_export_study_rows(ctx, study_id))
 
-    main_collection_iterator = genquery.row_iterator("COLL_NAME, COLL_PARENT_NAME, META_COLL_ATTR_NAME, META_COLL_ATTR_VALUE",
-                                                     " = '/{}/home/grp-vault-{}' AND META_COLL_ATTR_NAME IN ('dataset_id', 'dataset_date_created', 'wave', 'version', 'experiment_type', 'pseudocode')".format(zone, study_id),
-                                                     genquery.AS_LIST, ctx)
 
-    subcollection_iterator = genquery.row_iterator("COLL_NAME, COLL_PARENT_NAME, META_COLL_ATTR_NAME, META_COLL_ATTR_VALUE",
-                                                   "COLL_NAME like '/{}/home/grp-vault-{}/%' AND META_COLL_ATTR_NAME IN ('dataset_id', 'dataset_date_created', 'wave', 'version', 'experiment_type', 'pseudocode')".format(zone, study_id),
-                                                   genquery.AS_LIST, ctx)
+def intake_export_study_rows(ctx, study_id):
+    """Generate the export rows of all datasets in the vault of a study.
+
+    Uses one query for the dataset metadata and one scan over the data objects
+    in the study vault, regardless of the number of datasets.
+
+    :param ctx:      Combined type of a callback and rei struct
+    :param study_id: Unique identifier of study
+
+    :returns: Generator of (dataset path, dataset metadata) tuples
+    """
+    vault_path = '/{}/home/grp-vault-{}'.format(user.zone(ctx), study_id)
+
+    iter = genquery.row_iterator("COLL_NAME, META_COLL_ATTR_NAME, META_COLL_ATTR_VALUE",
+                                 "COLL_NAME = '{0}' || like '{0}/%' AND META_COLL_ATTR_NAME in ('{1}')".format(vault_path, "', '".join(DATASET_EXPORT_ATTRIBUTES)),
+                                 genquery.AS_LIST, ctx)
 
     datasets = {}
-    for row in itertools.chain(main_collection_iterator, subcollection_iterator):
-        path = row[0]
-        try:
-            datasets[path][row[2]] = row[3]
-        except KeyError:
-            datasets[path] = {row[2]: row[3]}
-
-    real_datasets = {}
-    for set_path in datasets:
-        if 'dataset_date_created' in datasets[set_path]:
-            real_datasets[set_path] = datasets[set_path]
-            # collect total file size and total amount of files
-            real_datasets[set_path]['totalFileSize'] = 0
-            real_datasets[set_path]['totalFiles'] = 0
-
-            # get the filesize and file count
-            stat_main_collection_iterator = genquery.row_iterator("count(DATA_ID), sum(DATA_SIZE)",
-                                                                  "COLL_NAME = '{}'".format(set_path),
-                                                                  genquery.AS_LIST, ctx)
-
-            stat_subcollection_iterator = genquery.row_iterator("count(DATA_ID), sum(DATA_SIZE)",
-                                                                "COLL_NAME like '{}/%'".format(set_path),
-                                                                genquery.AS_LIST, ctx)
-
-            for row in itertools.chain(stat_main_collection_iterator, stat_subcollection_iterator):
-                real_datasets[set_path]['totalFiles'] = int(row[0]) / 2
-                totalFileSize = 0
-                if row[1]:
-                    totalFileSize = int(row[1])
-                real_datasets[set_path]['totalFileSize'] = totalFileSize / 2
-
-    return real_datasets
+    for row in iter:
+        datasets.setdefault(row[0], {})[row[1]] = row[2]
+
+    datasets = {path: metadata for path, metadata in datasets.items() if 'dataset_date_created' in metadata}
+    if not datasets:
+        return
+
+    # Replicas of a data object are returned as separate rows, ordering by
+    # data id allows counting every data object only once.
+    iter = genquery.row_iterator("COLL_NAME, ORDER(DATA_ID), DATA_SIZE",
+                                 "COLL_NAME = '{0}' || like '{0}/%'".format(vault_path),
+                                 genquery.AS_LIST, ctx)
+
+    for path, (files, size) in dataset_file_stats(iter, datasets.keys()).items():
+        metadata = datasets[path]
+        metadata['totalFiles'] = files
+        metadata['totalFileSize'] = size
+        yield path, metadata
 
 
 def intake_youth_get_datasets_in_study(ctx, study_id):
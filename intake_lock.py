@@ -5,85 +5,99 @@ __copyright__ = 'Copyright (c) 2019-2021, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
 import time
+from collections import OrderedDict
 
 import genquery
 
 import intake
+from intake_utils import invert_avu_operations, status_avu_operations
 from util import *
 
 
-def intake_dataset_treewalk_change_status(ctx, collection, status, timestamp, remove):
-    """Treewalk dataset collection and change status.
+def intake_dataset_status_values(ctx, object, is_collection, dataset_id, status):
+    """Enumerate the objects of a dataset with their current values of a status attribute.
 
-    :param ctx:        Combined type of a callback and rei struct
-    :param collection: Will change every time as it represents every collection that has to be processed
-    :param status:     Status to set on dataset objects
-    :param timestamp:  Timestamp of status change
-    :param remove:     Boolean, set or remove status
+    Uses a fixed number of queries, regardless of the size of the dataset.
+
+    :param ctx:           Combined type of a callback and rei struct
+    :param object:        Toplevel collection of the dataset, or collection containing its data objects
+    :param is_collection: Indicator if dataset is within a collection
+    :param dataset_id:    Dataset identifier
+    :param status:        Status attribute name
+
+    :returns: Ordered dict of (path, entity type) -> list of status values, collections
+              first, starting with the toplevel collection
     """
-    # 1. Change status on this collection.
-    if remove:
-        try:
-            avu.rmw_from_coll(ctx, collection, status, "%")
-        except msi.Error as e:
-            log.write(ctx, 'ERROR REMOVE')
-            log.write(ctx, e)
+    entities = OrderedDict()
+
+    if is_collection:
+        condition = "COLL_NAME = '{0}' || like '{0}/%'".format(object)
+
+        iter = genquery.row_iterator("ORDER(COLL_NAME)", condition, genquery.AS_LIST, ctx)
+        for row in iter:
+            entities[(row[0], "collection")] = []
+
+        iter = genquery.row_iterator("COLL_NAME, META_COLL_ATTR_VALUE",
+                                     condition + " AND META_COLL_ATTR_NAME = '{}'".format(status),
+                                     genquery.AS_LIST, ctx)
+        for row in iter:
+            entities[(row[0], "collection")].append(row[1])
+
+        data_condition = condition
     else:
-        log.write(ctx, 'step1 . set_on_col')
-        avu.set_on_coll(ctx, collection, status, timestamp)
-
-    # 2. Change status on data objects located directly within the collection.
-    data_objects = genquery.row_iterator(
-        "DATA_NAME",
-        "COLL_NAME = '{}'".format(collection),
-        genquery.AS_LIST, ctx
-    )
-
-    for row in data_objects:
-        if remove:
-            avu.rmw_from_data(ctx, "{}/{}".format(collection, row[0]), status, "%")
-        else:
-            log.write(ctx, 'step2 . set_on_data')
-            avu.set_on_data(ctx, "{}/{}".format(collection, row[0]), status, timestamp)
-
-    # 3. Loop through subcollections.
-    subcollections = genquery.row_iterator(
-        "COLL_NAME",
-        "COLL_PARENT_NAME = '{}'".format(collection),
-        genquery.AS_LIST, ctx
-    )
-
-    for row in subcollections:
-        intake_dataset_treewalk_change_status(ctx, row[0], status, timestamp, remove)
+        condition = "COLL_NAME = '{}'".format(object)
+        data_condition = condition + " AND META_DATA_ATTR_NAME = 'dataset_toplevel' AND META_DATA_ATTR_VALUE = '{}'".format(dataset_id)
+
+    iter = genquery.row_iterator("COLL_NAME, DATA_NAME", data_condition, genquery.AS_LIST, ctx)
+    for row in iter:
+        entities[("{}/{}".format(row[0], row[1]), "data_object")] = []
+
+    iter = genquery.row_iterator("COLL_NAME, DATA_NAME, META_DATA_ATTR_VALUE",
+                                 condition + " AND META_DATA_ATTR_NAME = '{}'".format(status),
+                                 genquery.AS_LIST, ctx)
+    for row in iter:
+        key = ("{}/{}".format(row[0], row[1]), "data_object")
+        if key in entities:
+            entities[key].append(row[2])
+
+    return entities
 
 
 def intake_dataset_change_status(ctx, object, is_collection, dataset_id, status, timestamp, remove):
     """Change status on dataset.
 
+    The status of every object is changed in one atomic metadata operation.
+    Policies consider a collection dataset locked based on its toplevel
+    collection, so that is changed last when setting a status and first when
+    removing it. If changing an object fails, the changes applied so far are
+    rolled back.
+
     :param ctx:           Combined type of a callback and rei struct
-    :param object:        Will change every time as it represents every object of the dataset
+    :param object:        Toplevel collection of the dataset, or collection containing its data objects
     :param is_collection: Indicator if dataset is within a collection
     :param dataset_id:    Dataset identifier
     :param status:        Status to set on dataset objects
     :param timestamp:     Timestamp of status change
     :param remove:        Boolean, set or remove status
+
+    :raises Exception: Raises exception when changing the status failed
     """
-    # Is dataset a collection?
-    if is_collection:
-        # Recursively change the status on all objects in the dataset
-        intake_dataset_treewalk_change_status(ctx, object, status, timestamp, remove)
-    else:
-        # Dataset is not a collection, find all the dataset objects.
-        data_objects = genquery.row_iterator("DATA_NAME",
-                                             "COLL_NAME = '{}' AND META_DATA_ATTR_NAME = 'dataset_toplevel' AND META_DATA_ATTR_VALUE = '{}'".format(object, dataset_id),
-                                             genquery.AS_LIST, ctx)
-
-        # Change dataset status on all objects.
-        for row in data_objects:
-            if remove:
-                avu.rmw_from_data(ctx, "{}/{}".format(object, row[0]), status, "%")
-            else:
-                avu.set_on_data(ctx, "{}/{}".format(object, row[0]), status, timestamp)
+    entities = list(intake_dataset_status_values(ctx, object, is_collection, dataset_id, status).items())
+    if is_collection and not remove:
+        entities = entities[1:] + entities[:1]
+
+    applied = []
+    for (path, entity_type), values in entities:
+        operations = status_avu_operations(values, status, timestamp, remove)
+        if not operations:
+            continue
+
+        if not avu.apply_atomic_operations(ctx, {"entity_name": path, "entity_type": entity_type, "operations": operations}):
+            for path, entity_type, operations in reversed(applied):
+                avu.apply_atomic_operations(ctx, {"entity_name": path, "entity_type": entity_type, "operations": invert_avu_operations(operations)})
+            raise Exception("Changing status {} of dataset {} failed".format(status, dataset_id))
+
+        applied.append((path, entity_type, operations))
 
 
 def intake_dataset_lock(ctx, collection, dataset_id):
@@ -14,7 +14,7 @@ from intake_utils import dataset_parse_id, intake_scan_get_metadata_update
 from util import *
 
 
-def intake_scan_collection(ctx, root, scope, in_dataset, found_datasets):
+def intake_scan_collection(ctx, root, scope, in_dataset, found_datasets, object_counts):
     """Recursively scan a directory in a Youth Cohort intake.
 
     :param ctx:    Combined type of a callback and rei struct
@@ -22,6 +22,8 @@ def intake_scan_collection(ctx, root, scope, in_dataset, found_datasets):
     :param scope:     a scoped kvlist buffer
     :param in_dataset: whether this collection is within a dataset collection
     :param found_datasets: collection of subscopes that were found in order to report toplevel datasets in the scanning process
+    :param object_counts: dict of dataset id -> number of data objects scanned into the dataset,
+                          or None if the dataset has locked objects that were not scanned
 
     :returns: Found datasets
     """
@@ -42,6 +44,8 @@ def intake_scan_collection(ctx, root, scope, in_dataset, found_datasets):
         locked_state = object_is_locked(ctx, path, False)
 
         if locked_state['locked'] or locked_state['frozen']:
+            if in_dataset:
+                object_counts[scope['dataset_id']] = None
             continue
 
         remove_dataset_metadata(ctx, path, False)
@@ -52,6 +56,7 @@ def intake_scan_collection(ctx, root, scope, in_dataset, found_datasets):
 
         if metadata_update["in_dataset"]:
             apply_dataset_metadata(ctx, path, metadata_update["new_metadata"], False)
+            count_dataset_object(object_counts, metadata_update["new_metadata"]["dataset_id"])
             if not parent_in_dataset:
                 # We found a top-level dataset data object.
                 found_datasets.append(metadata_update["new_metadata"])
@@ -76,6 +81,8 @@ def intake_scan_collection(ctx, root, scope, in_dataset, found_datasets):
             locked_state = object_is_locked(ctx, path, True)
 
             if locked_state['locked'] or locked_state['frozen']:
+                if in_dataset:
+                    object_counts[scope['dataset_id']] = None
                 continue
 
             remove_dataset_metadata(ctx, path, True)
@@ -96,11 +103,24 @@ def intake_scan_collection(ctx, root, scope, in_dataset, found_datasets):
                                                     path,
                                                     metadata_update["new_metadata"],
                                                     parent_in_dataset or metadata_update["in_dataset"],
-                                                    found_datasets)
+                                                    found_datasets,
+                                                    object_counts)
 
     return found_datasets
 
 
+def count_dataset_object(object_counts, dataset_id):
+    """Count a scanned data object in the object count of its dataset.
+
+    :param object_counts: dict of dataset id -> number of scanned data objects
+    :param dataset_id:    Dataset identifier of the data object
+    """
+    if dataset_id not in object_counts:
+        object_counts[dataset_id] = 1
+    elif object_counts[dataset_id] is not None:
+        object_counts[dataset_id] += 1
+
+
 def object_is_locked(ctx, path, is_collection):
     """Returns whether given object in path (collection or dataobject) is locked or frozen
 
@@ -312,26 +332,35 @@ def dataset_get_ids(ctx, coll):
     return data_ids
 
 
-def intake_check_datasets(ctx, root):
+def intake_check_datasets(ctx, root, object_counts=None):
     """Run checks on all datasets under root.
 
-    :param ctx:  Combined type of a callback and rei struct
-    :param root: The collection to get datasets for
+    :param ctx:           Combined type of a callback and rei struct
+    :param root:          The collection to get datasets for
+    :param object_counts: Object counts per dataset id, as maintained by intake_scan_collection()
     """
+    if object_counts is None:
+        object_counts = {}
+
     dataset_ids = dataset_get_ids(ctx, root)
     for dataset_id in dataset_ids:
-        intake_check_dataset(ctx, root, dataset_id)
+        intake_check_dataset(ctx, root, dataset_id, object_counts.get(dataset_id))
 
 
-def intake_check_dataset(ctx, root, dataset_id):
+def intake_check_dataset(ctx, root, dataset_id, object_count=None):
     """Run checks on the dataset specified by the given dataset id.
 
     This function adds object counts and error counts to top-level objects within the dataset.
     For historical reasons, it also adds a warning count, which is always 0.
 
-    :param ctx:        Combined type of a callback and rei struct
-    :param root:       Collection name
-    :param dataset_id: Dataset identifier
+    The scanner removes errors from every data object it scans, so a dataset
+    that was completely scanned has no object errors. Counts are only queried
+    for datasets the scanner did not count, e.g. because they are locked.
+
+    :param ctx:          Combined type of a callback and rei struct
+    :param root:         Collection name
+    :param dataset_id:   Dataset identifier
+    :param object_count: Number of data objects counted by the scanner, None to query the counts
     """
     tl_info = intake.get_dataset_toplevel_objects(ctx, root, dataset_id)
     is_collection = tl_info['is_collection']
@@ -348,26 +377,19 @@ def intake_check_dataset(ctx, root, dataset_id):
         # Suppress error handing and continue normal processing should a situation arise where Wepv missing is already present on the dataobject/collection
         dataset_add_error(ctx, tl_objects, is_collection, "Wave, experiment type or pseudo-ID missing", True)
 
+    scanned = object_count is not None
+    if not scanned:
+        object_count = get_aggregated_object_count(ctx, dataset_id, root)
+
     for tl in tl_objects:
         # Save the aggregated counts of #objects, #warnings, #errors on object level
+        error_count = 0 if scanned else get_aggregated_object_error_count(ctx, tl, is_collection)
 
-        count = get_aggregated_object_count(ctx, dataset_id, tl)
-        if is_collection:
-            avu.set_on_coll(ctx, tl, "object_count", str(count))
-        else:
-            avu.set_on_data(ctx, tl, "object_count", str(count))
-
-        count = get_aggregated_object_error_count(ctx, tl)
-        if is_collection:
-            avu.set_on_coll(ctx, tl, "object_errors", str(count))
-        else:
-            avu.set_on_data(ctx, tl, "object_errors", str(count))
-
-        count = 0
-        if is_collection:
-            avu.set_on_coll(ctx, tl, "object_warnings", str(count))
-        else:
-            avu.set_on_data(ctx, tl, "object_warnings", str(count))
+        for attribute, count in [("object_count", object_count), ("object_errors", error_count), ("object_warnings", 0)]:
+            if is_collection:
+                avu.set_on_coll(ctx, tl, attribute, str(count))
+            else:
+                avu.set_on_data(ctx, tl, attribute, str(count))
 
 
 def get_rel_paths_objects(ctx, root, dataset_id):
@@ -413,50 +435,46 @@ def get_rel_paths_objects(ctx, root, dataset_id):
     return rel_path_objects
 
 
-def get_aggregated_object_count(ctx, dataset_id, tl_collection):
+def get_aggregated_object_count(ctx, dataset_id, root):
     """Return total amounts of objects.
 
-    :param ctx:           Combined type of a callback and rei struct
-    :param dataset_id:    Dataset id
-    :param tl_collection: Collection name of top level
+    GenQuery COUNT() counts every replica of a data object, so the distinct
+    data ids are counted while iterating instead.
+
+    :param ctx:        Combined type of a callback and rei struct
+    :param dataset_id: Dataset id
+    :param root:       Collection containing the dataset
 
     :returns: Aggregated object count
     """
-    main_collection_iterator = genquery.row_iterator(
-        "DATA_ID",
-        "COLL_NAME = '" + tl_collection + "' AND META_DATA_ATTR_NAME = 'dataset_id' "
-        "AND META_DATA_ATTR_VALUE = '" + dataset_id + "' ",
-        genquery.AS_LIST, ctx
-    )
-
-    subcollection_iterator = genquery.row_iterator(
+    iter = genquery.row_iterator(
         "DATA_ID",
-        "COLL_NAME like '" + tl_collection + "/%' AND META_DATA_ATTR_NAME = 'dataset_id' "
-        "AND META_DATA_ATTR_VALUE = '" + dataset_id + "' ",
+        "COLL_NAME = '{0}' || like '{0}/%' AND META_DATA_ATTR_NAME = 'dataset_id' "
+        "AND META_DATA_ATTR_VALUE = '{1}'".format(root, dataset_id),
         genquery.AS_LIST, ctx
     )
 
-    return len(list(main_collection_iterator) + list(subcollection_iterator))
+    return sum(1 for _ in iter)
 
 
-def get_aggregated_object_error_count(ctx, tl_collection):
+def get_aggregated_object_error_count(ctx, tl, is_collection):
     """Return total amount of object errors.
 
     :param ctx:           Combined type of a callback and rei struct
-    :param tl_collection: Collection name of top level
+    :param tl:            Path of top level collection or data object
+    :param is_collection: Whether the top level is a collection
 
     :returns: Total amount of object errors
     """
-    main_collection_iterator = genquery.row_iterator(
-        "DATA_ID",
-        "COLL_NAME = '" + tl_collection + "' AND META_DATA_ATTR_NAME = 'error' ",
-        genquery.AS_LIST, ctx
-    )
+    if is_collection:
+        condition = "COLL_NAME = '{0}' || like '{0}/%'".format(tl)
+    else:
+        condition = "COLL_NAME = '{}' AND DATA_NAME = '{}'".format(pathutil.dirname(tl), pathutil.basename(tl))
 
-    subcollection_iterator = genquery.row_iterator(
+    iter = genquery.row_iterator(
         "DATA_ID",
-        "COLL_NAME like '" + tl_collection + "/%' AND META_DATA_ATTR_NAME = 'error' ",
+        condition + " AND META_DATA_ATTR_NAME = 'error'",
         genquery.AS_LIST, ctx
     )
 
-    return len(list(main_collection_iterator) + list(subcollection_iterator))
+    return sum(1 for _ in iter)
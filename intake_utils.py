@@ -8,6 +8,7 @@ __license__   = 'GPLv3, see LICENSE'
 
 import os
 import re
+from collections import OrderedDict
 
 
 def intake_tokens_identify_dataset(tokens):
@@ -202,3 +203,86 @@ def dataset_parse_id(dataset_id):
     dataset['directory'] = dataset_parts[4]
 
     return dataset
+
+
+def dataset_file_stats(rows, dataset_paths):
+    """Aggregate file counts and sizes of datasets in a single pass over data objects.
+
+    Every data object is counted once, regardless of its number of replicas,
+    and is added to each dataset whose collection tree it is in.
+
+    :param rows:          Iterable of (collection name, data id, data size) rows,
+                          ordered by data id
+    :param dataset_paths: Collection paths of the datasets
+
+    :returns: Dict of dataset path -> (number of files, total file size)
+    """
+    stats = {path: [0, 0] for path in dataset_paths}
+    previous_id = None
+
+    for coll_name, data_id, data_size in rows:
+        # Replicas of a data object are adjacent, only count the first.
+        if data_id == previous_id:
+            continue
+        previous_id = data_id
+
+        while coll_name not in ('', '/'):
+            if coll_name in stats:
+                stats[coll_name][0] += 1
+                stats[coll_name][1] += int(data_size or 0)
+            coll_name = coll_name.rsplit('/', 1)[0]
+
+    return {path: tuple(stat) for path, stat in stats.items()}
+
+
+def dataset_locked_toplevels(rows):
+    """Determine the datasets of which all toplevel objects are locked.
+
+    :param rows: Iterable of (object path, attribute name, attribute value) rows
+                 with the dataset_toplevel, to_vault_lock and to_vault_freeze
+                 AVUs of toplevel objects
+
+    :returns: List of (dataset id, toplevel object paths) tuples, in order of first appearance
+    """
+    datasets = OrderedDict()
+    locked = set()
+
+    for path, attribute, value in rows:
+        if attribute == 'dataset_toplevel':
+            datasets.setdefault(value, []).append(path)
+        elif attribute in ('to_vault_lock', 'to_vault_freeze'):
+            locked.add(path)
+
+    return [(dataset_id, paths) for dataset_id, paths in datasets.items()
+            if all(path in locked for path in paths)]
+
+
+def status_avu_operations(values, attribute, value, remove):
+    """Determine the atomic metadata operations that set or remove a status attribute.
+
+    :param values:    Current values of the status attribute on the object
+    :param attribute: Name of the status attribute
+    :param value:     Value to set, ignored when removing the status
+    :param remove:    Whether to remove the status instead of setting it
+
+    :returns: List of atomic metadata operations, empty if the object already has the requested status
+    """
+    if not remove and values == [value]:
+        return []
+
+    operations = [{"operation": "remove", "attribute": attribute, "value": v, "units": ""} for v in values]
+    if not remove:
+        operations.append({"operation": "add", "attribute": attribute, "value": value, "units": ""})
+
+    return operations
+
+
+def invert_avu_operations(operations):
+    """Determine the atomic metadata operations that undo the given operations.
+
+    :param operations: List of atomic metadata operations
+
+    :returns: List of atomic metadata operations
+    """
+    inverse = {"add": "remove", "remove": "add"}
+    return [dict(operation, operation=inverse[operation["operation"]]) for operation in reversed(operations)]
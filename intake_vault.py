@@ -4,19 +4,29 @@
 __copyright__ = 'Copyright (c) 2021, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
-import itertools
 import time
+from collections import OrderedDict
 
 import genquery
 
 import intake
 import intake_lock
 import intake_scan
+import vault
+from intake_utils import dataset_locked_toplevels
 from util import *
 
 __all__ = ['rule_intake_to_vault']
 
 
+COPIED_METADATA = ["wave", "experiment_type", "pseudocode", "version",
+                   "error", "warning", "comment", "dataset_error",
+                   "dataset_warning", "datasetid"]
+"""From the original object only these attributes are copied to the vault object, other info is ignored."""
+
+LOCK_ATTRIBUTES = ['dataset_toplevel', 'to_vault_lock', 'to_vault_freeze']
+
+
 @rule.make(inputs=range(2), outputs=range(2, 2))
 def rule_intake_to_vault(ctx, intake_root, vault_root):
     # 1. add to_vault_freeze metadata lock to the dataset
@@ -34,68 +44,59 @@ def rule_intake_to_vault(ctx, intake_root, vault_root):
     # processing varies slightly between them, so process each type in turn
     #
 
-    # status: 0 is success, nonzero is error
-    status = 0
     # counter of datasets moved to the vault area
     datasets_moved = 0
 
-    # TYPE A:
-    c_main_collection_iterator = genquery.row_iterator(
-        "COLL_NAME, META_COLL_ATTR_VALUE",
-        "META_COLL_ATTR_NAME = 'dataset_toplevel' AND COLL_NAME = '" + intake_root + "'",
-        genquery.AS_LIST, ctx)
-
-    for row in itertools.chain(c_main_collection_iterator):
-        toplevel_collection = row[0]
-        dataset_id = row[1]
-        # Get status ( locked / frozen )
-        locked_state = intake_scan.object_is_locked(ctx, toplevel_collection, True)
-        if locked_state['locked']:
-            # Freeze the dataset
-            intake_lock.intake_dataset_freeze(ctx, toplevel_collection, dataset_id)
+    for toplevel_collection, dataset_id, is_collection in intake_locked_datasets(ctx, intake_root):
+        # Freeze the dataset
+        intake_lock.intake_dataset_freeze(ctx, toplevel_collection, dataset_id)
 
-            # Dataset frozen, now move to vault and remove from intake area
+        # Dataset frozen, now move to vault and remove from intake area
+        if is_collection:
             status = dataset_collection_move_2_vault(ctx, toplevel_collection, dataset_id, vault_root)
-            if status == 0:
-                datasets_moved += 1
+        else:
+            status = dataset_objects_only_move_2_vault(ctx, toplevel_collection, dataset_id, vault_root)
 
-    # TYPE B:
-    d_main_collection_iterator = genquery.row_iterator(
-        "COLL_NAME, META_DATA_ATTR_VALUE",
-        "META_DATA_ATTR_NAME = 'dataset_toplevel' AND COLL_NAME = '" + intake_root + "'",
-        genquery.AS_LIST, ctx)
+        if status == 0:
+            datasets_moved += 1
 
-    for row in itertools.chain(d_main_collection_iterator):
-        toplevel_collection = row[0]
-        dataset_id = row[1]
-        # check if to_vault_lock exists on all the dataobjects of this dataset
-        all_locked = True
-        iter2 = genquery.row_iterator(
-            "DATA_NAME",
-            "COLL_NAME = '" + toplevel_collection + "' "
-            "AND META_DATA_ATTR_NAME = 'dataset_toplevel' "
-            "AND META_DATA_ATTR_VALUE = '" + dataset_id + "'",
-            genquery.AS_LIST, ctx)
+    if datasets_moved:
+        log.write(ctx, "Datasets moved to the vault: " + str(datasets_moved))
 
-        for row2 in iter2:
-            locked_state = intake_scan.object_is_locked(ctx, toplevel_collection + '/' + row2[0], False)
-            all_locked = all_locked and locked_state['locked']
-            if not all_locked:
-                break
+    return 0
 
-        if all_locked:
-            # Freeze the dataset
-            intake_lock.intake_dataset_freeze(ctx, toplevel_collection, dataset_id)
 
-            # Dataset frozen, now move to fault and remove from intake area
-            status = dataset_objects_only_move_2_vault(ctx, toplevel_collection, dataset_id, vault_root)
-            if status == 0:
-                datasets_moved += 1
+def intake_locked_datasets(ctx, intake_root):
+    """Plan the batch of locked datasets to move to the vault.
 
-    if datasets_moved:
-        log.write(ctx, "Datasets moved to the vault: " + str(datasets_moved))
+    The lock state of all datasets is determined with one query per dataset type,
+    instead of one query per toplevel object.
 
-    return 0
+    :param ctx:         Combined type of a callback and rei struct
+    :param intake_root: Intake collection to find datasets in
+
+    :returns: List of (toplevel collection, dataset id, is collection) tuples
+    """
+    attributes = "', '".join(LOCK_ATTRIBUTES)
+
+    # TYPE A:
+    iter = genquery.row_iterator(
+        "COLL_NAME, META_COLL_ATTR_NAME, META_COLL_ATTR_VALUE",
+        "COLL_NAME = '{}' AND META_COLL_ATTR_NAME in ('{}')".format(intake_root, attributes),
+        genquery.AS_LIST, ctx)
+
+    datasets = [(paths[0], dataset_id, True) for dataset_id, paths in dataset_locked_toplevels(iter)]
+
+    # TYPE B:
+    iter = genquery.row_iterator(
+        "COLL_NAME, DATA_NAME, META_DATA_ATTR_NAME, META_DATA_ATTR_VALUE",
+        "COLL_NAME = '{}' AND META_DATA_ATTR_NAME in ('{}')".format(intake_root, attributes),
+        genquery.AS_LIST, ctx)
+
+    rows = ((row[0] + '/' + row[1], row[2], row[3]) for row in iter)
+    datasets += [(intake_root, dataset_id, False) for dataset_id, _ in dataset_locked_toplevels(rows)]
+
+    return datasets
 
 
 def dataset_collection_move_2_vault(ctx, toplevel_collection, dataset_id, vault_root):
@@ -108,7 +109,6 @@ def dataset_collection_move_2_vault(ctx, toplevel_collection, dataset_id, vault_
 
     :returns: Status
     """
-    status = 0
     if vault_dataset_exists(ctx, vault_root, dataset_id):
         # duplicate dataset, signal error and throw out of vault queue
         log.write(ctx, "INFO: version already exists in vault: " + dataset_id)
@@ -128,15 +128,13 @@ def dataset_collection_move_2_vault(ctx, toplevel_collection, dataset_id, vault_
         log.write(ctx, "ERROR: parent collection could not be created " + vault_parent)
         return 2
 
-    # variable for treewalk interface
-    buffer = {}
-    buffer["source"] = toplevel_collection
-    buffer["destination"] = vault_path
+    condition = "COLL_NAME = '{0}' || like '{0}/%'".format(toplevel_collection)
+    items = vault_plan_ingest(ctx, toplevel_collection, vault_path, condition, "")
 
-    status = vault_tree_walk_collection(ctx, toplevel_collection, buffer, vault_walk_ingest_object)
+    status = vault_ingest_objects(ctx, items)
+    if status == 0 and not vault_verify_ingest(ctx, items, toplevel_collection, vault_path, True):
+        status = 4
 
-    # reset buffer
-    buffer = {}
     if status == 0:
         # stamp the vault dataset collection with additional metadata
         avu.set_on_coll(ctx, vault_path, "dataset_date_created", str(int(time.time())))
@@ -150,8 +148,8 @@ def dataset_collection_move_2_vault(ctx, toplevel_collection, dataset_id, vault_
     else:
         # move failed (partially), cleanup vault
         # NB: keep the dataset in the vault queue so we can retry some other time
-        log.write("ERROR: Ingest failed for " + dataset_id + ", error = " + status)
-        status = vault_tree_walk_collection(ctx, vault_path, buffer, vault_walk_remove_object)
+        log.write(ctx, "ERROR: Ingest failed for " + dataset_id + ", error = " + str(status))
+        vault_remove_ingest(ctx, vault_path)
 
     return status
 
@@ -166,7 +164,6 @@ def dataset_objects_only_move_2_vault(ctx, toplevel_collection, dataset_id, vaul
 
     :returns: Status
     """
-    status = 0
     if vault_dataset_exists(ctx, vault_root, dataset_id):
         # duplicate dataset, signal error and throw out of vault queue
         log.write(ctx, "INFO: version already exists in vault: " + dataset_id)
@@ -176,8 +173,6 @@ def dataset_objects_only_move_2_vault(ctx, toplevel_collection, dataset_id, vaul
         is_collection = tl_info['is_collection']
         tl_objects = tl_info['objects']
 
-        # dataset_add_error(ctx, tl_objects, is_collection, "The wave '" + components['wave'] + "' is not in the list of accepted waves")
-
         intake_scan.dataset_add_error(ctx, tl_objects, is_collection, message)
         intake_lock.intake_dataset_melt(ctx, toplevel_collection, dataset_id)
         intake_lock.intake_dataset_unlock(ctx, toplevel_collection, dataset_id)
@@ -202,175 +197,189 @@ def dataset_objects_only_move_2_vault(ctx, toplevel_collection, dataset_id, vaul
         return 3
 
     # copy data objects to the vault
-    iter = genquery.row_iterator(
-        "DATA_NAME",
-        "COLL_NAME = '" + toplevel_collection + "' "
-        "AND META_DATA_ATTR_NAME = 'dataset_toplevel' "
-        "AND META_DATA_ATTR_VALUE = '" + dataset_id + "' ",
-        genquery.AS_LIST, ctx)
+    condition = "COLL_NAME = '{}'".format(toplevel_collection)
+    items = vault_plan_ingest(ctx, toplevel_collection, vault_path, condition, dataset_id)
 
-    for row in iter:
-        intake_path = toplevel_collection + '/' + row[0]
+    status = vault_ingest_objects(ctx, items)
+    if status == 0 and not vault_verify_ingest(ctx, items, toplevel_collection, vault_path, False):
+        status = 4
 
-        status = vault_ingest_object(ctx, intake_path, False, vault_path + "/" + row[0])
-        if status:
-            break
+    if status:
+        # error occurred during ingest, cleanup vault area and relay the error to user
+        # NB: keep the dataset in the vault queue so we can retry some other time
+        log.write(ctx, "ERROR: Ingest failed for " + dataset_id + ", error = " + str(status))
+        vault_remove_ingest(ctx, vault_path)
+        return status
 
-    # data ingested, what's left is to delete the original in intake area
+    # data ingested and verified, what's left is to delete the original in intake area
     # this will also melt/unfreeze etc because metadata is removed too
-    iter = genquery.row_iterator(
-        "DATA_NAME",
-        "COLL_NAME = '" + toplevel_collection + "' "
-        "AND META_DATA_ATTR_NAME = 'dataset_toplevel' "
-        "AND META_DATA_ATTR_VALUE = '" + dataset_id + "' ",
-        genquery.AS_LIST, ctx)
-
-    for row in iter:
-        intake_path = toplevel_collection + "/" + row[0]
-        # Now remove data object in intake
+    for intake_path in items:
         try:
             data_object.remove(ctx, intake_path, force=True)
         except Exception:
+            # The vault copy has been verified, so it is kept
             log.write(ctx, "ERROR: unable to remove intake object " + intake_path)
-            # error occurred during ingest, cleanup vault area and relay the error to user
-            # NB: keep the dataset in the vault queue so we can retry some other time
-            log.write(ctx, "ERROR: Ingest failed for *datasetId error = *status")
-
-            # reset buffer interface
-            buffer = {}
-            status = vault_tree_walk_collection(ctx, vault_path, buffer, vault_walk_remove_object)
+            status = 3
 
     # Finally return status
     return status
 
 
-def vault_ingest_object(ctx, object_path, is_collection, vault_path):
-    # from the original object only the below list is copied to the vault object, other info is ignored
-    copied_metadata = ["wave", "experiment_type", "pseudocode", "version",
-                       "error", "warning", "comment", "dataset_error",
-                       "dataset_warning", "datasetid"]
+def vault_plan_ingest(ctx, source, destination, condition, dataset_id):
+    """Plan the ingest of a dataset with a fixed number of queries.
 
-    if not is_collection:
-        # first chksum the original file then use it to verify the vault copy
-        try:
-            ctx.msiDataObjChksum(object_path, "forceChksum=", 0)
-            ctx.msiDataObjCopy(object_path, vault_path, 'verifyChksum=', 0)
-        except msi.Error:
-            return 1
+    :param ctx:         Combined type of a callback and rei struct
+    :param source:      Toplevel collection in the intake area
+    :param destination: Path of the dataset in the vault
+    :param condition:   Condition on COLL_NAME selecting the collections of the dataset
+    :param dataset_id:  Only plan data objects that are toplevel of this dataset and no
+                        collections, or plan the whole tree if empty
 
-        coll, dataname = pathutil.chop(object_path)
+    :returns: Ordered dict of source path -> dict with destination, is_collection and
+              AVUs, with parent collections before their contents
+    """
+    items = OrderedDict()
 
-        iter = genquery.row_iterator(
-            "META_DATA_ATTR_NAME, META_DATA_ATTR_VALUE",
-            "COLL_NAME = '" + coll + "' AND DATA_NAME = '" + dataname + "' ",
-            genquery.AS_LIST, ctx)
+    def add_item(path, is_collection, owner_name, owner_zone, create_time):
+        items[path] = {"destination": destination + path[len(source):],
+                       "is_collection": is_collection,
+                       "avus": [("submitted_by", owner_name + '#' + owner_zone),
+                                ("submitted_date", create_time)]}
 
-        for row in iter:
-            if row[0] in copied_metadata:
-                avu.set_on_data(ctx, vault_path, row[0], row[1])
+    def add_avu(path, attribute, value):
+        if path in items and attribute in COPIED_METADATA:
+            items[path]["avus"].append((attribute, value))
 
-        # add metadata found in system info
-        iter = genquery.row_iterator(
-            "DATA_OWNER_NAME, DATA_OWNER_ZONE, DATA_CREATE_TIME",
-            "COLL_NAME = '" + coll + "' AND DATA_NAME = '" + dataname + "' ",
-            genquery.AS_LIST, ctx)
+    attributes = "', '".join(COPIED_METADATA)
 
-        for row in iter:
-            avu.set_on_data(ctx, vault_path, "submitted_by=", row[0] + '#' + row[1])
-            avu.set_on_data(ctx, vault_path, "submitted_date", row[2])
+    if dataset_id:
+        data_condition = condition + " AND META_DATA_ATTR_NAME = 'dataset_toplevel' AND META_DATA_ATTR_VALUE = '{}'".format(dataset_id)
     else:
-        # CREATE COLLECTION
-        try:
-            collection.create(ctx, vault_path, "1")
-        except msi.Error:
-            return 1
+        data_condition = condition
 
         iter = genquery.row_iterator(
-            "META_COLL_ATTR_NAME, META_COLL_ATTR_VALUE",
-            "COLL_NAME = '" + object_path + "' ",
-            genquery.AS_LIST, ctx)
-
+            "ORDER(COLL_NAME), COLL_OWNER_NAME, COLL_OWNER_ZONE, COLL_CREATE_TIME",
+            condition, genquery.AS_LIST, ctx)
         for row in iter:
-            if row[0] in copied_metadata:
-                avu.set_on_coll(ctx, vault_path, row[0], row[1])
+            add_item(row[0], True, row[1], row[2], row[3])
 
-        # add metadata found in system info
         iter = genquery.row_iterator(
-            "COLL_OWNER_NAME, COLL_OWNER_ZONE, COLL_CREATE_TIME",
-            "COLL_NAME = '" + object_path + "' ",
+            "COLL_NAME, META_COLL_ATTR_NAME, META_COLL_ATTR_VALUE",
+            condition + " AND META_COLL_ATTR_NAME in ('{}')".format(attributes),
             genquery.AS_LIST, ctx)
-
         for row in iter:
-            avu.set_on_coll(ctx, vault_path, "submitted_by=", row[0] + '#' + row[1])
-            avu.set_on_coll(ctx, vault_path, "submitted_date", row[2])
+            add_avu(row[0], row[1], row[2])
 
-    return 0
+    iter = genquery.row_iterator(
+        "COLL_NAME, DATA_NAME, DATA_OWNER_NAME, DATA_OWNER_ZONE, DATA_CREATE_TIME",
+        data_condition, genquery.AS_LIST, ctx)
+    for row in iter:
+        add_item(row[0] + '/' + row[1], False, row[2], row[3], row[4])
 
+    iter = genquery.row_iterator(
+        "COLL_NAME, DATA_NAME, META_DATA_ATTR_NAME, META_DATA_ATTR_VALUE",
+        condition + " AND META_DATA_ATTR_NAME in ('{}')".format(attributes),
+        genquery.AS_LIST, ctx)
+    for row in iter:
+        add_avu(row[0] + '/' + row[1], row[2], row[3])
 
-def vault_walk_remove_object(ctx, item_parent, item_name, is_collection):
-    status = 0
-    try:
-        if is_collection:
-            collection.remove(ctx, item_parent + '/' + item_name)
-        else:
-            data_object.remove(ctx, item_parent + '/' + item_name, force=True)
-    except Exception:
-        status = 1
+    return items
 
-    return status
 
+def vault_ingest_objects(ctx, items):
+    """Copy planned collections and data objects to the vault with their metadata.
+
+    Data objects are copied with the parallel transfer threads configured for
+    the vault, the metadata of every object is applied in one atomic operation.
+
+    :param ctx:   Combined type of a callback and rei struct
+    :param items: Ingest plan as returned by vault_plan_ingest()
+
+    :returns: Status
+    """
+    copy_options = 'numThreads={}++++verifyChksum='.format(vault.get_vault_copy_numthreads(ctx))
+
+    for path, item in items.items():
+        try:
+            if item["is_collection"]:
+                collection.create(ctx, item["destination"], "1")
+            else:
+                # first chksum the original file then use it to verify the vault copy
+                ctx.msiDataObjChksum(path, "forceChksum=", 0)
+                ctx.msiDataObjCopy(path, item["destination"], copy_options, 0)
+        except msi.Error:
+            return 1
 
-def vault_walk_ingest_object(ctx, item_parent, item_name, is_collection, buffer):
-    source_path = item_parent + '/' + item_name
-    dest_path = buffer["destination"]
-    if source_path != buffer["source"]:
-        # rewrite path to copy objects that are located underneath the toplevel collection
-        source_length = len(source_path)
-        relative_path = source_path[(len(buffer["source"]) + 1): source_length]
-        dest_path = buffer["destination"] + '/' + relative_path
+        operations = {"entity_name": item["destination"],
+                      "entity_type": "collection" if item["is_collection"] else "data_object",
+                      "operations": [{"operation": "add", "attribute": attribute, "value": value, "units": ""}
+                                     for attribute, value in item["avus"]]}
+        if not avu.apply_atomic_operations(ctx, operations):
+            return 1
 
-    return vault_ingest_object(ctx, source_path, is_collection, dest_path)
+    return 0
 
 
-def vault_tree_walk_collection(ctx, path, buffer, rule_to_process):
-    """Walk a subtree and perform 'rule_to_process' per item.
+def vault_data_stats(ctx, coll, recursive):
+    """Get sizes and checksums of all data objects in a collection from the catalog.
 
-    :param ctx:             Combined type of a callback and rei struct
-    :param path:            Path of collection to treewalk
-    :param buffer:          Exclusively to be used by the rule we will can
-    :param rule_to_process: Name of the rule to be executed in the context of a tree-item
+    :param ctx:       Combined type of a callback and rei struct
+    :param coll:      Collection to get data objects of
+    :param recursive: Include data objects in subcollections
 
-    :returns: Error status
+    :returns: Dict of data object path -> set of (size, checksum) of its replicas
     """
-    parent_collection, collection = pathutil.chop(path)
+    condition = "COLL_NAME = '{0}' || like '{0}/%'" if recursive else "COLL_NAME = '{0}'"
+    stats = {}
 
-    error = 0
-    # first deal with any subcollections within this collection
     iter = genquery.row_iterator(
-        "COLL_NAME",
-        "COLL_PARENT_NAME = '" + path + "' ",
-        genquery.AS_LIST, ctx)
+        "COLL_NAME, DATA_NAME, DATA_SIZE, DATA_CHECKSUM",
+        condition.format(coll), genquery.AS_LIST, ctx)
     for row in iter:
-        error = vault_tree_walk_collection(ctx, row[0], buffer, rule_to_process)
-        if error:
-            break
+        stats.setdefault(row[0] + '/' + row[1], set()).add((row[2], row[3]))
 
-    # when done then process the dataobjects directly located within this collection
-    if error == 0:
-        iter = genquery.row_iterator(
-            "DATA_NAME",
-            "COLL_NAME = '" + path + "' ",
-            genquery.AS_LIST, ctx)
-        for row in iter:
-            error = rule_to_process(ctx, path, row[0], False, buffer)
-            if error:
-                break
+    return stats
 
-    # and lastly process the collection itself
-    if error == 0:
-        error = rule_to_process(ctx, parent_collection, collection, True, buffer)
 
-    return error
+def vault_verify_ingest(ctx, items, source, destination, recursive):
+    """Verify sizes and checksums of ingested data objects against their originals.
+
+    :param ctx:         Combined type of a callback and rei struct
+    :param items:       Ingest plan as returned by vault_plan_ingest()
+    :param source:      Toplevel collection in the intake area
+    :param destination: Path of the dataset in the vault
+    :param recursive:   Whether the dataset includes subcollections
+
+    :returns: Boolean indicating whether all data objects were ingested correctly
+    """
+    source_stats = vault_data_stats(ctx, source, recursive)
+    vault_stats = vault_data_stats(ctx, destination, recursive)
+
+    for path, item in items.items():
+        if item["is_collection"]:
+            continue
+
+        # Replication in the vault may not have checksummed every replica yet,
+        # so one verified replica suffices.
+        originals = source_stats.get(path, set())
+        if not any(checksum and (size, checksum) in originals
+                   for size, checksum in vault_stats.get(item["destination"], set())):
+            log.write(ctx, "ERROR: vault copy of " + path + " does not match the original")
+            return False
+
+    return True
+
+
+def vault_remove_ingest(ctx, vault_path):
+    """Remove a partially ingested dataset from the vault.
+
+    :param ctx:        Combined type of a callback and rei struct
+    :param vault_path: Path of the dataset in the vault
+    """
+    try:
+        collection.remove(ctx, vault_path)
+    except Exception:
+        log.write(ctx, "ERROR: unable to remove partial vault dataset " + vault_path)
 
 
 def vault_dataset_add_default_metadata(ctx, vault_path, dataset_id):
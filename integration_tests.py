@@ -298,6 +298,14 @@ def _test_get_latest_vault_metadata_path_normal(ctx):
     return latest_file == os.path.join(tmp_collection, "yoda-metadata[1722869877].json")
 
 
+def _test_vault_metadata_schema_report(ctx):
+    tmp_object = _create_tmp_object(ctx)
+    ctx.rule_batch_vault_metadata_schema_report("", tmp_object, "", "")
+    result = [json.loads(line) for line in data_object.read(ctx, tmp_object).splitlines()]
+    data_object.remove(ctx, tmp_object)
+    return result
+
+
 def _test_folder_secure_func(ctx, func):
     """Create tmp collection, apply func to it and get result, and clean up.
        Used for testing functions that modify avu/acls related to folder secure.
@@ -597,8 +605,8 @@ basic_integration_tests = [
      "check": lambda x: x == "/tempZone/yoda/schemas/default-3/metadata.json"},
     # Vault metadata schema report: only check return value type, not contents
     {"name": "schema_transformation.batch_vault_metadata_schema_report",
-     "test": lambda ctx: ctx.rule_batch_vault_metadata_schema_report(""),
-     "check": lambda x: isinstance(json.loads(x['arguments'][0]), dict)},
+     "test": lambda ctx: _test_vault_metadata_schema_report(ctx),
+     "check": lambda x: all(isinstance(line, dict) and "package" in line for line in x)},
     {"name":  "util.collection.exists.yes",
      "test": lambda ctx: collection.exists(ctx, "/tempZone/yoda"),
      "check": lambda x: x},
@@ -1,17 +1,205 @@
 # -*- coding: utf-8 -*-
 """Rules for sending e-mails."""
 
-__copyright__ = 'Copyright (c) 2020-2022, Utrecht University'
+__copyright__ = 'Copyright (c) 2020-2024, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
+import atexit
 import email
 import re
 import smtplib
+import socket
+import time
 from email.mime.text import MIMEText
 
 from util import *
+from util.spool import get_spool_data, put_spool_data
 
-__all__ = ['rule_mail_test']
+__all__ = ['rule_mail_test',
+           'rule_mail_flush_spool']
+
+# An SMTP connection is reused for all mails sent within a rule run (agent).
+# It is renewed after this many messages, or after being idle for this many seconds.
+MAX_MESSAGES_PER_CONNECTION = 1000
+MAX_IDLE_SECONDS = 60
+
+# Number of attempts for sending a mail when the mail server replies with a
+# transient (4xx) error, before the mail is put in the spool for sending it later
+# (see rule_mail_flush_spool).
+SEND_ATTEMPTS = 3
+
+# Timeout in seconds for connecting to the mail server.
+CONNECT_TIMEOUT = 10
+
+# Once the mail server cannot be reached, mails are put in the spool directly,
+# without connecting again, for this many seconds.
+SERVER_DOWN_SECONDS = 300
+
+
+class TransientError(Exception):
+    """Sending mail failed, but may succeed when retried later."""
+
+
+class ServerDownError(TransientError):
+    """Sending mail failed, because the mail server cannot be reached."""
+
+
+class Transport(object):
+    """Reusable authenticated connection to the configured SMTP server."""
+
+    def __init__(self):
+        self.smtp = None
+        self.sent = 0
+        self.last_used = 0
+        self.down_until = 0
+
+    def is_down(self):
+        """Whether the mail server could not be reached recently."""
+        return time.time() < self.down_until
+
+    def mark_down(self):
+        """Do not connect to the mail server for the next SERVER_DOWN_SECONDS."""
+        self.close()
+        self.down_until = time.time() + SERVER_DOWN_SECONDS
+
+    def close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except Exception:
+                pass
+        self.smtp = None
+        self.sent = 0
+
+    def _connect(self, ctx):
+        proto, host, port = _server_address()
+
+        try:
+            smtp = (smtplib.SMTP_SSL if proto == 'smtps' else smtplib.SMTP)(host, port, timeout=CONNECT_TIMEOUT)
+
+            if proto != 'smtps' and config.smtp_starttls:
+                # Enforce TLS.
+                smtp.starttls()
+
+        except Exception as e:
+            log.write(ctx, 'Could not connect to mail server at {}://{}:{}: {}'.format(proto, host, port, e))
+            raise ServerDownError(e)
+
+        try:
+            if config.smtp_auth:
+                smtp.login(config.smtp_username, config.smtp_password)
+
+        except smtplib.SMTPAuthenticationError:
+            log.write(ctx, 'Could not login to mail server with configured credentials')
+            raise
+        except Exception as e:
+            log.write(ctx, 'Could not login to mail server: {}'.format(e))
+            raise ServerDownError(e)
+
+        return smtp
+
+    def send(self, ctx, sender, recipients, message):
+        """Send one message, (re)connecting to the mail server when needed.
+
+        :param ctx:        Combined type of a callback and rei struct
+        :param sender:     Envelope sender address
+        :param recipients: List of envelope recipient addresses
+        :param message:    Message as string
+
+        :raises ServerDownError: Sending failed, because the mail server cannot be reached
+        :raises TransientError:  Sending failed, but may succeed when retried
+        """
+        if self.smtp is not None and (self.sent >= MAX_MESSAGES_PER_CONNECTION
+                                      or time.time() - self.last_used > MAX_IDLE_SECONDS):
+            self.close()
+
+        reused = self.smtp is not None
+        try:
+            self._sendmail(ctx, sender, recipients, message)
+        except ServerDownError:
+            if not reused:
+                raise
+            # The server may have closed the reused connection, try once over a new connection.
+            self._sendmail(ctx, sender, recipients, message)
+
+    def _sendmail(self, ctx, sender, recipients, message):
+        if self.smtp is None:
+            self.smtp = self._connect(ctx)
+
+        try:
+            self.smtp.sendmail(sender, recipients, message)
+        except (smtplib.SMTPServerDisconnected, socket.error) as e:
+            self.close()
+            raise ServerDownError(e)
+        except smtplib.SMTPResponseException as e:
+            if 400 <= e.smtp_code < 500:
+                # Reset the connection, the server may be in a state we cannot recover from.
+                self.close()
+                raise TransientError(e)
+            raise
+
+        self.sent += 1
+        self.last_used = time.time()
+
+
+_transport = Transport()
+atexit.register(_transport.close)
+
+
+def _server_address():
+    """Parse the configured mail server into a (protocol, host, port) tuple."""
+    # e.g. 'smtps://smtp.gmail.com:465' for SMTP over TLS, or
+    # 'smtp://smtp.gmail.com:587' for STARTTLS on the mail submission port.
+    proto, host, port = re.search(r'^(smtps?)://([^:]+)(?::(\d+))?$', config.smtp_server).groups()
+
+    # Default to port 465 for SMTP over TLS, and 587 for standard mail
+    # submission with STARTTLS.
+    port = int(port or (465 if proto == 'smtps' else 587))
+
+    return proto, host, port
+
+
+def _deliver(ctx, sender, recipients, message, spool=True):
+    """Send a message over the shared transport, retrying on transient errors.
+
+    Mails are not retried when the mail server cannot be reached. Subsequent mails
+    then skip the mail server for SERVER_DOWN_SECONDS and go to the spool directly.
+
+    :param ctx:        Combined type of a callback and rei struct
+    :param sender:     Envelope sender address
+    :param recipients: List of envelope recipient addresses
+    :param message:    Message as string
+    :param spool:      Put the message in the spool if it could not be sent because of transient errors
+
+    :raises TransientError: Sending failed because of transient errors and the message was not spooled
+
+    :returns: API status, with status 'spooled' if the message was put in the spool
+    """
+    if _transport.is_down():
+        error = ServerDownError('Mail server could not be reached recently')
+    else:
+        for attempt in range(SEND_ATTEMPTS):
+            if attempt > 0:
+                time.sleep(attempt)
+            try:
+                _transport.send(ctx, sender, recipients, message)
+                return
+            except ServerDownError as e:
+                _transport.mark_down()
+                error = e
+                break
+            except TransientError as e:
+                error = e
+            except Exception as e:
+                log.write(ctx, 'Could not send mail: {}'.format(e))
+                return api.Error('internal', 'Mail configuration error')
+
+    if not spool:
+        raise error
+
+    log.write(ctx, 'WARNING: could not send mail, putting it in the spool for sending later: {}'.format(error))
+    put_spool_data(constants.PROC_MAIL, [{"sender": sender, "recipients": recipients, "message": message}])
+    return api.Result(status='spooled', info='Mail could not be sent yet and was put in the spool')
 
 
 def send(ctx, to, actor, subject, body, cc=None):
@@ -20,6 +208,12 @@ def send(ctx, to, actor, subject, body, cc=None):
     The originating address and mail server credentials are taken from the
     ruleset configuration file.
 
+    The connection to the mail server is reused for subsequent mails in the
+    same rule run. Mails that cannot be sent because of transient errors are
+    retried, and finally put in the spool (see rule_mail_flush_spool). Spooled
+    mails are only sent when tools/mail/mail-flush-spool.sh is run, which
+    should be scheduled (e.g. in cron) for them to go out.
+
     :param ctx:     Combined type of a callback and rei struct
     :param to:      Recipient of the mail
     :param actor:   Actor of the mail
@@ -27,7 +221,8 @@ def send(ctx, to, actor, subject, body, cc=None):
     :param body:    Body of mail
     :param cc:      Comma-separated list of CC recipient(s) of email (optional)
 
-    :returns: API status
+    :returns: API status: None if the mail was sent, a Result with status 'spooled'
+              if it was put in the spool, or an api.Error if it cannot be sent
     """
     if not config.notifications_enabled:
         log.write(ctx, 'Sending mail notifications is disabled')
@@ -39,81 +234,41 @@ def send(ctx, to, actor, subject, body, cc=None):
 
     log.write(ctx, u'Sending mail for <{}> to <{}>, subject <{}>'.format(actor, to, subject))
 
-    cfg = {k: getattr(config, v)
-           for k, v in [('from',      'notifications_sender_email'),
-                        ('from_name', 'notifications_sender_name'),
-                        ('reply_to',  'notifications_reply_to'),
-                        ('server',    'smtp_server')]}
-
-    if config.smtp_auth:
-        cfg['username'] = config.smtp_username
-        cfg['password'] = config.smtp_password
-
     try:
-        # e.g. 'smtps://smtp.gmail.com:465' for SMTP over TLS, or
-        # 'smtp://smtp.gmail.com:587' for STARTTLS on the mail submission port.
-        proto, host, port = re.search(r'^(smtps?)://([^:]+)(?::(\d+))?$', cfg['server']).groups()
-
-        # Default to port 465 for SMTP over TLS, and 587 for standard mail
-        # submission with STARTTLS.
-        port = int(port or (465 if proto == 'smtps' else 587))
-
+        _server_address()
     except Exception as e:
         log.write(ctx, 'Configuration error: ' + str(e))
         return api.Error('internal', 'Mail configuration error')
 
-    try:
-        smtp = (smtplib.SMTP_SSL if proto == 'smtps' else smtplib.SMTP)(host, port)
-
-        if proto != 'smtps' and config.smtp_starttls:
-            # Enforce TLS.
-            smtp.starttls()
-
-    except Exception as e:
-        log.write(ctx, 'Could not connect to mail server at {}://{}:{}: {}'.format(proto, host, port, e))
-        return api.Error('internal', 'Mail configuration error')
-
-    try:
-        if config.smtp_auth:
-            smtp.login(cfg['username'], cfg['password'])
-
-    except Exception:
-        log.write(ctx, 'Could not login to mail server with configured credentials')
-        return api.Error('internal', 'Mail configuration error')
-
     fmt_addr = '{} <{}>'.format
 
     msg = MIMEText(body, 'plain', 'UTF-8')
-    msg['Reply-To'] = cfg['reply_to']
+    msg['Reply-To'] = config.notifications_reply_to
     msg['Date'] = email.utils.formatdate()
-    msg['From'] = fmt_addr(cfg['from_name'], cfg['from'])
+    msg['From'] = fmt_addr(config.notifications_sender_name, config.notifications_sender_email)
     msg['To'] = to
     msg['Subject'] = subject
 
     if cc is not None:
         msg['Cc'] = cc
+        recipients = [to] + cc.split(',')
+    else:
+        recipients = [to]
 
-    try:
-        if cc is not None:
-            smtp.sendmail(cfg['from'], [to] + cc.split(','), msg.as_string())
-        else:
-            smtp.sendmail(cfg['from'], [to], msg.as_string())
-    except Exception as e:
-        log.write(ctx, 'Could not send mail: {}'.format(e))
-        return api.Error('internal', 'Mail configuration error')
-
-    try:
-        smtp.quit()
-    except Exception:
-        pass
+    return _deliver(ctx, config.notifications_sender_email, recipients, msg.as_string())
 
 
 def wrapper(ctx, to, actor, subject, body):
-    """Send mail, returns status/statusinfo in rule-language style."""
+    """Send mail, returns status/statusinfo in rule-language style.
+
+    Status is '0' if the mail was sent, '1' on errors and '2' if the mail was put in the spool.
+    """
     x = send(ctx, to, actor, subject, body)
 
     if type(x) is api.Error:
         return '1', x.info
+    if type(x) is api.Result and x.status == 'spooled':
+        return '2', x.status_info
     return '0', ''
 
 
@@ -132,3 +287,42 @@ Congratulations, you have sent a test mail from your Yoda system.
 Best regards,
 Yoda system
 """)
+
+
+@rule.make(inputs=[], outputs=[0])
+def rule_mail_flush_spool(ctx):
+    """Send mails that were put in the spool because the mail server could not be reached.
+
+    Stops at the first mail that still cannot be sent because of transient errors,
+    which is put back in the spool.
+
+    :param ctx: Combined type of a callback and rei struct
+
+    :returns: Number of mails sent
+    """
+    if user.user_type(ctx) != 'rodsadmin':
+        log.write(ctx, "Mail spool - Insufficient permissions - should only be called by rodsadmin")
+        return 0
+
+    # Try the mail server again, even if it could not be reached recently.
+    _transport.down_until = 0
+
+    sent = 0
+    while True:
+        item = get_spool_data(constants.PROC_MAIL)
+        if item is None:
+            break
+
+        try:
+            result = _deliver(ctx, item["sender"], item["recipients"], item["message"], spool=False)
+        except TransientError:
+            put_spool_data(constants.PROC_MAIL, [item])
+            break
+
+        if type(result) is api.Error:
+            log.write(ctx, 'Mail spool - dropping mail to <{}> that cannot be sent'.format(', '.join(item["recipients"])))
+        else:
+            sent += 1
+
+    log.write(ctx, 'Mail spool - sent {} spooled mail(s)'.format(sent))
+    return sent
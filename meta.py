@@ -54,6 +54,90 @@ def metadata_set_schema_id(metadata, schema_id):
     ])] + other_links
 
 
+# Validation is handed to a Python 3 interpreter to validate with the Draft201909 validator.
+# This can be removed when we can use Python 3 in the ruleset (iRODS 4.3.x).
+# The remote side keeps a compiled validator per schema key, so that a schema
+# only needs to be sent and compiled once per interpreter.
+_VALIDATOR_SOURCE = """
+    import jsonschema
+    validators = {}
+    while 1:
+        schema_key, schema, metadata_list, ignore_required = channel.receive()
+        if metadata_list is None:
+            break
+
+        if schema is not None:
+            validators[schema_key] = jsonschema.Draft201909Validator(schema)
+        validator = validators[schema_key]
+
+        def transform_error(e):
+            return {'message':     e.message,
+                    'path':        list(e.path),
+                    'schema_path': list(e.schema_path),
+                    'validator':   e.validator}
+
+        results = []
+        for metadata in metadata_list:
+            # Perform validation and filter errors.
+            errors = validator.iter_errors(metadata)
+
+            if ignore_required:
+                errors = filter(lambda e: e.validator not in ['required', 'dependencies'], errors)
+
+            results.append(list(map(transform_error, errors)))
+        channel.send(results)
+"""
+
+
+class MetadataValidator(object):
+    """Validates JSON metadata against JSON schemas using one Python 3 interpreter.
+
+    Compiled validators are cached per schema key in the interpreter, so that
+    batch jobs can validate many metadata files without spawning an interpreter
+    or recompiling a schema for every file. Call close() when done.
+    """
+
+    def __init__(self):
+        self._gateway = None
+        self._channel = None
+        self._schema_keys = set()
+
+    def validate(self, schema_key, schema, metadata_list, ignore_required=False):
+        """Validate a batch of metadata objects against one schema.
+
+        :param schema_key:      Key identifying the schema (e.g. the schema id)
+        :param schema:          Parsed JSON schema
+        :param metadata_list:   List of parsed JSON metadata objects
+        :param ignore_required: Ignore required fields
+
+        :returns: List of error lists, one for every metadata object
+        """
+        if self._channel is None:
+            import execnet
+            self._gateway = execnet.makegateway("popen//python=" + config.python3_interpreter)
+            self._channel = self._gateway.remote_exec(_VALIDATOR_SOURCE)
+
+        # Can't serialize OrderedDict, so transform to dicts.
+        if schema_key in self._schema_keys:
+            schema = None
+        else:
+            schema = json.loads(json.dumps(schema))
+        metadata_list = [json.loads(json.dumps(metadata)) for metadata in metadata_list]
+
+        self._channel.send((schema_key, schema, metadata_list, ignore_required))
+        self._schema_keys.add(schema_key)
+        return self._channel.receive()
+
+    def close(self):
+        """Stop the validation interpreter."""
+        if self._channel is not None:
+            self._channel.send((None, None, None, None))
+            self._gateway.exit()
+            self._gateway = None
+            self._channel = None
+            self._schema_keys = set()
+
+
 def get_json_metadata_errors(callback,
                              metadata_path,
                              metadata=None,
@@ -86,61 +170,11 @@ def get_json_metadata_errors(callback,
     if metadata is None:
         metadata = jsonutil.read(callback, metadata_path)
 
-    # Perform validation and filter errors.
-    # Validation is handed to a Python 3 interpreter to validate with the Draft201909 validator.
-    # This can be removed when we can use Python 3 in the ruleset (iRODS 4.3.x).
-    # validator = jsonschema.Draft7Validator(schema)
-    #
-    # errors = validator.iter_errors(metadata)
-    #
-    # if ignore_required:
-    #     errors = filter(lambda e: e.validator not in ['required', 'dependencies'], errors)
-    #
-    # def transform_error(e):
-    #     """Turn a ValidationError into a data structure for the frontend."""
-    #     return {'message':     e.message,
-    #             'path':        list(e.path),
-    #             'schema_path': list(e.schema_path),
-    #             'validator':   e.validator}
-    #
-    # return map(transform_error, errors)
-
-    # Can't serialize OrderedDict, so transform to dicts.
-    schema = json.loads(json.dumps(schema))
-    metadata = json.loads(json.dumps(metadata))
-
-    # Create gateway to Python 3.8.
-    import execnet
-    gw = execnet.makegateway("popen//python=" + config.python3_interpreter)
-
-    channel = gw.remote_exec("""
-        import jsonschema
-        errors = []
-        while 1:
-            schema, metadata, ignore_required = channel.receive()
-            if schema is None:
-                break
-
-            # Perform validation and filter errors.
-            validator = jsonschema.Draft201909Validator(schema)
-            errors = validator.iter_errors(metadata)
-
-            if ignore_required:
-                errors = filter(lambda e: e.validator not in ['required', 'dependencies'], errors)
-
-            def transform_error(e):
-                return {'message':     e.message,
-                        'path':        list(e.path),
-                        'schema_path': list(e.schema_path),
-                        'validator':   e.validator}
-
-            errors = list(map(transform_error, errors))
-        channel.send(errors)
-    """)
-
-    channel.send((schema, metadata, ignore_required))
-    channel.send((None, None, None))
-    errors = channel.receive()
+    validator = MetadataValidator()
+    try:
+        errors = validator.validate(None, schema, [metadata], ignore_required)[0]
+    finally:
+        validator.close()
 
     # Log metadata errors.
     for error in errors:
@@ -691,13 +725,14 @@ def rule_meta_datamanager_vault_ingest(rule_args, callback, rei):
                     if m:
                         item_list[action].append(m.group(1).replace('_', ' '))
 
-        for item in item_list:
-            if len(item_list[item]) < 5:
-                list_of_changes = ', '.join(item_list[item])
-                provenance.log_action(ctx, actor, vault_pkg_path, '{} metadata: {}'.format(item.replace('changed', 'modified'), list_of_changes))
-            else:
-                list_of_changes = ', '.join(item_list[item][:4])
-                provenance.log_action(ctx, actor, vault_pkg_path, '{} metadata: {} and more'.format(item.replace('changed', 'modified'), list_of_changes))
+        with provenance.batch(ctx):
+            for item in item_list:
+                if len(item_list[item]) < 5:
+                    list_of_changes = ', '.join(item_list[item])
+                    provenance.log_action(ctx, actor, vault_pkg_path, '{} metadata: {}'.format(item.replace('changed', 'modified'), list_of_changes))
+                else:
+                    list_of_changes = ', '.join(item_list[item][:4])
+                    provenance.log_action(ctx, actor, vault_pkg_path, '{} metadata: {} and more'.format(item.replace('changed', 'modified'), list_of_changes))
     except Exception:
         # Log provenance without the differences
         provenance.log_action(ctx, actor, vault_pkg_path, 'modified metadata')
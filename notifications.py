@@ -77,6 +77,7 @@ def api_notifications_load(ctx, sort_order="desc"):
                              "USER_NAME = '{}' AND USER_TYPE != 'rodsgroup' AND META_USER_ATTR_NAME like '{}_%%'".format(user.name(ctx), NOTIFICATION_KEY))]
 
     notifications = []
+    deposits = []
     for result in results:
         try:
             notification = jsonutil.parse(result)
@@ -94,42 +95,7 @@ def api_notifications_load(ctx, sort_order="desc"):
 
                 # Deposit situation required different information to be presented.
                 if subpath.startswith('deposit-'):
-                    data_package_reference = ""
-                    iter = genquery.row_iterator(
-                        "META_COLL_ATTR_VALUE",
-                        "COLL_NAME = '{}' AND META_COLL_ATTR_NAME = '{}'".format(notification["target"], constants.DATA_PACKAGE_REFERENCE),
-                        genquery.AS_LIST, ctx
-                    )
-
-                    for row in iter:
-                        data_package_reference = row[0]
-
-                    deposit_title = '(no title)'
-                    iter = genquery.row_iterator(
-                        "META_COLL_ATTR_VALUE",
-                        "COLL_NAME = '{}' AND META_COLL_ATTR_NAME = 'Title'".format(notification["target"]),
-                        genquery.AS_LIST, ctx
-                    )
-                    for row in iter:
-                        deposit_title = row[0]
-
-                    notification["data_package"] = deposit_title
-                    notification["link"] = "/vault/yoda/{}".format(data_package_reference)
-
-                    # Find real actor when
-                    if notification["actor"] == 'system':
-                        # Get actor from action log on action = "submitted for vault"
-                        iter2 = genquery.row_iterator(
-                            "order_desc(META_COLL_MODIFY_TIME), META_COLL_ATTR_VALUE",
-                            "COLL_NAME = '" + notification["target"] + "' AND META_COLL_ATTR_NAME = '" + constants.UUORGMETADATAPREFIX + 'action_log' + "'",
-                            genquery.AS_LIST, ctx
-                        )
-                        for row2 in iter2:
-                            # row2 contains json encoded [str(int(time.time())), action, actor]
-                            log_item_list = jsonutil.parse(row2[1])
-                            if log_item_list[1] == "submitted for vault":
-                                notification["actor"] = log_item_list[2].split('#')[0]
-                                break
+                    deposits.append(notification)
             elif notification["target"] != "":
                 notification["link"] = notification["target"]
 
@@ -137,6 +103,43 @@ def api_notifications_load(ctx, sort_order="desc"):
         except Exception:
             continue
 
+    # Retrieve reference, title and action log of all deposit targets in grouped queries.
+    deposit_avus = avu.of_colls(ctx,
+                                list(set(notification["target"] for notification in deposits)),
+                                [constants.DATA_PACKAGE_REFERENCE, 'Title', constants.UUPROVENANCELOG])
+
+    for notification in deposits:
+        try:
+            data_package_reference = ""
+            deposit_title = '(no title)'
+            submitted = None
+            for item in deposit_avus[notification["target"]]:
+                if item.attr == constants.DATA_PACKAGE_REFERENCE:
+                    data_package_reference = item.value
+                elif item.attr == 'Title':
+                    deposit_title = item.value
+                elif item.attr == constants.UUPROVENANCELOG:
+                    # item.value contains json encoded [str(int(time.time())), action, actor]
+                    try:
+                        log_item_list = jsonutil.parse(item.value)
+                    except jsonutil.ParseError:
+                        continue
+                    if type(log_item_list) is not list or len(log_item_list) < 3:
+                        continue
+                    if log_item_list[1] == "submitted for vault" and (submitted is None or int(log_item_list[0]) > int(submitted[0])):
+                        submitted = log_item_list
+
+            notification["data_package"] = deposit_title
+            notification["link"] = "/vault/yoda/{}".format(data_package_reference)
+
+            # Find real actor when
+            if notification["actor"] == 'system' and submitted is not None:
+                # Get actor from latest action log on action = "submitted for vault"
+                notification["actor"] = submitted[2].split('#')[0]
+        except Exception:
+            # Skip this notification only, as for notifications that cannot be loaded.
+            notifications.remove(notification)
+
     # Return notifications sorted on timestamp
     if sort_order == "asc":
         return sorted(notifications, key=lambda k: k['timestamp'], reverse=False)
@@ -346,6 +349,45 @@ def rule_process_groups_expiration_date(ctx):
     log.write(ctx, 'group expiration date - Finished checking research groups for reaching group expiration date | notified: {}'.format(notify_count))
 
 
+def research_groups_last_modified(ctx, zone):
+    """Determine the last modification time of every research group.
+
+    The last modification time of a group is the latest modify time of any data
+    object in its collection tree, or the modify time of the group collection
+    if it does not contain any data. This is computed with grouped scans over all
+    research groups, instead of queries per group or per data object.
+
+    :param ctx:  Combined type of a callback and rei struct
+    :param zone: Zone name
+
+    :returns: Dict of research group name -> last modification time (epoch)
+    """
+    last_modified = {}
+
+    # Latest data modification per collection, mapped to the group the collection is in.
+    iter = genquery.row_iterator(
+        "COLL_NAME, MAX(DATA_MODIFY_TIME)",
+        "COLL_NAME like '/{}/home/research-%'".format(zone),
+        genquery.AS_LIST, ctx
+    )
+    for row in iter:
+        group_name = row[0].split('/')[3]
+        last_modified[group_name] = max(last_modified.get(group_name, 0), int(row[1]))
+
+    # Groups without any data: use the modify time of the group collection.
+    iter = genquery.row_iterator(
+        "COLL_NAME, COLL_MODIFY_TIME",
+        "COLL_PARENT_NAME = '/{0}/home' AND COLL_NAME like '/{0}/home/research-%'".format(zone),
+        genquery.AS_LIST, ctx
+    )
+    for row in iter:
+        group_name = row[0].split('/')[3]
+        if group_name not in last_modified:
+            last_modified[group_name] = int(row[1])
+
+    return last_modified
+
+
 @rule.make()
 def rule_process_inactive_research_groups(ctx):
     """Rule interface for checking for research groups that have not been modified after a certain amount of months.
@@ -368,6 +410,9 @@ def rule_process_inactive_research_groups(ctx):
     inactivity_cutoff = datetime.now() - timedelta(weeks=4.35 * config.inactivity_cutoff_months)
     inactivity_cutoff_epoch = int((inactivity_cutoff - datetime(1970, 1, 1)).total_seconds())
 
+    # Last modification time of all research groups, computed once for this run.
+    last_modified = research_groups_last_modified(ctx, zone)
+
     # First query: obtain a list of groups with group attributes
     iter = genquery.row_iterator(
         "USER_GROUP_NAME",
@@ -378,67 +423,7 @@ def rule_process_inactive_research_groups(ctx):
     for row in iter:
         group_name = row[0]
         coll = '/{}/home/{}'.format(zone, group_name)
-        # Trigger this flag if there are any files that have been modified after the cut off
-        # If the flag is still false after going through all the files, then that is when we send the notification
-        recent_files_modified = False
-        data_objects_count = 0
-        where_clause = {
-            'self': "COLL_NAME = '{}' AND USER_GROUP_NAME = '{}'".format(coll, group_name),
-            'subfolders': "COLL_NAME LIKE '{}/%' AND USER_GROUP_NAME = '{}'".format(coll, group_name)
-        }
-
-        # Per group two statements are required to gather all data
-        # 1) data in folder itself
-        # 2) data in all subfolders of the folder
-        for folder_type in ['self', 'subfolders']:
-            iter_subcoll = genquery.row_iterator(
-                "COUNT(DATA_NAME)",
-                where_clause[folder_type],
-                genquery.AS_LIST, ctx
-            )
-            # This loop should only run once
-            for sub_row in iter_subcoll:
-                data_objects_count += int(sub_row[0])
-
-        if data_objects_count > 0:
-            for folder_type in ['self', 'subfolders']:
-                if recent_files_modified:
-                    break
-
-                iter_subcoll = genquery.row_iterator(
-                    "DATA_NAME, COLL_NAME",
-                    where_clause[folder_type],
-                    genquery.AS_LIST, ctx
-                )
-
-                for sub_row in iter_subcoll:
-                    if recent_files_modified:
-                        break
-
-                    sub_coll = sub_row[1]
-
-                    # Get count of any data objects that have been modified after the inactivity cut off
-                    iter_recent_data = genquery.row_iterator(
-                        "COUNT(DATA_NAME)",
-                        "COLL_NAME = '{}' AND USER_GROUP_NAME = '{}' AND DATA_MODIFY_TIME n> '{}'".format(sub_coll, group_name, inactivity_cutoff_epoch),
-                        genquery.AS_LIST, ctx
-                    )
-
-                    # This loop should only run once
-                    for count_row in iter_recent_data:
-                        if int(count_row[0]) > 0:
-                            recent_files_modified = True
-        else:
-            # Empty research group, so check the modified date of the collection, then send a notification
-            iter_data = genquery.row_iterator(
-                "COLL_MODIFY_TIME",
-                "COLL_NAME = '{}'".format(coll),
-                genquery.AS_LIST, ctx
-            )
-            # This loop should only run once
-            for sub_row in iter_data:
-                if int(sub_row[0]) > inactivity_cutoff_epoch:
-                    recent_files_modified = True
+        recent_files_modified = last_modified.get(group_name, 0) > inactivity_cutoff_epoch
 
         if not recent_files_modified:
             # find corresponding datamanager
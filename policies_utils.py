@@ -8,6 +8,38 @@ import ast
 
 from util.genquery_col_constants import *
 
+# Defines groups of GenQuery columns
+DATAOBJECT_COLUMNS = frozenset({COL_D_DATA_ID, COL_D_COLL_ID, COL_DATA_NAME, COL_DATA_REPL_NUM,
+                                COL_DATA_VERSION, COL_DATA_TYPE_NAME, COL_DATA_SIZE,
+                                COL_D_RESC_NAME, COL_D_DATA_PATH, COL_D_OWNER_NAME, COL_D_OWNER_ZONE,
+                                COL_D_REPL_STATUS, COL_D_DATA_STATUS, COL_D_DATA_CHECKSUM,
+                                COL_D_EXPIRY, COL_D_MAP_ID, COL_D_COMMENTS, COL_D_CREATE_TIME, COL_D_MODIFY_TIME,
+                                COL_DATA_MODE, COL_D_RESC_HIER, COL_D_RESC_ID})
+COLLECTION_COLUMNS = frozenset({COL_COLL_ID, COL_COLL_NAME, COL_COLL_PARENT_NAME,
+                                COL_COLL_OWNER_NAME, COL_COLL_OWNER_ZONE,
+                                COL_COLL_MAP_ID, COL_COLL_INHERITANCE, COL_COLL_COMMENTS,
+                                COL_COLL_CREATE_TIME, COL_COLL_MODIFY_TIME,
+                                COL_COLL_TYPE, COL_COLL_INFO1, COL_COLL_INFO2})
+RESOURCE_COLUMNS   = frozenset({COL_R_RESC_ID, COL_R_RESC_NAME, COL_R_ZONE_NAME, COL_R_TYPE_NAME, COL_R_CLASS_NAME,
+                                COL_R_LOC, COL_R_VAULT_PATH, COL_R_FREE_SPACE, COL_R_RESC_INFO, COL_R_RESC_COMMENT,
+                                COL_R_CREATE_TIME, COL_R_MODIFY_TIME, COL_R_RESC_STATUS,
+                                COL_R_FREE_SPACE_TIME, COL_R_RESC_CHILDREN, COL_R_RESC_CONTEXT, COL_R_RESC_PARENT,
+                                COL_R_RESC_PARENT_CONTEXT})
+USER_COLUMNS       = frozenset({COL_USER_ID, COL_USER_NAME, COL_USER_TYPE, COL_USER_ZONE,
+                                COL_USER_INFO, COL_USER_COMMENT, COL_USER_CREATE_TIME, COL_USER_MODIFY_TIME,
+                                COL_USER_GROUP_ID, COL_USER_GROUP_NAME})
+
+DATAOBJECT_AVU_COLUMNS = frozenset({COL_META_DATA_ATTR_NAME, COL_META_DATA_ATTR_VALUE, COL_META_DATA_ATTR_UNITS})
+COLLECTION_AVU_COLUMNS = frozenset({COL_META_COLL_ATTR_NAME, COL_META_COLL_ATTR_VALUE, COL_META_COLL_ATTR_UNITS})
+RESOURCE_AVU_COLUMNS   = frozenset({COL_META_RESC_ATTR_NAME, COL_META_RESC_ATTR_VALUE, COL_META_RESC_ATTR_UNITS})
+USER_AVU_COLUMNS       = frozenset({COL_META_USER_ATTR_NAME, COL_META_USER_ATTR_VALUE, COL_META_USER_ATTR_UNITS})
+
+# Verdicts of previously checked queries, by the set of columns used.
+# Queries only differ in a limited number of column combinations, so this
+# remains small; it is bounded just in case.
+_verdicts = {}
+_MAX_VERDICTS = 10000
+
 
 def is_safe_genquery_inp(genquery_inp):
     """Checks if a GenQuery input matches Yoda policies
@@ -20,68 +52,58 @@ def is_safe_genquery_inp(genquery_inp):
     return _is_safe_genquery_inp(genquery_inp.selectInp, genquery_inp.sqlCondInp)
 
 
-def _column_in_select_inp(selectInp, columns):
-    selectedInpHash = ast.literal_eval(str(selectInp))
-    selected_columns  = selectedInpHash.keys()
-    for column in columns:
-        if column in selected_columns:
-            return True
-    return False
+def _select_columns(selectInp):
+    """Returns the set of column ids selected, from a dict or InxIvalPair.
+
+    Falls back to the string representation if the column id array can not be read.
+    """
+    if isinstance(selectInp, dict):
+        return frozenset(selectInp)
+    try:
+        return frozenset(selectInp.inx[i] for i in range(selectInp.len))
+    except (AttributeError, TypeError, IndexError, KeyError):
+        return frozenset(ast.literal_eval(str(selectInp)))
+
 
+def _cond_columns(sqlCondInp):
+    """Returns the set of column ids with a condition, from a list of tuples or InxValPair.
 
-def _column_in_cond_inp(sqlCondInp, columns):
-    condition_data = ast.literal_eval(str(sqlCondInp))
-    condition_columns = map(lambda c: c[0], condition_data)
-    for column in columns:
-        if column in condition_columns:
-            return True
-    return False
+    Falls back to the string representation if the column id array can not be read.
+    """
+    if isinstance(sqlCondInp, list):
+        return frozenset(c[0] for c in sqlCondInp)
+    try:
+        return frozenset(sqlCondInp.inx[i] for i in range(sqlCondInp.len))
+    except (AttributeError, TypeError, IndexError, KeyError):
+        return frozenset(c[0] for c in ast.literal_eval(str(sqlCondInp)))
 
 
 def _is_safe_genquery_inp(selectInp, sqlCondInp):
-    # Defines groups of GenQuery columns
-    dataobject_columns = {COL_D_DATA_ID, COL_D_COLL_ID, COL_DATA_NAME, COL_DATA_REPL_NUM,
-                          COL_DATA_VERSION, COL_DATA_TYPE_NAME, COL_DATA_SIZE,
-                          COL_D_RESC_NAME, COL_D_DATA_PATH, COL_D_OWNER_NAME, COL_D_OWNER_ZONE,
-                          COL_D_REPL_STATUS, COL_D_DATA_STATUS, COL_D_DATA_CHECKSUM,
-                          COL_D_EXPIRY, COL_D_MAP_ID, COL_D_COMMENTS, COL_D_CREATE_TIME, COL_D_MODIFY_TIME,
-                          COL_DATA_MODE, COL_D_RESC_HIER, COL_D_RESC_ID}
-    collection_columns = {COL_COLL_ID, COL_COLL_NAME, COL_COLL_PARENT_NAME,
-                          COL_COLL_OWNER_NAME, COL_COLL_OWNER_ZONE,
-                          COL_COLL_MAP_ID, COL_COLL_INHERITANCE, COL_COLL_COMMENTS,
-                          COL_COLL_CREATE_TIME, COL_COLL_MODIFY_TIME,
-                          COL_COLL_TYPE, COL_COLL_INFO1, COL_COLL_INFO2}
-    resource_columns   = {COL_R_RESC_ID, COL_R_RESC_NAME, COL_R_ZONE_NAME, COL_R_TYPE_NAME, COL_R_CLASS_NAME,
-                          COL_R_LOC, COL_R_VAULT_PATH, COL_R_FREE_SPACE, COL_R_RESC_INFO, COL_R_RESC_COMMENT,
-                          COL_R_CREATE_TIME, COL_R_MODIFY_TIME, COL_R_RESC_STATUS,
-                          COL_R_FREE_SPACE_TIME, COL_R_RESC_CHILDREN, COL_R_RESC_CONTEXT, COL_R_RESC_PARENT,
-                          COL_R_RESC_PARENT_CONTEXT}
-    user_columns       = {COL_USER_ID, COL_USER_NAME, COL_USER_TYPE, COL_USER_ZONE,
-                          COL_USER_INFO, COL_USER_COMMENT, COL_USER_CREATE_TIME, COL_USER_MODIFY_TIME,
-                          COL_USER_GROUP_ID, COL_USER_GROUP_NAME}
-
-    dataobject_avu_columns = {COL_META_DATA_ATTR_NAME, COL_META_DATA_ATTR_VALUE, COL_META_DATA_ATTR_UNITS}
-    collection_avu_columns = {COL_META_COLL_ATTR_NAME, COL_META_COLL_ATTR_VALUE, COL_META_COLL_ATTR_UNITS}
-    resource_avu_columns = {COL_META_RESC_ATTR_NAME, COL_META_RESC_ATTR_VALUE, COL_META_RESC_ATTR_UNITS}
-    user_avu_columns = {COL_META_USER_ATTR_NAME, COL_META_USER_ATTR_VALUE, COL_META_USER_ATTR_UNITS}
-
-    uses_dataobject_columns = (_column_in_select_inp(selectInp, dataobject_columns)
-                               or _column_in_cond_inp(sqlCondInp, dataobject_columns))
-    uses_collection_columns = (_column_in_select_inp(selectInp, collection_columns)
-                               or _column_in_cond_inp(sqlCondInp, collection_columns))
-    uses_resource_columns = (_column_in_select_inp(selectInp, resource_columns)
-                             or _column_in_cond_inp(sqlCondInp, resource_columns))
-    uses_user_columns = (_column_in_select_inp(selectInp, user_columns)
-                         or _column_in_cond_inp(sqlCondInp, user_columns))
-
-    uses_dataobject_avu_columns = (_column_in_select_inp(selectInp, dataobject_avu_columns)
-                                   or _column_in_cond_inp(sqlCondInp, dataobject_avu_columns))
-    uses_collection_avu_columns = (_column_in_select_inp(selectInp, collection_avu_columns)
-                                   or _column_in_cond_inp(sqlCondInp, collection_avu_columns))
-    uses_resource_avu_columns = (_column_in_select_inp(selectInp, resource_avu_columns)
-                                 or _column_in_cond_inp(sqlCondInp, resource_avu_columns))
-    uses_user_avu_columns = (_column_in_select_inp(selectInp, user_avu_columns)
-                             or _column_in_cond_inp(sqlCondInp, user_avu_columns))
+    columns = _select_columns(selectInp) | _cond_columns(sqlCondInp)
+
+    try:
+        return _verdicts[columns]
+    except KeyError:
+        pass
+
+    if len(_verdicts) >= _MAX_VERDICTS:
+        _verdicts.clear()
+
+    verdict = _is_safe_columns(columns)
+    _verdicts[columns] = verdict
+    return verdict
+
+
+def _is_safe_columns(columns):
+    uses_dataobject_columns = not columns.isdisjoint(DATAOBJECT_COLUMNS)
+    uses_collection_columns = not columns.isdisjoint(COLLECTION_COLUMNS)
+    uses_resource_columns = not columns.isdisjoint(RESOURCE_COLUMNS)
+    uses_user_columns = not columns.isdisjoint(USER_COLUMNS)
+
+    uses_dataobject_avu_columns = not columns.isdisjoint(DATAOBJECT_AVU_COLUMNS)
+    uses_collection_avu_columns = not columns.isdisjoint(COLLECTION_AVU_COLUMNS)
+    uses_resource_avu_columns = not columns.isdisjoint(RESOURCE_AVU_COLUMNS)
+    uses_user_avu_columns = not columns.isdisjoint(USER_AVU_COLUMNS)
 
     if uses_dataobject_avu_columns and not (uses_collection_columns or uses_dataobject_columns):
         return False
@@ -6,6 +6,8 @@ __license__   = 'GPLv3, see LICENSE'
 
 import json
 import time
+from collections import OrderedDict
+from contextlib import contextmanager
 
 import genquery
 
@@ -26,26 +28,30 @@ def rule_provenance_log_action(ctx, actor, coll, action):
     :param coll:   The collection the provenance log is linked to.
     :param action: The action that is logged.
     """
-    try:
-        log_item = [str(int(time.time())), action, actor]
-        avu.associate_to_coll(ctx, coll, constants.UUPROVENANCELOG, json.dumps(log_item))
-        vault.update_archive(ctx, coll)
-        log.write(ctx, "rule_provenance_log_action: <{}> has <{}> (<{}>)".format(actor, action, coll))
-    except Exception:
-        log.write(ctx, "rule_provenance_log_action: failed to log action <{}> to provenance".format(action))
+    log_action(ctx, actor, coll, action)
 
 
 def log_action(ctx, actor, coll, action, update=True):
     """Function to add action log record to provenance of specific folder.
 
+    Within a batch() context, the action is written when leaving the context.
+
     :param ctx:    Combined type of a callback and rei struct
     :param actor:  The actor of the action
     :param coll:   The collection the provenance log is linked to.
     :param action: The action that is logged.
     :param update: Whether to update provenance in any archive (default: True)
     """
+    log_item = [str(int(time.time())), action, actor]
+
+    if type(ctx) is rule.Context and '_provenance_batch' in ctx.__dict__:
+        pending = ctx.__dict__['_provenance_batch'].setdefault(coll, {"items": [], "update": False})
+        if log_item not in pending["items"]:
+            pending["items"].append(log_item)
+        pending["update"] = pending["update"] or update
+        return
+
     try:
-        log_item = [str(int(time.time())), action, actor]
         avu.associate_to_coll(ctx, coll, constants.UUPROVENANCELOG, json.dumps(log_item))
         if update:
             vault.update_archive(ctx, coll)
@@ -54,6 +60,61 @@ def log_action(ctx, actor, coll, action, update=True):
         log.write(ctx, "rule_provenance_log_action: failed to log action <{}> to provenance".format(action))
 
 
+@contextmanager
+def batch(ctx):
+    """Buffer provenance actions logged within this context, and write them when leaving the context.
+
+    The actions of every collection are written in one atomic metadata
+    operation, in the order they were logged and with the time they were
+    logged. The archive of every collection is updated at most once.
+
+    :param ctx: Combined type of a callback and rei struct
+    """
+    if type(ctx) is not rule.Context or '_provenance_batch' in ctx.__dict__:
+        # Not a rule context, or already batching.
+        yield
+        return
+
+    ctx.__dict__['_provenance_batch'] = OrderedDict()
+    try:
+        yield
+    finally:
+        _write_batch(ctx, ctx.__dict__.pop('_provenance_batch'))
+
+
+def _write_batch(ctx, pending):
+    """Write buffered provenance actions.
+
+    :param ctx:     Combined type of a callback and rei struct
+    :param pending: Ordered dict of collection -> dict with buffered log items and whether to update the archive
+    """
+    for coll, entry in pending.items():
+        operations = {"entity_name": coll,
+                      "entity_type": "collection",
+                      "operations": [{"operation": "add",
+                                      "attribute": constants.UUPROVENANCELOG,
+                                      "value": json.dumps(log_item),
+                                      "units": ""} for log_item in entry["items"]]}
+
+        if avu.apply_atomic_operations(ctx, operations):
+            for _, action, actor in entry["items"]:
+                log.write(ctx, "rule_provenance_log_action: <{}> has <{}> (<{}>)".format(actor, action, coll))
+        else:
+            # Fall back to logging the actions one by one, so that one failing action does not lose the others.
+            for log_item in entry["items"]:
+                try:
+                    avu.associate_to_coll(ctx, coll, constants.UUPROVENANCELOG, json.dumps(log_item))
+                    log.write(ctx, "rule_provenance_log_action: <{}> has <{}> (<{}>)".format(log_item[2], log_item[1], coll))
+                except Exception:
+                    log.write(ctx, "rule_provenance_log_action: failed to log action <{}> to provenance".format(log_item[1]))
+
+        if entry["update"]:
+            try:
+                vault.update_archive(ctx, coll)
+            except Exception:
+                log.write(ctx, "rule_provenance_log_action: failed to update archive of <{}>".format(coll))
+
+
 @rule.make()
 def rule_copy_provenance_log(ctx, source, target):
     """Copy the provenance log of a collection to another collection.
@@ -1340,12 +1340,13 @@ def rule_update_publication(ctx, vault_package, update_datacite, update_landingp
     )
 
     packages_found = False
-    for collection in collections:
-        coll_name = collection[0]
-        if ((vault_package == '*' and re.match(r'/[^/]+/home/vault-.*', coll_name)) or (vault_package != '*' and re.match(r'/[^/]+/home/vault-.*', coll_name) and coll_name == vault_package)):
-            packages_found = True
-            output = update_publication(ctx, coll_name, update_datacite == 'Yes', update_landingpage == 'Yes', update_moai == 'Yes')
-            log.write_stdout(ctx, coll_name + ': ' + output)
+    with provenance.batch(ctx):
+        for collection in collections:
+            coll_name = collection[0]
+            if ((vault_package == '*' and re.match(r'/[^/]+/home/vault-.*', coll_name)) or (vault_package != '*' and re.match(r'/[^/]+/home/vault-.*', coll_name) and coll_name == vault_package)):
+                packages_found = True
+                output = update_publication(ctx, coll_name, update_datacite == 'Yes', update_landingpage == 'Yes', update_moai == 'Yes')
+                log.write_stdout(ctx, coll_name + ': ' + output)
 
     if not packages_found:
         log.write_stdout(ctx, "[UPDATE PUBLICATIONS] No packages found for {}".format(vault_package))
@@ -16,6 +16,8 @@ from util import *
 
 __all__ = ['rule_replicate_batch']
 
+logger = log.Logger(__name__)
+
 
 def replicate_asynchronously(ctx, path, source_resource, target_resource):
     """Schedule replication of a data object.
@@ -68,7 +70,7 @@ def replicate_asynchronously(ctx, path, source_resource, target_resource):
             pass
         else:
             error_status = re.search("status \[(.*?)\]", str(e))
-            log.write(ctx, "Schedule replication of data object {} failed with error {}".format(path, error_status.group(1)))
+            logger.write(ctx, "Schedule replication of data object {} failed with error {}", path, error_status.group(1))
 
 
 @rule.make()
@@ -100,17 +102,17 @@ def rule_replicate_batch(ctx, verbose, balance_id_min, balance_id_max, batch_siz
 
     # Stop further execution if admin has blocked replication process.
     if is_replication_blocked_by_admin(ctx):
-        log.write(ctx, "Batch replication job is stopped")
+        logger.write(ctx, "Batch replication job is stopped")
     else:
-        log.write(ctx, "Batch replication job started - balance id: {}-{}".format(balance_id_min, balance_id_max))
+        logger.write(ctx, "Batch replication job started - balance id: {}-{}", balance_id_min, balance_id_max)
 
         minimum_timestamp = int(time.time() - config.async_replication_delay_time)
 
-        log.write(ctx, "verbose = {}".format(verbose))
+        logger.write(ctx, "verbose = {}", verbose)
         if print_verbose:
-            log.write(ctx, "async_replication_delay_time = {} seconds".format(config.async_replication_delay_time))
-            log.write(ctx, "max_rss = {} bytes".format(config.async_replication_max_rss))
-            log.write(ctx, "dry_run = {}".format(dry_run))
+            logger.write(ctx, "async_replication_delay_time = {} seconds", config.async_replication_delay_time)
+            logger.write(ctx, "max_rss = {} bytes", config.async_replication_max_rss)
+            logger.write(ctx, "dry_run = {}", dry_run)
             show_memory_usage(ctx)
 
         # Get list of up to batch size limit of data objects scheduled for replication, taking into account their modification time.
@@ -118,95 +120,32 @@ def rule_replicate_batch(ctx, verbose, balance_id_min, balance_id_max, batch_siz
                     ['ORDER(DATA_ID)', 'COLL_NAME', 'DATA_NAME', 'META_DATA_ATTR_VALUE', 'DATA_RESC_NAME'],
                     "META_DATA_ATTR_NAME = '{}' AND DATA_MODIFY_TIME n<= '{}'".format(attr, minimum_timestamp),
                     offset=0, limit=int(batch_size_limit), output=genquery.AS_LIST))
-        for row in iter:
-            # Stop further execution if admin has blocked replication process.
-            if is_replication_blocked_by_admin(ctx):
-                log.write(ctx, "Batch replication job is stopped")
-                break
-
-            # Check current memory usage and stop if it is above the limit.
-            if memory_limit_exceeded(config.async_replication_max_rss):
-                show_memory_usage(ctx)
-                log.write(ctx, "Memory used is now above specified limit of {} bytes, stopping further processing".format(config.async_replication_max_rss))
-                break
-
-            count += 1
-            path = row[1] + "/" + row[2]
-
-            # Metadata value contains from_path, to_path and balance id for load balancing purposes.
-            info = row[3].split(',')
-            from_path = info[0]
-            to_path = info[1]
-
-            if len(info) == 3:
-                balance_id = int(info[2])
-            else:
-                # Not replicable.
-                log.write(ctx, "ERROR - Invalid replication data for {}".format(path))
-                try:
-                    add_operation = {
-                        "entity_name": path,
-                        "entity_type": "data_object",
-                        "operations": [
-                            {
-                                "operation": "add",
-                                "attribute": errorattr,
-                                "value": "Invalid,Invalid",
-                                "units": ""
-                            }
-                        ]
-                    }
-                    avu.apply_atomic_operations(ctx, add_operation)
-                except Exception:
-                    pass
-
-                # Go to next record and skip further processing.
-                continue
-
-            # Check whether balance id is within the range for this job
-            if balance_id < int(balance_id_min) or balance_id > int(balance_id_max):
-                # Skip this one and go to the next data object to be replicated.
-                continue
-
-            # For totalization only count the data objects that are within the specified balancing range
-            count += 1
-            data_resc_name = row[4]
-
-            # "No action" is meant for easier memory usage debugging.
-            if no_action:
-                show_memory_usage(ctx)
-                log.write(ctx, "Skipping batch replication (dry_run): would have replicated \"{}\" from {} to {}".format(path, from_path, to_path))
-                continue
-
-            if print_verbose:
-                log.write(ctx, "Batch replication: copying {} from {} to {}".format(path, from_path, to_path))
-
-            # Actual replication
-            try:
-                # Ensure first replica has checksum before replication.
-                msi.data_obj_chksum(ctx, path, "irodsAdmin=", irods_types.BytesBuf())
-
-                # Workaround the PREP deadlock issue: Restrict threads to 1.
-                ofFlags = "numThreads=1++++rescName={}++++destRescName={}++++irodsAdmin=++++verifyChksum=".format(from_path, to_path)
-                msi.data_obj_repl(ctx, path, ofFlags, irods_types.BytesBuf())
-                # Mark as correctly replicated
-                count_ok += 1
-            except msi.Error as e:
-                log.write(ctx, 'ERROR - The file {} could not be replicated from {} to {}: {}'.format(file, from_path, to_path, str(e)))
-
-                if print_verbose:
-                    log.write(ctx, "Batch replication retry: copying {} from {} to {}".format(path, data_resc_name, to_path))
-
-                # Retry replication with data resource name (covers case where resource is removed from the resource hierarchy).
-                try:
-                    log.write(ctx, 'Fallback replication triggered: {}'.format(path))
-                    # Workaround the PREP deadlock issue: Restrict threads to 1.
-                    ofFlags = "numThreads=1++++rescName={}++++destRescName={}++++irodsAdmin=++++verifyChksum=".format(data_resc_name, to_path)
-                    msi.data_obj_repl(ctx, path, ofFlags, irods_types.BytesBuf())
-                    # Mark as correctly replicated
-                    count_ok += 1
-                except msi.Error as e:
-                    log.write(ctx, 'ERROR - The file could not be replicated: {}'.format(str(e)))
+        with log.buffered(ctx):
+            for row in iter:
+                # Stop further execution if admin has blocked replication process.
+                if is_replication_blocked_by_admin(ctx):
+                    logger.write(ctx, "Batch replication job is stopped")
+                    break
+
+                # Check current memory usage and stop if it is above the limit.
+                if memory_limit_exceeded(config.async_replication_max_rss):
+                    show_memory_usage(ctx)
+                    logger.write(ctx, "Memory used is now above specified limit of {} bytes, stopping further processing", config.async_replication_max_rss)
+                    break
+
+                count += 1
+                path = row[1] + "/" + row[2]
+
+                # Metadata value contains from_path, to_path and balance id for load balancing purposes.
+                info = row[3].split(',')
+                from_path = info[0]
+                to_path = info[1]
+
+                if len(info) == 3:
+                    balance_id = int(info[2])
+                else:
+                    # Not replicable.
+                    logger.write(ctx, "ERROR - Invalid replication data for {}", path)
                     try:
                         add_operation = {
                             "entity_name": path,
@@ -215,7 +154,7 @@ def rule_replicate_batch(ctx, verbose, balance_id_min, balance_id_max, batch_siz
                                 {
                                     "operation": "add",
                                     "attribute": errorattr,
-                                    "value": "{},{}".format(from_path, to_path),
+                                    "value": "Invalid,Invalid",
                                     "units": ""
                                 }
                             ]
@@ -224,31 +163,95 @@ def rule_replicate_batch(ctx, verbose, balance_id_min, balance_id_max, batch_siz
                     except Exception:
                         pass
 
-            # Remove replication_scheduled flag no matter if replication succeeded or not.
-            # rods should have been given own access via policy to allow AVU changes
-            avu_deleted = False
-            try:
-                avu.rmw_from_data(ctx, path, attr, "{},{},{}".format(from_path, to_path, balance_id))
-                avu_deleted = True
-            except Exception:
-                avu_deleted = False
+                    # Go to next record and skip further processing.
+                    continue
+
+                # Check whether balance id is within the range for this job
+                if balance_id < int(balance_id_min) or balance_id > int(balance_id_max):
+                    # Skip this one and go to the next data object to be replicated.
+                    continue
+
+                # For totalization only count the data objects that are within the specified balancing range
+                count += 1
+                data_resc_name = row[4]
+
+                # "No action" is meant for easier memory usage debugging.
+                if no_action:
+                    show_memory_usage(ctx)
+                    logger.write(ctx, "Skipping batch replication (dry_run): would have replicated \"{}\" from {} to {}".format(path, from_path, to_path))
+                    continue
 
-            # Try removing attr/resc meta data again with other ACL's
-            if not avu_deleted:
+                if print_verbose:
+                    logger.write(ctx, "Batch replication: copying {} from {} to {}", path, from_path, to_path)
+
+                # Actual replication
+                try:
+                    # Ensure first replica has checksum before replication.
+                    msi.data_obj_chksum(ctx, path, "irodsAdmin=", irods_types.BytesBuf())
+
+                    # Workaround the PREP deadlock issue: Restrict threads to 1.
+                    ofFlags = "numThreads=1++++rescName={}++++destRescName={}++++irodsAdmin=++++verifyChksum=".format(from_path, to_path)
+                    msi.data_obj_repl(ctx, path, ofFlags, irods_types.BytesBuf())
+                    # Mark as correctly replicated
+                    count_ok += 1
+                except msi.Error as e:
+                    logger.write(ctx, 'ERROR - The file {} could not be replicated from {} to {}: {}', file, from_path, to_path, str(e))
+
+                    if print_verbose:
+                        logger.write(ctx, "Batch replication retry: copying {} from {} to {}", path, data_resc_name, to_path)
+
+                    # Retry replication with data resource name (covers case where resource is removed from the resource hierarchy).
+                    try:
+                        logger.write(ctx, 'Fallback replication triggered: {}', path)
+                        # Workaround the PREP deadlock issue: Restrict threads to 1.
+                        ofFlags = "numThreads=1++++rescName={}++++destRescName={}++++irodsAdmin=++++verifyChksum=".format(data_resc_name, to_path)
+                        msi.data_obj_repl(ctx, path, ofFlags, irods_types.BytesBuf())
+                        # Mark as correctly replicated
+                        count_ok += 1
+                    except msi.Error as e:
+                        logger.write(ctx, 'ERROR - The file could not be replicated: {}', str(e))
+                        try:
+                            add_operation = {
+                                "entity_name": path,
+                                "entity_type": "data_object",
+                                "operations": [
+                                    {
+                                        "operation": "add",
+                                        "attribute": errorattr,
+                                        "value": "{},{}".format(from_path, to_path),
+                                        "units": ""
+                                    }
+                                ]
+                            }
+                            avu.apply_atomic_operations(ctx, add_operation)
+                        except Exception:
+                            pass
+
+                # Remove replication_scheduled flag no matter if replication succeeded or not.
+                # rods should have been given own access via policy to allow AVU changes
+                avu_deleted = False
                 try:
-                    # The object's ACLs may have changed.
-                    # Force the ACL and try one more time.
-                    msi.sudo_obj_acl_set(ctx, "", "own", user.full_name(ctx), path, "")
                     avu.rmw_from_data(ctx, path, attr, "{},{},{}".format(from_path, to_path, balance_id))
+                    avu_deleted = True
                 except Exception:
-                    # error => report it but still continue
-                    log.write(ctx, "ERROR - Scheduled replication of <{}>: could not remove schedule flag".format(path))
+                    avu_deleted = False
+
+                # Try removing attr/resc meta data again with other ACL's
+                if not avu_deleted:
+                    try:
+                        # The object's ACLs may have changed.
+                        # Force the ACL and try one more time.
+                        msi.sudo_obj_acl_set(ctx, "", "own", user.full_name(ctx), path, "")
+                        avu.rmw_from_data(ctx, path, attr, "{},{},{}".format(from_path, to_path, balance_id))
+                    except Exception:
+                        # error => report it but still continue
+                        logger.write(ctx, "ERROR - Scheduled replication of <{}>: could not remove schedule flag", path)
 
         if print_verbose:
             show_memory_usage(ctx)
 
         # Total replication process completed
-        log.write(ctx, "Batch replication job finished. {}/{} objects replicated successfully.".format(count_ok, count))
+        logger.write(ctx, "Batch replication job finished. {}/{} objects replicated successfully.", count_ok, count)
 
 
 def is_replication_blocked_by_admin(ctx):
@@ -275,7 +278,7 @@ def show_memory_usage(ctx):
     """
     For debug purposes show the current RSS usage.
     """
-    log.write(ctx, "current RSS usage: {} bytes".format(memory_rss_usage()))
+    logger.write(ctx, "current RSS usage: {} bytes", memory_rss_usage())
 
 
 def memory_limit_exceeded(rss_limit):
@@ -619,10 +619,10 @@ def api_research_system_metadata(ctx, coll):
 
     :returns: Dict with research system metadata
     """
-    data_count = collection.data_count(ctx, coll)
-    collection_count = collection.collection_count(ctx, coll)
-    size = collection.size(ctx, coll)
-    size_readable = misc.human_readable_size(size)
+    coll_stats = collection.stats(ctx, coll)
+    data_count = coll_stats['data_count']
+    collection_count = coll_stats['collection_count']
+    size_readable = misc.human_readable_size(coll_stats['size'])
 
     result = "{} files, {} folders, total of {}".format(data_count, collection_count, size_readable)
 
@@ -664,28 +664,60 @@ def api_research_collection_details(ctx, path):
             "is_locked": is_locked}
 
 
+def manifest(ctx, coll, cursor='', limit=0):
+    """Iterate over data objects in a collection and its subcollections, ordered on (COLL_NAME, DATA_NAME).
+
+    Iteration is keyset based: it continues after the data object identified
+    by the cursor, so that large manifests can be retrieved in pages without
+    the catalog having to skip over earlier rows.
+
+    :param ctx:    Combined type of a callback and rei struct
+    :param coll:   Parent collection of data objects to include
+    :param cursor: Relative path of the data object to continue after (empty to start at the beginning)
+    :param limit:  Maximum number of data objects to return (0 for no limit)
+
+    :returns: Generator of (relative path, size, checksum) tuples
+    """
+    if cursor == '':
+        conditions = ["COLL_NAME = '{}'".format(coll),
+                      "COLL_NAME like '{}/%'".format(coll)]
+    else:
+        cursor_coll, cursor_data = pathutil.chop('{}/{}'.format(coll, cursor))
+        conditions = ["COLL_NAME = '{}' AND DATA_NAME > '{}'".format(cursor_coll, cursor_data),
+                      "COLL_NAME like '{}/%' AND COLL_NAME > '{}'".format(coll, cursor_coll)]
+
+    length = len(coll) + 1
+    count = 0
+    for condition in conditions:
+        if limit > 0 and count >= limit:
+            break
+
+        iter = genquery.Query(ctx, "ORDER(COLL_NAME), ORDER(DATA_NAME), DATA_SIZE, DATA_CHECKSUM", condition,
+                              offset=0, limit=limit - count if limit > 0 else None, output=genquery.AS_LIST)
+        for row in iter:
+            count += 1
+            yield (row[0] + "/")[length:] + row[1], int(row[2]), row[3]
+
+
 @api.make()
-def api_research_manifest(ctx, coll):
+def api_research_manifest(ctx, coll, cursor='', limit=0, compact=False):
     """Produce a manifest of data objects in a collection
 
-    :param ctx:  Combined type of a callback and rei struct
-    :param coll: Parent collection of data objects to include
+    The manifest can be retrieved in pages by passing a limit, and the name of
+    the last data object of the previous page as cursor.
+
+    :param ctx:     Combined type of a callback and rei struct
+    :param coll:    Parent collection of data objects to include
+    :param cursor:  Name of the data object to continue after, as returned in a previous page
+    :param limit:   Maximum number of data objects to return (0 for all)
+    :param compact: Return sizes in bytes instead of human-readable sizes
 
-    :returns: List of json objects with name and checksum
+    :returns: List of json objects with name, size and checksum
     """
-    iter = genquery.row_iterator(
-        "ORDER(DATA_NAME), DATA_SIZE, DATA_CHECKSUM",
-        "COLL_NAME = '{}'".format(coll),
-        genquery.AS_LIST, ctx
-    )
-    checksums = [{"name": row[0], "size": misc.human_readable_size(int(row[1])), "checksum": data_object.decode_checksum(row[2])} for row in iter]
-
-    iter_sub = genquery.row_iterator(
-        "ORDER(COLL_NAME), ORDER(DATA_NAME), DATA_SIZE, DATA_CHECKSUM",
-        "COLL_PARENT_NAME like '{}%'".format(coll),
-        genquery.AS_LIST, ctx
-    )
-    length = len(coll) + 1
-    checksums_sub = [{"name": (row[0] + "/")[length:] + row[1], "size": misc.human_readable_size(int(row[2])), "checksum": data_object.decode_checksum(row[3])} for row in iter_sub]
+    def transform(row):
+        name, size, checksum = row
+        return {"name": name,
+                "size": size if compact else misc.human_readable_size(size),
+                "checksum": data_object.decode_checksum(checksum)}
 
-    return checksums + checksums_sub
+    return map(transform, manifest(ctx, coll, cursor, int(limit)))
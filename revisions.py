@@ -29,6 +29,8 @@ __all__ = ['api_revisions_restore',
            'rule_revisions_cleanup_process',
            'rule_revisions_cleanup_scan']
 
+logger = log.Logger(__name__)
+
 
 @api.make()
 def api_revisions_search_on_filename(ctx, searchString, offset=0, limit=10):
@@ -311,7 +313,7 @@ def resource_modified_post_revision(ctx, resource, zone, path):
             pass
         else:
             error_status = re.search("status \[(.*?)\]", str(e))
-            log.write(ctx, "Schedule revision of data object {} failed with error {}".format(path, error_status.group(1)))
+            logger.write(ctx, "Schedule revision of data object {} failed with error {}", path, error_status.group(1))
 
 
 @rule.make()
@@ -343,7 +345,7 @@ def rule_revision_batch(ctx, verbose, balance_id_min, balance_id_max, batch_size
     errorattr = constants.UUORGMETADATAPREFIX + "revision_failed"
 
     if user.user_type(ctx) != 'rodsadmin':
-        log.write(ctx, "The revision creation job can only be started by a rodsadmin user.")
+        logger.write(ctx, "The revision creation job can only be started by a rodsadmin user.")
         return
 
     if not (batch_size_limit.isdigit() and int(batch_size_limit) > 0):
@@ -355,19 +357,19 @@ def rule_revision_batch(ctx, verbose, balance_id_min, balance_id_max, batch_size
 
     # Stop further execution if admin has blocked revision process.
     if is_revision_blocked_by_admin(ctx):
-        log.write(ctx, "Batch revision job is stopped")
+        logger.write(ctx, "Batch revision job is stopped")
     else:
-        log.write(ctx, "Batch revision job started - balance id: {}-{}".format(balance_id_min, balance_id_max))
+        logger.write(ctx, "Batch revision job started - balance id: {}-{}", balance_id_min, balance_id_max)
 
         minimum_timestamp = int(time.time() - config.async_revision_delay_time)
 
         # Get list of up to batch size limit of data objects (in research space) scheduled for revision, taking into account
         # modification time.
-        log.write(ctx, "verbose = {}".format(verbose))
+        logger.write(ctx, "verbose = {}", verbose)
         if print_verbose:
-            log.write(ctx, "async_revision_delay_time = {} seconds".format(config.async_revision_delay_time))
-            log.write(ctx, "max_rss = {} bytes".format(config.async_revision_max_rss))
-            log.write(ctx, "dry_run = {}".format(dry_run))
+            logger.write(ctx, "async_revision_delay_time = {} seconds", config.async_revision_delay_time)
+            logger.write(ctx, "max_rss = {} bytes", config.async_revision_max_rss)
+            logger.write(ctx, "dry_run = {}", dry_run)
             show_memory_usage(ctx)
 
         iter = list(genquery.Query(ctx,
@@ -378,55 +380,56 @@ def rule_revision_batch(ctx, verbose, balance_id_min, balance_id_max, batch_size
                         constants.IIGROUPPREFIX,
                         minimum_timestamp),
                     offset=0, limit=int(batch_size_limit), output=genquery.AS_LIST))
-        for row in iter:
-            # Stop further execution if admin has blocked revision process.
-            if is_revision_blocked_by_admin(ctx):
-                log.write(ctx, "Batch revision job is stopped")
-                break
-
-            # Check current memory usage and stop if it is above the limit.
-            if memory_limit_exceeded(config.async_revision_max_rss):
-                show_memory_usage(ctx)
-                log.write(ctx, "Memory used is now above specified limit of {} bytes, stopping further processing".format(config.async_revision_max_rss))
-                break
-
-            # Perform scheduled revision creation for one data object.
-            data_id = row[0]
-            path    = row[1] + "/" + row[2]
-
-            # Metadata value contains resc and balance id for load balancing purposes.
-            resc = get_resc(row)
-            balance_id = get_balance_id(row, path)
-
-            # Check whether balance id is within the range for this job.
-            if balance_id < int(balance_id_min) or balance_id > int(balance_id_max):
-                # Skip this one and go to the next data object for revision creation.
-                continue
-
-            # For getting the total count, only count the data objects within the wanted range
-            count += 1
-
-            # "No action" is meant for easier memory usage debugging.
-            if no_action:
-                show_memory_usage(ctx)
-                log.write(ctx, "Skipping creating revision (dry_run): would have created revision for {} on resc {}".format(path, resc))
-                continue
-
-            if print_verbose:
-                log.write(ctx, "Batch revision: creating revision for {} on resc {}".format(path, resc))
-
-            revision_created = check_eligible_and_create_revision(ctx, print_verbose, attr, errorattr, data_id, resc, path)
-            if revision_created:
-                count_ok += 1
-            else:
-                count_ignored += 1
+        with log.buffered(ctx):
+            for row in iter:
+                # Stop further execution if admin has blocked revision process.
+                if is_revision_blocked_by_admin(ctx):
+                    logger.write(ctx, "Batch revision job is stopped")
+                    break
+
+                # Check current memory usage and stop if it is above the limit.
+                if memory_limit_exceeded(config.async_revision_max_rss):
+                    show_memory_usage(ctx)
+                    logger.write(ctx, "Memory used is now above specified limit of {} bytes, stopping further processing", config.async_revision_max_rss)
+                    break
+
+                # Perform scheduled revision creation for one data object.
+                data_id = row[0]
+                path    = row[1] + "/" + row[2]
+
+                # Metadata value contains resc and balance id for load balancing purposes.
+                resc = get_resc(row)
+                balance_id = get_balance_id(row, path)
+
+                # Check whether balance id is within the range for this job.
+                if balance_id < int(balance_id_min) or balance_id > int(balance_id_max):
+                    # Skip this one and go to the next data object for revision creation.
+                    continue
+
+                # For getting the total count, only count the data objects within the wanted range
+                count += 1
+
+                # "No action" is meant for easier memory usage debugging.
+                if no_action:
+                    show_memory_usage(ctx)
+                    logger.write(ctx, "Skipping creating revision (dry_run): would have created revision for {} on resc {}", path, resc)
+                    continue
+
+                if print_verbose:
+                    logger.write(ctx, "Batch revision: creating revision for {} on resc {}", path, resc)
+
+                revision_created = check_eligible_and_create_revision(ctx, print_verbose, attr, errorattr, data_id, resc, path)
+                if revision_created:
+                    count_ok += 1
+                else:
+                    count_ignored += 1
 
         if print_verbose:
             show_memory_usage(ctx)
 
         # Total revision process completed
-        log.write(ctx, "Batch revision job finished. {}/{} objects processed successfully. ".format(count_ok, count))
-        log.write(ctx, "Batch revision job ignored {} data objects in research area, excluding data objects postponed because of delay time.".format(count_ignored))
+        logger.write(ctx, "Batch revision job finished. {}/{} objects processed successfully. ", count_ok, count)
+        logger.write(ctx, "Batch revision job ignored {} data objects in research area, excluding data objects postponed because of delay time.", count_ignored)
 
 
 def check_eligible_and_create_revision(ctx, print_verbose, attr, errorattr, data_id, resc, path):
@@ -456,17 +459,17 @@ def check_eligible_and_create_revision(ctx, print_verbose, attr, errorattr, data
     if should_create_rev:
         revision_created = revision_create(ctx, print_verbose, data_id, resc, groups[0][0], revision_store)
     elif not should_create_rev and len(revision_error_msg):
-        log.write(ctx, revision_error_msg)
+        logger.write(ctx, revision_error_msg)
 
     remove_revision_scheduled_flag(ctx, print_verbose, path, attr)
 
     # now back to the created revision
     if revision_created:
-        log.write(ctx, "Revision created for {}".format(path))
+        logger.write(ctx, "Revision created for {}", path)
         remove_revision_error_flag(ctx, data_id, path, errorattr)
     elif should_create_rev:
         # Revision should have been created but it was not
-        log.write(ctx, "ERROR - Scheduled revision creation of <{}> failed".format(path))
+        logger.write(ctx, "ERROR - Scheduled revision creation of <{}> failed", path)
         avu.set_on_data(ctx, path, errorattr, "true")
 
     return revision_created
@@ -493,7 +496,7 @@ def remove_revision_scheduled_flag(ctx, print_verbose, path, attr):
     # rods should have been given own access via policy to allow AVU
     # changes.
     if print_verbose:
-        log.write(ctx, "Batch revision: removing AVU for {}".format(path))
+        logger.write(ctx, "Batch revision: removing AVU for {}", path)
 
     # try removing attr/resc meta data
     avu_deleted = False
@@ -511,7 +514,7 @@ def remove_revision_scheduled_flag(ctx, print_verbose, path, attr):
             msi.sudo_obj_acl_set(ctx, "", "own", user.full_name(ctx), path, "")
             avu.rmw_from_data(ctx, path, attr, "%")  # use wildcard cause rm_from_data causes problems
         except Exception:
-            log.write(ctx, "ERROR - Scheduled revision creation of <{}>: could not remove schedule flag".format(path))
+            logger.write(ctx, "ERROR - Scheduled revision creation of <{}>: could not remove schedule flag", path)
 
 
 def is_revision_blocked_by_admin(ctx):
@@ -561,7 +564,7 @@ def revision_create(ctx, print_verbose, data_id, resource, group_name, revision_
 
     # Skip current revision task if data object is not found
     if data_properties is None:
-        log.write(ctx, "ERROR - No data object found for data_id {} on resource {}, move to the next revision creation".format(data_id, resource))
+        logger.write(ctx, "ERROR - No data object found for data_id {} on resource {}, move to the next revision creation", data_id, resource)
         return False
 
     modify_time = data_properties["DATA_MODIFY_TIME"]
@@ -599,13 +602,13 @@ def revision_create(ctx, print_verbose, data_id, resource, group_name, revision_
         try:
             msi.coll_create(ctx, rev_coll, '1', irods_types.BytesBuf())
         except error.UUError:
-            log.write(ctx, "ERROR - Failed to create staging area at <{}>".format(rev_coll))
+            logger.write(ctx, "ERROR - Failed to create staging area at <{}>", rev_coll)
             return False
 
     rev_path = rev_coll + "/" + rev_filename
 
     if print_verbose:
-        log.write(ctx, "Creating revision {} -> {}".format(path, rev_path))
+        logger.write(ctx, "Creating revision {} -> {}", path, rev_path)
 
     # Actual copying to revision store
     try:
@@ -625,7 +628,7 @@ def revision_create(ctx, print_verbose, data_id, resource, group_name, revision_
         avu.set_on_data(ctx, rev_path, constants.UUORGMETADATAPREFIX + "original_group_name", group_name)
         avu.set_on_data(ctx, rev_path, constants.UUORGMETADATAPREFIX + "original_filesize", data_size)
     except msi.Error as e:
-        log.write(ctx, 'ERROR - The file could not be copied: {}'.format(str(e)))
+        logger.write(ctx, 'ERROR - The file could not be copied: {}', str(e))
 
     return revision_created
 
@@ -757,7 +760,7 @@ def rule_revisions_cleanup_collect(ctx, target_batch_size):
     if has_spool_data(constants.PROC_REVISION_CLEANUP_SCAN):
         return "Existing revision cleanup scan spool data present. Not adding new revision cleanup data."
 
-    log.write(ctx, "Starting revision cleanup collect process.")
+    logger.write(ctx, "Starting revision cleanup collect process.")
 
     target_batch_size = int(target_batch_size)
     ingest_state = {
@@ -795,7 +798,7 @@ def rule_revisions_cleanup_collect(ctx, target_batch_size):
             ingest_state["current_coll"] = coll_id
 
             if len(ingest_state["batch"]) >= target_batch_size:
-                log.write(ctx, "Flush batch 2 " + str(ingest_state["batch"]))
+                logger.write(ctx, "Flush batch 2 " + str(ingest_state["batch"]))
                 put_spool_data(constants.PROC_REVISION_CLEANUP_SCAN, [ingest_state["batch"]])
                 ingest_state["batch"] = []
 
@@ -812,7 +815,7 @@ def rule_revisions_cleanup_collect(ctx, target_batch_size):
     if len(ingest_state["batch"]) > 0:
         put_spool_data(constants.PROC_REVISION_CLEANUP_SCAN, [ingest_state["batch"]])
 
-    log.write(ctx, "Collected {} revisions for revision cleanup scanning.".format(number_revisions))
+    logger.write(ctx, "Collected {} revisions for revision cleanup scanning.", number_revisions)
     return "Revision data has been spooled for scanning"
 
 
@@ -834,17 +837,17 @@ def rule_revisions_cleanup_scan(ctx, revision_strategy_name, verbose_flag):
     if user.user_type(ctx) != 'rodsadmin':
         raise Exception("The revision cleanup jobs can only be started by a rodsadmin user.")
 
-    log.write(ctx, 'Revision cleanup scan job starting.')
+    logger.write(ctx, 'Revision cleanup scan job starting.')
     verbose = verbose_flag == "1"
     revisions_list = get_spool_data(constants.PROC_REVISION_CLEANUP_SCAN)
 
     if revisions_list is None:
-        log.write(ctx, 'Revision cleanup scan job stopping - no more spooled revision scan data.')
+        logger.write(ctx, 'Revision cleanup scan job stopping - no more spooled revision scan data.')
         return "No more revision cleanup data"
 
     if verbose:
-        log.write(ctx, "Number of revisions to scan: " + str(len(revisions_list)))
-        log.write(ctx, "Scanning revisions: " + str(revisions_list))
+        logger.write(ctx, "Number of revisions to scan: " + str(len(revisions_list)))
+        logger.write(ctx, "Scanning revisions: " + str(revisions_list))
 
     revision_data = revision_cleanup_scan_revision_objects(ctx, revisions_list)
     original_exists_dict = get_original_exists_dict(ctx, revision_data)
@@ -852,13 +855,13 @@ def rule_revisions_cleanup_scan(ctx, revision_strategy_name, verbose_flag):
     output_data_size = len(prefiltered_revision_data)
     if output_data_size > 0:
         if verbose:
-            log.write(ctx, "Revision cleanup job scan spooling {} objects for processing.".format(str(output_data_size)))
+            logger.write(ctx, "Revision cleanup job scan spooling {} objects for processing.", str(output_data_size))
         put_spool_data(constants.PROC_REVISION_CLEANUP, [prefiltered_revision_data])
     else:
         if verbose:
-            log.write(ctx, "Revision cleanup job scan - all data has been processed in prefilter stage. Processing not needed.")
+            logger.write(ctx, "Revision cleanup job scan - all data has been processed in prefilter stage. Processing not needed.")
 
-    log.write(ctx, 'Revision cleanup scan job finished.')
+    logger.write(ctx, 'Revision cleanup scan job finished.')
     return 'Revision store cleanup scan job completed'
 
 
@@ -909,7 +912,7 @@ def versioned_data_object_exists(ctx, revision_path):
             # TODO change logic in Python 3
             revision_path = revision_path.encode('utf-8')
         except UnicodeEncodeError:
-            log.write(ctx, "File path {} is not UTF-8 encoded or is not compatible with UTF-8 encoding".format(revision_path))
+            logger.write(ctx, "File path {} is not UTF-8 encoded or is not compatible with UTF-8 encoding", revision_path)
             raise
 
     revision_avus = avu.of_data(ctx, revision_path)
@@ -922,8 +925,8 @@ def versioned_data_object_exists(ctx, revision_path):
     except KeyError:
         # If we can't determine the original path, we assume the original data object
         # still exists, so that it is not automatically cleaned up by the revision cleanup job.
-        log.write(ctx, "Error: could not find original data object for revision " + revision_path
-                       + " because revision does not have expected revision AVUs.")
+        logger.write(ctx, "Error: could not find original data object for revision " + revision_path
+                          + " because revision does not have expected revision AVUs.")
         raise
 
 
@@ -946,13 +949,13 @@ def rule_revisions_cleanup_process(ctx, revision_strategy_name, endOfCalendarDay
     if user.user_type(ctx) != 'rodsadmin':
         raise Exception("The revision cleanup jobs can only be started by a rodsadmin user.")
 
-    log.write(ctx, 'Revision cleanup job processing starting.')
+    logger.write(ctx, 'Revision cleanup job processing starting.')
     verbose = verbose_flag == "1"
     _update_revision_store_acls(ctx)
     revisions_list = get_spool_data(constants.PROC_REVISION_CLEANUP)
 
     if revisions_list is None:
-        log.write(ctx, 'Revision cleanup processing job stopping - no more spooled revision data.')
+        logger.write(ctx, 'Revision cleanup processing job stopping - no more spooled revision data.')
         return "No more revision cleanup data"
 
     end_of_calendar_day = int(endOfCalendarDay)
@@ -967,7 +970,7 @@ def rule_revisions_cleanup_process(ctx, revision_strategy_name, endOfCalendarDay
 
     for revisions in revisions_list:
         if verbose:
-            log.write(ctx, 'Processing revisions {} ...'.format(str(revisions)))
+            logger.write(ctx, 'Processing revisions {} ...', str(revisions))
         # Process the original path conform the bucket settings
         original_exists = versioned_data_object_exists(ctx, revisions[0][2]) if len(revisions) > 0 else False
         candidates = get_deletion_candidates(ctx, revision_strategy, revisions, end_of_calendar_day, original_exists, verbose)
@@ -978,17 +981,17 @@ def rule_revisions_cleanup_process(ctx, revision_strategy_name, endOfCalendarDay
             rev_paths = {r[0]: r[2] for r in revisions}
 
         if verbose:
-            log.write(ctx, 'Candidates to be removed: {} ...'.format(str(candidates)))
+            logger.write(ctx, 'Candidates to be removed: {} ...', str(candidates))
 
         # Delete the revisions that were found being obsolete
         for revision_id in candidates:
             rev_path = rev_paths[revision_id]
             if verbose:
-                log.write(ctx, 'Removing candidate: {} ...'.format(str(revision_id)))
+                logger.write(ctx, 'Removing candidate: {} ...', str(revision_id))
             if not revision_remove(ctx, revision_id, rev_path):
                 num_errors += 1
 
-    log.write(ctx, 'Revision cleanup processing job completed - {} candidates for {} versioned data objects ({} successful / {} errors).'.format(
+    logger.write(ctx, 'Revision cleanup processing job completed - {} candidates for {} versioned data objects ({} successful / {} errors).'.format(
         str(num_candidates),
         str(len(revisions_list)),
         str(num_candidates - num_errors),
@@ -1009,7 +1012,7 @@ def revision_remove(ctx, revision_id, revision_path):
     """
     revision_prefix = get_revision_store_path(user.zone(ctx), trailing_slash=True)
     if not revision_path.startswith(revision_prefix):
-        log.write(ctx, "ERROR - sanity check fail when removing revision <{}>: <{}>".format(
+        logger.write(ctx, "ERROR - sanity check fail when removing revision <{}>: <{}>".format(
             revision_id,
             revision_path))
         return False
@@ -1018,13 +1021,13 @@ def revision_remove(ctx, revision_id, revision_path):
         msi.data_obj_unlink(ctx, revision_path, irods_types.BytesBuf())
         return True
     except msi.Error as e:
-        log.write(ctx, "ERROR - could not remove revision <{}>: <{}> ({}).".format(
+        logger.write(ctx, "ERROR - could not remove revision <{}>: <{}> ({}).".format(
             revision_id,
             revision_path,
             str(e)))
         return False
 
-    log.write(ctx, "ERROR - Revision ID <{}> not found or permission denied.".format(revision_id))
+    logger.write(ctx, "ERROR - Revision ID <{}> not found or permission denied.", revision_id)
     return False
 
 
@@ -1040,7 +1043,7 @@ def show_memory_usage(ctx):
     """
     For debug purposes show the current RSS usage.
     """
-    log.write(ctx, "current RSS usage: {} bytes".format(memory_rss_usage()))
+    logger.write(ctx, "current RSS usage: {} bytes", memory_rss_usage())
 
 
 def memory_limit_exceeded(rss_limit):
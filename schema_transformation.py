@@ -10,6 +10,7 @@ __all__ = ['rule_batch_transform_vault_metadata',
            'rule_get_transformation_info',
            'api_transform_metadata']
 
+import itertools
 import json
 import os
 import re
@@ -381,65 +382,150 @@ def html(f):
     return description
 
 
-@rule.make(inputs=[], outputs=[0])
-def rule_batch_vault_metadata_schema_report(ctx):
-    """Show vault metadata schema about each data package in vault
+class _ReportWriter(object):
+    """Writes report lines to stdout or, if a path is given, to a data object."""
+
+    def __init__(self, ctx, path):
+        self.ctx = ctx
+        self.handle = None
+        if path != '':
+            if data_object.exists(ctx, path):
+                ret = msi.data_obj_open(ctx, 'openFlags=O_WRONLYO_TRUNC++++objPath=' + path, 0)
+                self.handle = ret['arguments'][1]
+            else:
+                ret = msi.data_obj_create(ctx, path, '', 0)
+                self.handle = ret['arguments'][2]
+
+    def write_lines(self, lines):
+        if len(lines) == 0:
+            return
+        if self.handle is None:
+            for line in lines:
+                self.ctx.writeLine("stdout", line)
+        else:
+            msi.data_obj_write(self.ctx, self.handle, '\n'.join(lines) + '\n', 0)
 
-    :param ctx:      Combined type of a callback and rei struct
+    def close(self):
+        if self.handle is not None:
+            msi.data_obj_close(self.ctx, self.handle, 0)
 
-    :returns:        JSON-encoded dictionary, where each key is a vault data package path.
-                     Values are dictionaries with keys "schema" (contains the short name of the schema
-                     (e.g. 'default-3', as per the information in the metadata file, or empty if no metadata
-                     schema could be found), and match_schema (contains a boolean value that indicates whether
-                     the metadata matches the JSON schema). match_schema only has a meaning if a metadata schema
-                     could be found.
-    """
-    results = dict()
-    schema_cache = dict()
 
-    # Find all vault collections
-    iter = genquery.row_iterator(
-        "COLL_NAME",
-        "COLL_NAME like '/%s/home/vault-%%' AND COLL_NAME not like '%%/original' AND COLL_NAME NOT LIKE '%%/original/%%' AND DATA_NAME like 'yoda-metadata%%json'" %
-        (user.zone(ctx)),
-        genquery.AS_LIST, ctx)
+def _latest_vault_metadata(ctx, since):
+    """Yield (package, metadata path) of the latest metadata file of every vault package.
 
-    for row in iter:
-        coll_name = row[0]
-        metadata_path = meta.get_latest_vault_metadata_path(ctx, coll_name)
+    :param ctx:   Combined type of a callback and rei struct
+    :param since: Only include packages with metadata modified after this Unix timestamp (0 for all)
 
-        if metadata_path == '' or metadata_path is None:
-            log.write(ctx, "Vault metadata schema report skips %s, because metadata could not be found."
-                           % (coll_name))
-            continue
+    :returns: Generator of (package collection, metadata path) tuples
+    """
+    condition = ("COLL_NAME like '/%s/home/vault-%%' AND COLL_NAME not like '%%/original' AND COLL_NAME NOT LIKE '%%/original/%%'"
+                 " AND DATA_NAME like 'yoda-metadata[%%].json'" % (user.zone(ctx)))
+    if since > 0:
+        condition += " AND DATA_MODIFY_TIME n> '%d'" % (since)
 
-        try:
-            metadata = jsonutil.read(ctx, metadata_path)
-        except Exception as exc:
-            log.write(ctx, "Vault metadata report skips %s, because of exception while reading metadata file %s: %s."
-                           % (coll_name, metadata_path, str(exc)))
+    # Rows are ordered on collection name, so all metadata files of a package are adjacent.
+    iter = genquery.row_iterator("ORDER(COLL_NAME), DATA_NAME", condition, genquery.AS_LIST, ctx)
+
+    for coll_name, rows in itertools.groupby(iter, lambda row: row[0]):
+        # Only data packages directly beneath the apex vault collection.
+        if not re.match(r"^\/[^\/]+\/home\/[^\/]+\/[^\/]+$", coll_name):
             continue
 
-        # Determine schema
-        schema_id = schema.get_schema_id(ctx, metadata_path)
-        schema_shortname = schema_id.split("/")[-2]
+        # Same ordering as meta.get_latest_vault_metadata_path.
+        name = None
+        for row in rows:
+            if name is None or (name < row[1] and len(name) <= len(row[1])):
+                name = row[1]
 
-        # Retrieve schema and cache it for future use
-        schema_path = schema.get_schema_path_by_id(ctx, metadata_path, schema_id)
-        if schema_shortname in schema_cache:
-            schema_contents = schema_cache[schema_shortname]
-        else:
-            schema_contents = jsonutil.read(ctx, schema_path)
-            schema_cache[schema_shortname] = schema_contents
+        yield coll_name, '{}/{}'.format(coll_name, name)
+
+
+@rule.make(inputs=[0, 1, 2], outputs=[3])
+def rule_batch_vault_metadata_schema_report(ctx, since, output_path, batch_size):
+    """Show vault metadata schema about each data package in vault
+
+    The report is streamed as NDJSON: one JSON object per line, with keys "package"
+    (the vault data package path), "schema" (the short name of the schema (e.g. 'default-3'),
+    as per the information in the metadata file) and "match_schema" (a boolean value that
+    indicates whether the metadata matches the JSON schema). Packages for which no metadata
+    or schema could be found are skipped and logged.
+
+    :param ctx:         Combined type of a callback and rei struct
+    :param since:       Only report packages with metadata modified after this Unix timestamp (empty for all)
+    :param output_path: Data object to write the report to (empty for stdout)
+    :param batch_size:  Number of packages to validate per batch (empty for default)
+
+    :returns:           Number of reported data packages
+    """
+    since = int(since) if since != '' else 0
+    batch_size = int(batch_size) if batch_size != '' else 64
+
+    schema_cache = dict()
+    validator = meta.MetadataValidator()
+    writer = _ReportWriter(ctx, output_path)
+    reported = 0
+
+    def flush(batch):
+        # Validate the packages of a batch grouped by schema.
+        lines = []
+        for schema_shortname in sorted(batch):
+            packages = batch[schema_shortname]
+            error_lists = validator.validate(schema_shortname,
+                                             schema_cache[schema_shortname],
+                                             [metadata for (_, _, metadata) in packages])
+            for (coll_name, metadata_path, _), error_list in zip(packages, error_lists):
+                match_schema = len(error_list) == 0
+                if not match_schema:
+                    log.write(ctx, "Vault metadata schema report: metadata %s did not match schema %s: %s" %
+                                   (metadata_path, schema_shortname, str([meta_form.humanize_validation_error(e).encode('utf-8') for e in error_list])))
+                lines.append(json.dumps({"package": coll_name, "schema": schema_shortname, "match_schema": match_schema}))
+        writer.write_lines(lines)
+        return len(lines)
+
+    try:
+        batch = dict()
+        batch_count = 0
+        for coll_name, metadata_path in _latest_vault_metadata(ctx, since):
+            try:
+                metadata = jsonutil.read(ctx, metadata_path)
+            except Exception as exc:
+                log.write(ctx, "Vault metadata report skips %s, because of exception while reading metadata file %s: %s."
+                               % (coll_name, metadata_path, str(exc)))
+                continue
+
+            # Determine schema
+            schema_id = schema.get_schema_id(ctx, metadata_path, metadata=metadata)
+            schema_shortname = yoda_names.schema_name_from_id(schema_id)
+            if schema_shortname is None:
+                log.write(ctx, "Vault metadata report skips %s, because metadata file %s has no known schema: %s."
+                               % (coll_name, metadata_path, str(schema_id)))
+                continue
+
+            # Retrieve schema and cache it for future use
+            if schema_shortname not in schema_cache:
+                schema_path = schema.get_schema_path_by_id(ctx, metadata_path, schema_id)
+                if schema_path is None:
+                    log.write(ctx, "Vault metadata report skips %s, because no schema file was found for schema %s."
+                                   % (coll_name, schema_id))
+                    continue
+                try:
+                    schema_cache[schema_shortname] = jsonutil.read(ctx, schema_path)
+                except Exception as exc:
+                    log.write(ctx, "Vault metadata report skips %s, because of exception while reading schema file %s: %s."
+                                   % (coll_name, schema_path, str(exc)))
+                    continue
+
+            batch.setdefault(schema_shortname, []).append((coll_name, metadata_path, metadata))
+            batch_count += 1
 
-        # Check whether metadata matches schema and log any errors
-        error_list = meta.get_json_metadata_errors(ctx, metadata_path, metadata=metadata, schema=schema_contents)
-        match_schema = len(error_list) == 0
-        if not match_schema:
-            log.write(ctx, "Vault metadata schema report: metadata %s did not match schema %s: %s" %
-                           (metadata_path, schema_shortname, str([meta_form.humanize_validation_error(e).encode('utf-8') for e in error_list])))
+            if batch_count >= batch_size:
+                reported += flush(batch)
+                batch = dict()
+                batch_count = 0
 
-        # Update results
-        results[coll_name] = {"schema": schema_shortname, "match_schema": match_schema}
+        reported += flush(batch)
+    finally:
+        validator.close()
+        writer.close()
 
-    return json.dumps(results)
+    return reported
@@ -5,7 +5,9 @@ __copyright__ = 'Copyright (c) 2023-2024, Utrecht University'
 __license__ = 'GPLv3, see LICENSE'
 
 import datetime
+import threading
 import time
+from Queue import Empty, Queue
 
 import requests
 import session_vars
@@ -13,6 +15,55 @@ import session_vars
 import mail
 from util import *
 
+SYNC_WORKERS = 4
+"""Number of collaborations fetched from SRAM concurrently"""
+
+REQUESTS_PER_SECOND = 10
+"""Maximum rate of requests to the SRAM API"""
+
+
+class RateLimiter(object):
+    """Spaces out calls to wait() to at most `rate` per second, across threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.next_slot = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.time()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+_rate_limiter = RateLimiter(REQUESTS_PER_SECOND)
+_session = None
+
+
+def _request(method, url, **kwargs):
+    """Perform a rate limited request to the SRAM API over a shared, pooled HTTP session.
+
+    Does not use the rule engine callback, so it can be called from worker threads.
+
+    :param method: HTTP method
+    :param url:    URL to request
+    :param kwargs: Additional arguments for requests, e.g. json payload
+
+    :returns: Response object
+    """
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=SYNC_WORKERS))
+
+    headers = {'Content-Type': 'application/json', 'charset': 'UTF-8', 'Authorization': 'bearer ' + config.sram_api_key}
+
+    _rate_limiter.wait()
+    return _session.request(method, url, headers=headers, timeout=30, verify=config.sram_tls_verify, **kwargs)
+
 
 def sram_post_collaboration(ctx, group_name, description):
     """Create SRAM Collaborative Organisation Identifier.
@@ -24,7 +75,6 @@ def sram_post_collaboration(ctx, group_name, description):
     :returns: JSON object with new collaboration details
     """
     url = "{}/api/collaborations/v1".format(config.sram_rest_api_url)
-    headers = {'Content-Type': 'application/json', 'charset': 'UTF-8', 'Authorization': 'bearer ' + config.sram_api_key}
 
     group_type = ''
     if group_name.split('-')[0] in ('research', 'datamanager', 'priv', 'deposit'):
@@ -49,7 +99,7 @@ def sram_post_collaboration(ctx, group_name, description):
     if config.sram_verbose_logging:
         log.write(ctx, "post {}: {}".format(url, payload))
 
-    response = requests.post(url, json=payload, headers=headers, timeout=30, verify=config.sram_tls_verify)
+    response = _request('post', url, json=payload)
     data = response.json()
 
     if config.sram_verbose_logging:
@@ -58,33 +108,105 @@ def sram_post_collaboration(ctx, group_name, description):
     return data
 
 
-def sram_get_uid(ctx, co_identifier, user_name):
-    """Get SRAM Collaboration member uid.
+def sram_get_collaboration(ctx, co_identifier):
+    """Get SRAM Collaboration details, including its memberships.
 
     :param ctx:           Combined type of a callback and rei struct
     :param co_identifier: SRAM CO identifier
-    :param user_name:     Name of the user
 
-    :returns: Unique id of the user
+    :returns: JSON object with collaboration details
     """
     url = "{}/api/collaborations/v1/{}".format(config.sram_rest_api_url, co_identifier)
-    headers = {'Content-Type': 'application/json', 'charset': 'UTF-8', 'Authorization': 'bearer ' + config.sram_api_key}
 
     if config.sram_verbose_logging:
         log.write(ctx, "get {}".format(url))
 
-    response = requests.get(url, headers=headers, timeout=30, verify=config.sram_tls_verify)
-    data = response.json()
+    data = _request('get', url).json()
 
     if config.sram_verbose_logging:
         log.write(ctx, "response: {}".format(data))
 
-    uid = ''
-    for key in data['collaboration_memberships']:
-        yoda_name = user_name.split('#')[0]
-        sram_name = key['user']['email']
-        if yoda_name.lower() == sram_name.lower():
-            uid = key['user']['uid']
+    return data
+
+
+def sram_get_collaborations(ctx, co_identifiers):
+    """Get details of multiple SRAM Collaborations, fetching them concurrently.
+
+    Collaborations that could not be fetched are logged and left out of the result.
+
+    :param ctx:            Combined type of a callback and rei struct
+    :param co_identifiers: List of SRAM CO identifiers
+
+    :returns: Dict of SRAM CO identifier to JSON object with collaboration details
+    """
+    todo = Queue()
+    for co_identifier in co_identifiers:
+        todo.put(co_identifier)
+
+    # Worker threads only perform HTTP requests, the rule engine callback
+    # (logging, msi calls) is only used from this thread.
+    results = {}
+    errors = {}
+
+    def worker():
+        while True:
+            try:
+                co_identifier = todo.get_nowait()
+            except Empty:
+                return
+            url = "{}/api/collaborations/v1/{}".format(config.sram_rest_api_url, co_identifier)
+            try:
+                results[co_identifier] = _request('get', url).json()
+            except Exception as e:
+                errors[co_identifier] = e
+
+    threads = [threading.Thread(target=worker) for _ in range(min(SYNC_WORKERS, len(co_identifiers)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for co_identifier, e in errors.items():
+        log.write(ctx, "Something went wrong getting collaboration {} from SRAM: {}".format(co_identifier, e))
+
+    if config.sram_verbose_logging:
+        log.write(ctx, "collaborations: {}".format(results))
+
+    return results
+
+
+def co_member_uids(data):
+    """Get mapping of member email to SRAM uid from collaboration details.
+
+    :param data: JSON object with collaboration details
+
+    :returns: Dict of lowercase member email to unique id of the user
+    """
+    return {key['user']['email'].lower(): key['user']['uid']
+            for key in data['collaboration_memberships']}
+
+
+def co_members(data):
+    """Get member emails from collaboration details.
+
+    :param data: JSON object with collaboration details
+
+    :returns: List of member emails
+    """
+    return [key['user']['email'] for key in data['collaboration_memberships']]
+
+
+def sram_get_uid(ctx, co_identifier, user_name):
+    """Get SRAM Collaboration member uid.
+
+    :param ctx:           Combined type of a callback and rei struct
+    :param co_identifier: SRAM CO identifier
+    :param user_name:     Name of the user
+
+    :returns: Unique id of the user
+    """
+    data = sram_get_collaboration(ctx, co_identifier)
+    uid = co_member_uids(data).get(user_name.split('#')[0].lower(), '')
 
     if config.sram_verbose_logging:
         log.write(ctx, "user_name: {}, uuid: {}".format(user_name.split('#')[0], uid))
@@ -101,12 +223,11 @@ def sram_delete_collaboration(ctx, co_identifier):
     :returns: Boolean indicating of deletion of collaboration succeeded
     """
     url = "{}/api/collaborations/v1/{}".format(config.sram_rest_api_url, co_identifier)
-    headers = {'Content-Type': 'application/json', 'charset': 'UTF-8', 'Authorization': 'bearer ' + config.sram_api_key}
 
     if config.sram_verbose_logging:
         log.write(ctx, "post {}".format(url))
 
-    response = requests.delete(url, headers=headers, timeout=30, verify=config.sram_tls_verify)
+    response = _request('delete', url)
 
     if config.sram_verbose_logging:
         log.write(ctx, "response: {}".format(response.status_code))
@@ -124,12 +245,11 @@ def sram_delete_collaboration_membership(ctx, co_identifier, uuid):
     :returns: Boolean indicating of deletion of collaboration membership succeeded
     """
     url = "{}/api/collaborations/v1/{}/members/{}".format(config.sram_rest_api_url, co_identifier, uuid)
-    headers = {'Content-Type': 'application/json', 'charset': 'UTF-8', 'Authorization': 'bearer ' + config.sram_api_key}
 
     if config.sram_verbose_logging:
         log.write(ctx, "post {}".format(url))
 
-    response = requests.delete(url, headers=headers, timeout=30, verify=config.sram_tls_verify)
+    response = _request('delete', url)
 
     if config.sram_verbose_logging:
         log.write(ctx, "response: {}".format(response.status_code))
@@ -148,7 +268,6 @@ def sram_put_collaboration_invitation(ctx, group_name, username, co_identifier):
     :returns: Boolean indicating if put of new collaboration invitation succeeded
     """
     url = "{}/api/invitations/v1/collaboration_invites".format(config.sram_rest_api_url)
-    headers = {'Content-Type': 'application/json', 'charset': 'UTF-8', 'Authorization': 'bearer ' + config.sram_api_key}
 
     # Now plus a year.
     expiration_date = datetime.datetime.fromtimestamp(int(time.time() + 3600 * 24 * 365)).strftime('%Y-%m-%d')
@@ -173,7 +292,7 @@ def sram_put_collaboration_invitation(ctx, group_name, username, co_identifier):
     if config.sram_verbose_logging:
         log.write(ctx, "put {}: {}".format(url, payload))
 
-    response = requests.put(url, json=payload, headers=headers, timeout=30, verify=config.sram_tls_verify)
+    response = _request('put', url, json=payload)
 
     if config.sram_verbose_logging:
         log.write(ctx, "response: {}".format(response.status_code))
@@ -190,7 +309,6 @@ def sram_connect_service_collaboration(ctx, short_name):
     :returns: Boolean indicating if connecting a service to an existing collaboration succeeded
     """
     url = "{}/api/collaborations_services/v1/connect_collaboration_service".format(config.sram_rest_api_url)
-    headers = {'Content-Type': 'application/json', 'charset': 'UTF-8', 'Authorization': 'bearer ' + config.sram_api_key}
 
     # Build SRAM payload.
     payload = {
@@ -201,7 +319,7 @@ def sram_connect_service_collaboration(ctx, short_name):
     if config.sram_verbose_logging:
         log.write(ctx, "put {}: {}".format(url, payload))
 
-    response = requests.put(url, json=payload, headers=headers, timeout=30, verify=config.sram_tls_verify)
+    response = _request('put', url, json=payload)
 
     if config.sram_verbose_logging:
         log.write(ctx, "response: {}".format(response.status_code))
@@ -247,7 +365,6 @@ def sram_update_collaboration_membership(ctx, co_identifier, uuid, new_role):
     :returns: Boolean indicating that updation of collaboration membership succeeded
     """
     url = "{}/api/collaborations/v1/{}/members".format(config.sram_rest_api_url, co_identifier)
-    headers = {'Content-Type': 'application/json', 'charset': 'UTF-8', 'Authorization': 'bearer ' + config.sram_api_key}
 
     if new_role == 'manager':
         role = 'admin'
@@ -262,7 +379,7 @@ def sram_update_collaboration_membership(ctx, co_identifier, uuid, new_role):
     if config.sram_verbose_logging:
         log.write(ctx, "put {}".format(url))
 
-    response = requests.put(url, json=payload, headers=headers, timeout=30, verify=config.sram_tls_verify)
+    response = _request('put', url, json=payload)
 
     if config.sram_verbose_logging:
         log.write(ctx, "response: {}".format(response.status_code))
@@ -278,23 +395,9 @@ def sram_get_co_members(ctx, co_identifier):
 
     :returns: Email of the user
     """
-    url = "{}/api/collaborations/v1/{}".format(config.sram_rest_api_url, co_identifier)
-    headers = {'Content-Type': 'application/json', 'charset': 'UTF-8', 'Authorization': 'bearer ' + config.sram_api_key}
-
-    if config.sram_verbose_logging:
-        log.write(ctx, "get {}".format(url))
-
-    response = requests.get(url, headers=headers, timeout=30, verify=config.sram_tls_verify)
-    data = response.json()
-
-    if config.sram_verbose_logging:
-        log.write(ctx, "response: {}".format(data))
-
-    co_members = []
-    for key in data['collaboration_memberships']:
-        co_members.append(key['user']['email'])
+    members = co_members(sram_get_collaboration(ctx, co_identifier))
 
     if config.sram_verbose_logging:
-        log.write(ctx, "collaboration_members: {}".format(co_members))
+        log.write(ctx, "collaboration_members: {}".format(members))
 
-    return co_members
+    return members
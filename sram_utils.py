@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""Utility functions for synchronizing groups with SRAM. These are in a separate file so that
+   we can test the main logic without having iRODS-related dependencies in the way."""
+
+__copyright__ = 'Copyright (c) 2024, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+from util import yoda_names
+
+
+def sram_sync_plan(group, co_members, sram_flow):
+    """Determine the changes needed to synchronize members of a group with its SRAM collaboration.
+
+    :param group:      Group data as returned by getGroupsData
+    :param co_members: List of member emails of the SRAM collaboration
+    :param sram_flow:  Configured SRAM flow ('join_request' or 'invitation')
+
+    :returns: List of (action, member) tuples, with action one of 'invalid', 'accepted', 'invite' and 'manager'
+    """
+    members = group['members'] + group['read']
+    managers = group['managers']
+    invited = group['invited']
+
+    plan = []
+    for member in members:
+        # Validate email.
+        if not yoda_names.is_email_username(member):
+            plan.append(('invalid', member))
+            continue
+
+        in_co = member.split('#')[0] in co_members
+
+        # Check if member is invited.
+        if member in invited:
+            if in_co:
+                plan.append(('accepted', member))
+            else:
+                continue
+
+        # Not invited and not yet in the CO.
+        if member not in invited and not in_co:
+            if sram_flow in ('join_request', 'invitation'):
+                plan.append(('invite', member))
+                continue
+
+        # Member is group manager and in the CO.
+        if member in managers and in_co:
+            plan.append(('manager', member))
+
+    return plan
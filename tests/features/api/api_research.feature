@@ -205,3 +205,14 @@ Feature: Research API
         Examples:
             | collection                      |
             | /tempZone/home/research-initial |
+
+
+    Scenario Outline: Research manifest paged
+        Given user researcher is authenticated
+        And the Yoda research manifest API is queried with <collection> and limit <limit>
+        Then the response status code is "200"
+        And checksum manifest of at most <limit> items is returned
+
+        Examples:
+            | collection                      | limit |
+            | /tempZone/home/research-initial | 1     |
@@ -98,6 +98,15 @@ def api_research_manifest(user, collection):
     )
 
 
+@given(parsers.parse("the Yoda research manifest API is queried with {collection} and limit {limit:d}"), target_fixture="api_response")
+def api_research_manifest_paged(user, collection, limit):
+    return api_request(
+        user,
+        "research_manifest",
+        {"coll": collection, "limit": limit, "compact": True}
+    )
+
+
 @given(parsers.parse("a file {file} is uploaded in {folder}"), target_fixture="api_response")
 def api_research_file_upload(user, file, folder):
     return upload_data(
@@ -217,3 +226,12 @@ def research_manifest_checksums(api_response):
     _, body = api_response
 
     assert len(body['data']) > 0
+
+
+@then(parsers.parse("checksum manifest of at most {limit:d} items is returned"))
+def research_manifest_checksums_paged(api_response, limit):
+    _, body = api_response
+
+    assert 0 < len(body['data']) <= limit
+    for item in body['data']:
+        assert isinstance(item['size'], int)
@@ -0,0 +1,17 @@
+#!/usr/bin/irule -r irods_rule_engine_plugin-irods_rule_language-instance -F
+#
+# Summarize recorded API metrics (per API call counts, latency histograms and
+# GenQuery/microservice call counts) to the server log and stdout.
+# Requires the api_metrics_file configuration option to be set.
+#
+# usage: api-metrics.r
+#        api-metrics.r "*reset=1"   (remove recorded metrics after summarizing)
+#
+apiMetrics {
+    *summary = "";
+    rule_admin_api_metrics(*reset, *summary);
+    writeLine("stdout", *summary);
+}
+
+input *reset="0"
+output ruleExecOut
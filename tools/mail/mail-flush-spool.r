@@ -0,0 +1,11 @@
+mail_flush_spool
+{
+	*sent = "";
+
+	rule_mail_flush_spool(*sent);
+
+	writeLine("stdout", "Sent *sent spooled mail(s)");
+}
+
+input null
+output ruleExecOut
@@ -8,6 +8,9 @@ mail_test
 	if ( *status == '0' ) then {
 		writeLine("stdout", "Successfully executed rule for testing email with destination <" ++ *to ++ ">");
 	}
+	else if ( *status == '2' ) then {
+		writeLine("stdout", "Test mail with destination <" ++ *to ++ "> was not sent yet: " ++ *info ++ "\nRun tools/mail/mail-flush-spool.sh to send it.");
+	}
 	else {
 		writeLine("stdout", "An error occurred during mail test:\n" ++ *info);
 	}
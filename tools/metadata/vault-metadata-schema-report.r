@@ -4,27 +4,25 @@
 # and whether the current metadata matches the schema. Errors are written
 # to the rodsLog.
 #
-# Output format: CSV, with the following columns:
-# 1. Data package collection
-# 2. Short schema name (e.g. "default-3")
-# 3. Boolean value that indicate whether the metadata matches the schema ("True"/"False")
+# Usage: irule -r irods_rule_engine_plugin-python-instance -F vault-metadata-schema-report.r \
+#            '*since="1700000000"' '*output="/tempZone/home/rods/report.ndjson"'
+#
+# Parameters:
+#   *since:  only report data packages with metadata modified after this Unix timestamp
+#            (empty: report all data packages)
+#   *output: data object to write the report to (empty: write to stdout)
+#
+# Output format: NDJSON, one JSON object per line with the following keys:
+# 1. "package": data package collection
+# 2. "schema": short schema name (e.g. "default-3")
+# 3. "match_schema": boolean value that indicates whether the metadata matches the schema
 #
-
-import csv
-import io
-import json
-import genquery
 
 
 def main(rule_args, callback, rei):
-    result = callback.rule_batch_vault_metadata_schema_report("")
-    data = json.loads(result["arguments"][0])
-    for package in sorted(data):
-        output = io.BytesIO()
-        writer = csv.writer(output)
-        rowdata = [package, data[package]["schema"], str(data[package]["match_schema"])]
-        writer.writerow([column.encode('utf-8') for column in rowdata])
-        callback.writeLine("stdout", output.getvalue().strip())
+    since = global_vars["*since"].strip('"')
+    output = global_vars["*output"].strip('"')
+    callback.rule_batch_vault_metadata_schema_report(since, output, "", "")
 
-INPUT null
+INPUT *since="", *output=""
 OUTPUT ruleExecOut
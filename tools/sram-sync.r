@@ -1,8 +1,11 @@
 #!/usr/bin/irule -r irods_rule_engine_plugin-irods_rule_language-instance -F
 #
+# Synchronize groups with SRAM.
+# Use *dryRun="1" to only log planned changes without making changes.
+#
 sramSync() {
-    rule_group_sram_sync();
+    rule_group_sram_sync(*dryRun);
 }
 
-input null
+input *dryRun="0"
 output ruleExecOut
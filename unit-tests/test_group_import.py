@@ -12,7 +12,7 @@ from unittest import TestCase
 
 sys.path.append('..')
 
-from groups_import import get_duplicate_columns, parse_data, process_csv_line
+from groups_import import get_duplicate_columns, parse_data, plan_import, process_csv_line
 
 
 class GroupImportTest(TestCase):
@@ -223,3 +223,34 @@ class GroupImportTest(TestCase):
         no_duplicate_data, no_duplicate_err = self.parse_csv_file("files/without-duplicates2.csv")
         self.assertNotEqual(no_duplicate_data, [])
         self.assertEqual(no_duplicate_err, '')
+
+    def test_plan_import_existing_group(self):
+        data = [("default-2", "default-2", "research-teama",
+                 ["m.manager@yoda.dev"], ["p.member@yoda.dev", "o.member@yoda.dev"], ["m.viewer@yoda.dev"], "", "")]
+        roles = {"research-teama": {"m.manager@yoda.dev#tempZone": "manager",
+                                    "p.member@yoda.dev#tempZone": "reader",
+                                    "m.viewer@yoda.dev#tempZone": "reader",
+                                    "x.former@yoda.dev#tempZone": "normal"}}
+        members = {"research-teama": ["m.manager@yoda.dev", "p.member@yoda.dev", "x.former@yoda.dev"],
+                   "read-teama": ["m.viewer@yoda.dev"]}
+
+        changes = plan_import(data, roles, members, set(), "tempZone", False)
+        self.assertEqual(changes, [("add", "research-teama", "o.member@yoda.dev", None),
+                                   ("role", "research-teama", "p.member@yoda.dev", "normal")])
+
+        changes = plan_import(data, roles, members, set(), "tempZone", True)
+        self.assertEqual(changes[-1], ("remove", "research-teama", "x.former@yoda.dev", None))
+        self.assertEqual(len(changes), 3)
+
+    def test_plan_import_new_group(self):
+        data = [("default-2", "default-2", "research-teamb",
+                 ["m.manager@yoda.dev"], [], ["m.viewer@yoda.dev"], "", "")]
+        roles = {"research-teamb": {"rods#tempZone": "manager"}}
+        members = {"research-teamb": ["rods"]}
+
+        changes = plan_import(data, roles, members, {"research-teamb"}, "tempZone", True)
+        self.assertEqual(changes, [("add", "research-teamb", "m.manager@yoda.dev", None),
+                                   ("role", "research-teamb", "m.manager@yoda.dev", "manager"),
+                                   ("add", "research-teamb", "m.viewer@yoda.dev", None),
+                                   ("role", "research-teamb", "m.viewer@yoda.dev", "reader"),
+                                   ("remove", "research-teamb", "rods", None)])
@@ -12,7 +12,7 @@ from unittest import TestCase
 
 sys.path.append('..')
 
-from intake_utils import dataset_make_id, dataset_parse_id, intake_extract_tokens, intake_extract_tokens_from_name, intake_scan_get_metadata_update, intake_tokens_identify_dataset
+from intake_utils import dataset_file_stats, dataset_locked_toplevels, dataset_make_id, dataset_parse_id, intake_extract_tokens, intake_extract_tokens_from_name, intake_scan_get_metadata_update, intake_tokens_identify_dataset, invert_avu_operations, status_avu_operations
 
 
 class IntakeTest(TestCase):
@@ -157,3 +157,37 @@ class IntakeTest(TestCase):
         self.assertEquals(output.get("pseudocode"), "B12345")
         self.assertEquals(output.get("version"), "Raw")
         self.assertEquals(output.get("directory"), "/foo/bar/baz")
+
+    def test_dataset_file_stats(self):
+        rows = [("/zone/home/grp-vault-x/a", "10", "100"),
+                ("/zone/home/grp-vault-x/a", "10", "100"),
+                ("/zone/home/grp-vault-x/a/sub", "11", "50"),
+                ("/zone/home/grp-vault-x/a-2", "12", "7"),
+                ("/zone/home/grp-vault-x/a-2", "12", "7"),
+                ("/zone/home/grp-vault-x/a-2", "12", "7"),
+                ("/zone/home/grp-vault-x/other", "13", "")]
+        stats = dataset_file_stats(rows, ["/zone/home/grp-vault-x/a", "/zone/home/grp-vault-x/a-2", "/zone/home/grp-vault-x/b"])
+        self.assertEquals(stats["/zone/home/grp-vault-x/a"], (2, 150))
+        self.assertEquals(stats["/zone/home/grp-vault-x/a-2"], (1, 7))
+        self.assertEquals(stats["/zone/home/grp-vault-x/b"], (0, 0))
+
+    def test_dataset_locked_toplevels(self):
+        rows = [("/zone/home/grp-intake-x/a.dat", "dataset_toplevel", "ds1"),
+                ("/zone/home/grp-intake-x/a.dat", "to_vault_lock", "123"),
+                ("/zone/home/grp-intake-x/b.dat", "dataset_toplevel", "ds1"),
+                ("/zone/home/grp-intake-x/b.dat", "to_vault_freeze", "123"),
+                ("/zone/home/grp-intake-x/c.dat", "dataset_toplevel", "ds2"),
+                ("/zone/home/grp-intake-x/c.dat", "to_vault_lock", "123"),
+                ("/zone/home/grp-intake-x/d.dat", "dataset_toplevel", "ds2"),
+                ("/zone/home/grp-intake-x/e.dat", "to_vault_lock", "123")]
+        self.assertEquals(dataset_locked_toplevels(rows),
+                          [("ds1", ["/zone/home/grp-intake-x/a.dat", "/zone/home/grp-intake-x/b.dat"])])
+
+    def test_status_avu_operations(self):
+        self.assertEquals(status_avu_operations(["1"], "to_vault_lock", "1", False), [])
+        self.assertEquals(status_avu_operations([], "to_vault_lock", "2", True), [])
+        operations = status_avu_operations(["1"], "to_vault_lock", "2", False)
+        self.assertEquals([(o["operation"], o["value"]) for o in operations], [("remove", "1"), ("add", "2")])
+        self.assertEquals([(o["operation"], o["value"]) for o in invert_avu_operations(operations)], [("remove", "2"), ("add", "1")])
+        operations = status_avu_operations(["1", "2"], "to_vault_lock", "3", True)
+        self.assertEquals([(o["operation"], o["value"]) for o in operations], [("remove", "1"), ("remove", "2")])
@@ -98,3 +98,52 @@ class PoliciesTest(TestCase):
         selectInp = {641: 1}
         sqlCondInp = []
         self.assertFalse(_is_safe_genquery_inp(selectInp, sqlCondInp))
+
+    def test_is_safe_genquery_inp_irods_types(self):
+        # Query input objects without column id arrays are parsed from their string representation.
+        class Inp(object):
+            def __init__(self, value):
+                self.value = value
+
+            def __str__(self):
+                return str(self.value)
+
+        # select META_COLL_ATTR_VALUE where COLL_NAME = '/a/b/c'
+        self.assertTrue(_is_safe_genquery_inp(Inp({611: 1}), Inp([(501, "= '/a/b/c'")])))
+
+        # Column ids in condition values are not taken into account.
+        # select META_COLL_ATTR_VALUE where DATA_NAME = '(501, '
+        self.assertFalse(_is_safe_genquery_inp(Inp({611: 1}), Inp([(403, "= '(501, '")])))
+
+        # Verdicts are the same for repeated queries.
+        self.assertFalse(_is_safe_genquery_inp({611: 1}, []))
+        self.assertFalse(_is_safe_genquery_inp(Inp({611: 1}), Inp([])))
+
+    def test_is_safe_genquery_inp_inx_arrays(self):
+        # Query input objects with column id arrays, like InxIvalPair and InxValPair.
+        class InxInp(object):
+            def __init__(self, inx, value=None, length=None):
+                self.len = len(inx) if length is None else length
+                self.inx = inx
+                self.value = value
+
+            def __str__(self):
+                return str(self.value)
+
+        # select META_COLL_ATTR_VALUE where COLL_NAME = '/a/b/c'
+        self.assertTrue(_is_safe_genquery_inp(InxInp([611]), InxInp([501])))
+
+        # select META_COLL_ATTR_VALUE
+        self.assertFalse(_is_safe_genquery_inp(InxInp([611]), InxInp([])))
+
+        # Column id arrays that can not be indexed by int are parsed from the string representation.
+        class Unindexable(object):
+            pass
+
+        self.assertTrue(_is_safe_genquery_inp(InxInp(Unindexable(), {611: 1}, 1),
+                                              InxInp(Unindexable(), [(501, "= '/a/b/c'")], 1)))
+        self.assertFalse(_is_safe_genquery_inp(InxInp({"611": 1}, {611: 1}),
+                                               InxInp({"611": 1}, [])))
+
+        # Column id arrays shorter than their length are parsed from the string representation.
+        self.assertFalse(_is_safe_genquery_inp(InxInp([], {611: 1}, 1), InxInp([], [], 1)))
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for the SRAM synchronization functions"""
+
+__copyright__ = 'Copyright (c) 2024, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import sys
+from unittest import TestCase
+
+sys.path.append('..')
+
+from sram_utils import sram_sync_plan
+
+
+class SramTest(TestCase):
+
+    def group(self, members=[], read=[], managers=[], invited=[]):
+        return {"members": members, "read": read, "managers": managers, "invited": invited}
+
+    def test_sram_sync_plan_invalid(self):
+        group = self.group(members=["rods#tempZone", "p.member@yoda.dev#tempZone"])
+        plan = sram_sync_plan(group, ["p.member@yoda.dev"], "join_request")
+        self.assertEqual(plan, [("invalid", "rods#tempZone")])
+
+    def test_sram_sync_plan_accepted(self):
+        group = self.group(members=["p.member@yoda.dev#tempZone", "o.member@yoda.dev#tempZone"],
+                           invited=["p.member@yoda.dev#tempZone", "o.member@yoda.dev#tempZone"])
+        # Only invitations of members that joined the CO are accepted, other invitations stay pending.
+        plan = sram_sync_plan(group, ["p.member@yoda.dev"], "join_request")
+        self.assertEqual(plan, [("accepted", "p.member@yoda.dev#tempZone")])
+
+    def test_sram_sync_plan_invite(self):
+        group = self.group(members=["p.member@yoda.dev#tempZone"], read=["r.viewer@yoda.dev#tempZone"])
+        for sram_flow in ("join_request", "invitation"):
+            plan = sram_sync_plan(group, [], sram_flow)
+            self.assertEqual(plan, [("invite", "p.member@yoda.dev#tempZone"),
+                                    ("invite", "r.viewer@yoda.dev#tempZone")])
+
+        # Other flows do not invite users.
+        self.assertEqual(sram_sync_plan(group, [], ""), [])
+
+    def test_sram_sync_plan_manager(self):
+        group = self.group(members=["m.manager@yoda.dev#tempZone", "n.manager@yoda.dev#tempZone"],
+                           managers=["m.manager@yoda.dev#tempZone", "n.manager@yoda.dev#tempZone"],
+                           invited=["n.manager@yoda.dev#tempZone"])
+        plan = sram_sync_plan(group, ["m.manager@yoda.dev", "n.manager@yoda.dev"], "invitation")
+        self.assertEqual(plan, [("manager", "m.manager@yoda.dev#tempZone"),
+                                ("accepted", "n.manager@yoda.dev#tempZone"),
+                                ("manager", "n.manager@yoda.dev#tempZone")])
+
+        # Managers that are not in the CO yet are invited first.
+        plan = sram_sync_plan(group, [], "invitation")
+        self.assertEqual(plan, [("invite", "m.manager@yoda.dev#tempZone")])
@@ -11,7 +11,7 @@ from unittest import TestCase
 
 sys.path.append('../util')
 
-from misc import human_readable_size, last_run_time_acceptable, remove_empty_objects
+from misc import chunks, human_readable_size, last_run_time_acceptable, remove_empty_objects
 
 
 class UtilMiscTest(TestCase):
@@ -36,6 +36,12 @@ class UtilMiscTest(TestCase):
         last_run = now
         self.assertEqual(last_run_time_acceptable("b", found, int(time.time()), copy_backoff_time), False)
 
+    def test_chunks(self):
+        self.assertEqual(list(chunks([], 2)), [])
+        self.assertEqual(list(chunks([1, 2, 3, 4], 2)), [[1, 2], [3, 4]])
+        self.assertEqual(list(chunks([1, 2, 3], 2)), [[1, 2], [3]])
+        self.assertEqual(list(chunks(iter("abc"), 5)), [["a", "b", "c"]])
+
     def test_human_readable_size(self):
         output = human_readable_size(0)
         self.assertEqual(output, "0 B")
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for the tape utils module"""
+
+__copyright__ = 'Copyright (c) 2024, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import sys
+from unittest import TestCase
+
+sys.path.append('../util')
+
+from tape import parse_states, stage, TapeBackend
+
+
+class StubTape(TapeBackend):
+    """Local stub of dmattr, dmget and dmput, staging requested files on the next dmattr."""
+
+    def __init__(self, states):
+        self.files = states
+        self.requests = []
+
+    def states(self, paths):
+        states = {path: self.files[path] for path in paths}
+        for path in paths:
+            if self.files[path] == "UNM":
+                self.files[path] = "DUL"
+        return states
+
+    def get(self, paths):
+        self.requests.append(paths)
+        for path in paths:
+            self.files[path] = "UNM"
+
+    def put(self, paths):
+        for path in paths:
+            self.files[path] = "DUL"
+
+
+class UtilTapeTest(TestCase):
+
+    def test_parse_states(self):
+        self.assertEquals(parse_states("OFL\n", ["/a"]), {"/a": "OFL"})
+        self.assertEquals(parse_states("", ["/a"]), {"/a": None})
+        self.assertEquals(parse_states("\n", ["/a"]), {"/a": None})
+        self.assertEquals(parse_states("OFL\nDUL\n", ["/a", "/b"]), {"/a": "OFL", "/b": "DUL"})
+        self.assertIsNone(parse_states("OFL\n", ["/a", "/b"]))
+
+    def test_stage(self):
+        backend = StubTape({"/a": "OFL", "/b": "DUL", "/c": "MIG", "/d": "???"})
+        jobs = [{"path": path, "requested": None} for path in ["/a", "/b", "/c", "/d"]]
+
+        ready, pending, failed = stage(jobs, backend, 1000)
+        self.assertEquals([job["path"] for job in ready], ["/b"])
+        self.assertEquals([job["path"] for job in pending], ["/a", "/c"])
+        self.assertEquals([job["path"] for job in failed], ["/d"])
+        self.assertEquals(backend.requests, [["/a"]])
+        self.assertEquals(jobs[0]["requested"], 1000)
+
+        # Staging archive is resumed by a later run, without requesting it again.
+        ready, pending, failed = stage(pending, backend, 1010)
+        ready, pending, failed = stage(pending, backend, 1020)
+        self.assertEquals([job["path"] for job in ready], ["/a"])
+        self.assertEquals(backend.requests, [["/a"]])
+
+    def test_stage_retry(self):
+        backend = StubTape({"/a": "OFL"})
+        jobs = [{"path": "/a", "requested": 1000}]
+
+        stage(jobs, backend, 1010, retry_after=100)
+        self.assertEquals(backend.requests, [])
+        stage(jobs, backend, 1100, retry_after=100)
+        self.assertEquals(backend.requests, [["/a"]])
+
+    def test_stage_unknown_state(self):
+        # Archives with an unknown state (failed dmattr) are not online.
+        backend = StubTape({"/a": parse_states("", ["/a"])["/a"]})
+        ready, pending, failed = stage([{"path": "/a", "requested": None}], backend, 1000)
+        self.assertEquals(ready, [])
+        self.assertEquals([job["path"] for job in failed], ["/a"])
+        self.assertEquals(backend.requests, [])
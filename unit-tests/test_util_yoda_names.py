@@ -9,7 +9,7 @@ from unittest import TestCase
 
 sys.path.append('../util')
 
-from yoda_names import _is_internal_user, is_email_username, is_valid_category, is_valid_groupname, is_valid_subcategory
+from yoda_names import _is_internal_user, is_email_username, is_valid_category, is_valid_groupname, is_valid_subcategory, schema_name_from_id
 
 
 class UtilYodaNamesTest(TestCase):
@@ -53,3 +53,11 @@ class UtilYodaNamesTest(TestCase):
         self.assertEquals(_is_internal_user("peter@cs.uu.nl", ["*.uu.nl"]), True)
         self.assertEquals(_is_internal_user("peter@ai.cs.uu.nl", ["*.cs.uu.nl"]), True)
         self.assertEquals(_is_internal_user("peter@ai.hum.uu.nl", ["*.cs.uu.nl"]), False)
+
+    def test_schema_name_from_id(self):
+        self.assertEquals(schema_name_from_id("https://yoda.uu.nl/schemas/default-3/metadata.json"), "default-3")
+        self.assertEquals(schema_name_from_id("https://yoda.uu.nl/schemas/core-2/metadata.json"), "core-2")
+        self.assertEquals(schema_name_from_id("https://example.org/schemas/default-3/metadata.json"), None)
+        self.assertEquals(schema_name_from_id(""), None)
+        # Metadata without a schema.
+        self.assertEquals(schema_name_from_id(None), None)
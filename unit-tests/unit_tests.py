@@ -9,8 +9,10 @@ from test_group_import import GroupImportTest
 from test_intake import IntakeTest
 from test_policies import PoliciesTest
 from test_revisions import RevisionTest
+from test_sram import SramTest
 from test_util_misc import UtilMiscTest
 from test_util_pathutil import UtilPathutilTest
+from test_util_tape import UtilTapeTest
 from test_util_yoda_names import UtilYodaNamesTest
 
 
@@ -20,7 +22,9 @@ def suite():
     test_suite.addTest(makeSuite(IntakeTest))
     test_suite.addTest(makeSuite(PoliciesTest))
     test_suite.addTest(makeSuite(RevisionTest))
+    test_suite.addTest(makeSuite(SramTest))
     test_suite.addTest(makeSuite(UtilMiscTest))
     test_suite.addTest(makeSuite(UtilPathutilTest))
+    test_suite.addTest(makeSuite(UtilTapeTest))
     test_suite.addTest(makeSuite(UtilYodaNamesTest))
     return test_suite
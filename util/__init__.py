@@ -38,7 +38,9 @@ if 'unittest' not in sys.modules:
     import resource
     import arb_data_manager
     import cached_data_manager
+    import membership_data_manager
     import irods_type_info
+    import tape
 
     # Config items can be accessed directly as 'config.foo' by any module
     # that imports * from util.
@@ -4,11 +4,15 @@
 For example usage, see make().
 """
 
-__copyright__ = 'Copyright (c) 2019-2023, Utrecht University'
+__copyright__ = 'Copyright (c) 2019-2024, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
 import base64
+import bisect
 import inspect
+import json
+import os
+import time
 import traceback
 import zlib
 from collections import OrderedDict
@@ -19,6 +23,18 @@ import rule
 from config import config
 from error import *
 
+COMPRESS_ARGUMENT = '_compress'
+"""Name of the optional API argument with which clients request compressed responses"""
+
+COMPRESS_THRESHOLD = 64 * 1024
+"""Minimum size in bytes of a response before it is compressed, if requested"""
+
+stats = {}
+"""Per API call count, time and input/output sizes, collected in development environments"""
+
+METRICS_BUCKETS = [10, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+"""Upper bounds in milliseconds of the latency histogram buckets of API metrics"""
+
 
 class Result(object):
     """API result."""
@@ -87,6 +103,10 @@ def _api(f):
     error, the 'status' and 'status_info' fields are populated (non-null)
     instead.
 
+    If the input contains a true '_compress' argument and the JSON result is
+    larger than COMPRESS_THRESHOLD, the result is returned as
+    {"compressed": <base64 encoded zlib compressed JSON result>}.
+
     In development environments, the result may contain a 'debug_info' property
     with additional information on errors, or timing information.
 
@@ -100,6 +120,8 @@ def _api(f):
 
     required = set(a_pos if a_defaults is None else a_pos[:-len(a_defaults)])
     optional = set([] if a_defaults is None else a_pos[-len(a_defaults):])
+    allowed = required | optional
+    signature = '(required: [{}]  optional: [{}])'.format(', '.join(required), ', '.join(optional))
 
     # If the function accepts **kwargs, we do not forbid extra arguments.
     allow_extra = a_kw is not None
@@ -113,8 +135,37 @@ def _api(f):
         :raises ParseError: API rule called with invalid JSON argument
         :raises result: API rule returned error
 
-        :returns: Result of the JSON API call
+        :returns: Result of the JSON API call, as JSON string
         """
+        t = time.time()
+        compress = False
+
+        # Count GenQueries and other microservice calls made by this API call.
+        counters = {'genquery': 0, 'genquery_pages': 0, 'msi': 0}
+        if type(ctx) is rule.Context:
+            ctx.counters = counters
+
+        def respond(result):
+            output = jsonutil.dump(result.as_dict(), separators=(',', ':'))
+            if compress and len(output) > COMPRESS_THRESHOLD:
+                output = jsonutil.dump({'compressed': base64.b64encode(zlib.compress(output))}, separators=(',', ':'))
+
+            if type(ctx) is rule.Context:
+                ctx.counters = None
+            if config.api_metrics_file:
+                _write_metrics(f.__name__, time.time() - t, counters, len(inp), len(output), result.status)
+
+            if config.environment == 'development':
+                s = stats.setdefault(f.__name__, {'calls': 0, 'time': 0.0, 'input_bytes': 0, 'output_bytes': 0})
+                s['calls'] += 1
+                s['time'] += time.time() - t
+                s['input_bytes'] += len(inp)
+                s['output_bytes'] += len(output)
+                log.debug(ctx, '%4dms %s (in: %d bytes, out: %d bytes, genqueries: %d (+%d pages), msi calls: %d, calls: %d, total: %dms)'
+                               % (int((time.time() - t) * 1000), f.__name__, len(inp), len(output),
+                                  counters['genquery'], counters['genquery_pages'], counters['msi'], s['calls'], int(s['time'] * 1000)))
+            return output
+
         # Result shorthands.
         def error_internal(debug_info=None):
             return Error('internal', 'An internal error occurred', debug_info=debug_info)
@@ -132,66 +183,131 @@ def _api(f):
                 raise jsonutil.ParseError('Argument is not a JSON object')
         except base64.binascii.Error:
             log._write(ctx, 'Error: API rule <{}> input base64 decode error'.format(f.__name__))
-            return bad_request('API input base64 decode error').as_dict()
+            return respond(bad_request('API input base64 decode error'))
         except zlib.error:
             log._write(ctx, 'Error: API rule <{}> input zlib decompression error'.format(f.__name__))
-            return bad_request('API input zlib decompression error').as_dict()
+            return respond(bad_request('API input zlib decompression error'))
         except jsonutil.ParseError as e:
             log._write(ctx, 'Error: API rule <{}> called with invalid JSON argument'.format(f.__name__))
-            return bad_request('JSON parse error: {}'.format(e)).as_dict()
+            return respond(bad_request('JSON parse error: {}'.format(e)))
+
+        compress = data.pop(COMPRESS_ARGUMENT, False) is True
 
         # Check that required arguments are present.
         for param in required:
             if param not in data:
                 log._write(ctx, 'Error: API rule <{}> called with missing <{}> argument'
                                 .format(f.__name__, param))
-                return bad_request('Missing argument: {} (required: [{}]  optional: [{}])'
-                                   .format(param, ', '.join(required), ', '.join(optional))).as_dict()
+                return respond(bad_request('Missing argument: {} {}'.format(param, signature)))
 
         # Forbid arguments that are not in the function signature.
         if not allow_extra:
             for param in data:
-                if param not in required | optional:
+                if param not in allowed:
                     log._write(ctx, 'Error: API rule <{}> called with unrecognized <{}> argument'
                                     .format(f.__name__, param))
-                    return bad_request('Unrecognized argument: {} (required: [{}]  optional: [{}])'
-                                       .format(param, ', '.join(required), ', '.join(optional))).as_dict()
+                    return respond(bad_request('Unrecognized argument: {} {}'.format(param, signature)))
 
         # Try to run the function with the supplied arguments,
         # catching any error it throws.
         try:
             # Time the request.
-            import time
-            t = time.time()
+            t_call = time.time()
             result = f(ctx, **data)
-            t = time.time() - t
-
-            log.debug(ctx, '%4dms %s' % (int(t * 1000), f.__name__))
+            t_call = time.time() - t_call
 
             if type(result) is Error:
                 raise result  # Allow api.Errors to be either raised or returned.
 
             elif not isinstance(result, Result):
                 # No error / explicit status info implies 'OK' status.
-                result = Result(result, debug_info={'time': t})
+                result = Result(result, debug_info={'time': t_call})
 
-            return result.as_dict()
+            return respond(result)
         except Error as e:
             # A proper caught error with name and message.
             if e.debug_info is None:
                 log._write(ctx, 'Error: API rule <{}> failed with error <{}>'.format(f.__name__, e))
             else:
                 log._write(ctx, 'Error: API rule <{}> failed with error <{}> (debug info follows below this line)\n{}'.format(f.__name__, e, e.debug_info))
-            return e.as_dict()
+            return respond(e)
         except Exception:
             # An uncaught error. Log a trace to aid debugging.
             log._write(ctx, 'Error: API rule <{}> failed with uncaught error (trace follows below this line)\n{}'
                             .format(f.__name__, traceback.format_exc()))
-            return error_internal(traceback.format_exc()).as_dict()
+            return respond(error_internal(traceback.format_exc()))
 
     return wrapper
 
 
+def _write_metrics(name, t, counters, input_bytes, output_bytes, status):
+    """Append a record of one API call to the API metrics file.
+
+    Records are single JSON lines, appended with one write, so that concurrent
+    agents do not interleave records.
+    """
+    record = json.dumps({'api':            name,
+                         'time':           int(t * 1000),
+                         'genquery':       counters['genquery'],
+                         'genquery_pages': counters['genquery_pages'],
+                         'msi':            counters['msi'],
+                         'input_bytes':    input_bytes,
+                         'output_bytes':   output_bytes,
+                         'status':         status}) + '\n'
+    try:
+        fd = os.open(config.api_metrics_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, record)
+        finally:
+            os.close(fd)
+    except (IOError, OSError):
+        # Metrics must never break API calls.
+        pass
+
+
+def metrics_summary(path):
+    """Summarize the API call records in an API metrics file.
+
+    :param path: Path of the API metrics file
+
+    :returns: Dict of API name to dict with number of calls, errors, latency
+              histogram (milliseconds), average/maximum latency and average counts of
+              GenQuery executions, further GenQuery result pages and msi calls
+    """
+    summary = {}
+
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Skip partially written records.
+
+            s = summary.setdefault(record['api'], {'calls': 0, 'errors': 0,
+                                                   'histogram': OrderedDict([('<={}'.format(b), 0) for b in METRICS_BUCKETS]
+                                                                            + [('>{}'.format(METRICS_BUCKETS[-1]), 0)]),
+                                                   'time_total': 0, 'time_max': 0, 'genquery_total': 0,
+                                                   'genquery_pages_total': 0, 'msi_total': 0})
+            s['calls'] += 1
+            s['errors'] += record['status'] != 'ok'
+            s['time_total'] += record['time']
+            s['time_max'] = max(s['time_max'], record['time'])
+            s['genquery_total'] += record['genquery']
+            s['genquery_pages_total'] += record.get('genquery_pages', 0)
+            s['msi_total'] += record['msi']
+
+            bucket = bisect.bisect_left(METRICS_BUCKETS, record['time'])
+            s['histogram'][s['histogram'].keys()[bucket]] += 1
+
+    for s in summary.values():
+        s['time_avg'] = s['time_total'] // s['calls']
+        s['genquery_avg'] = float(s['genquery_total']) / s['calls']
+        s['genquery_pages_avg'] = float(s['genquery_pages_total']) / s['calls']
+        s['msi_avg'] = float(s['msi_total']) / s['calls']
+
+    return summary
+
+
 def make():
     """Create API functions callable as iRODS rules.
 
@@ -223,7 +339,6 @@ def make():
         base = _api(f)
 
         # The JSON-in, JSON-out rule.
-        return rule.make(inputs=[0], outputs=[],
-                         transform=jsonutil.dump, handler=rule.Output.STDOUT)(base)
+        return rule.make(inputs=[0], outputs=[], handler=rule.Output.STDOUT)(base)
 
     return deco
@@ -11,7 +11,9 @@ from collections import namedtuple
 import genquery
 import irods_types
 
+import constants
 import log
+import misc
 import msi
 import pathutil
 
@@ -35,6 +37,32 @@ def of_coll(ctx, coll):
                                               "COLL_NAME = '{}'".format(coll)))
 
 
+def of_colls(ctx, colls, attributes=None):
+    """Get (a,v,u) triplets for multiple collections, using grouped queries.
+
+    The number of queries depends on the number of collections divided by
+    constants.GENQUERY_CHUNK_SIZE, not on the number of AVUs.
+
+    :param ctx:        Combined type of a callback and rei struct
+    :param colls:      List of collection paths
+    :param attributes: Optional list of attribute names to restrict results to
+
+    :returns: Dict of collection path -> list of (a,v,u) triplets
+    """
+    result = {coll: [] for coll in colls}
+
+    for chunk in misc.chunks(result.keys(), constants.GENQUERY_CHUNK_SIZE):
+        condition = "COLL_NAME in ('{}')".format("', '".join(chunk))
+        if attributes is not None:
+            condition += " AND META_COLL_ATTR_NAME in ('{}')".format("', '".join(attributes))
+
+        for row in genquery.row_iterator("COLL_NAME, META_COLL_ATTR_NAME, META_COLL_ATTR_VALUE, META_COLL_ATTR_UNITS",
+                                         condition, genquery.AS_LIST, ctx):
+            result[row[0]].append(Avu(*row[1:]))
+
+    return result
+
+
 def inside_coll(ctx, path, recursive=False):
     """Get a list of all AVUs inside a collection with corresponding paths.
 
@@ -5,6 +5,7 @@ __copyright__ = 'Copyright (c) 2023, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
 import itertools
+import time
 
 import genquery
 import irods_types
@@ -12,34 +13,103 @@ import irods_types
 import constants
 import data_object
 import log
+import misc
 import msi
 
 
+MANIFEST = "manifest-sha256.txt"
+"""Name of the BagIt manifest file."""
+
+MANIFEST_WRITE_LINES = 1000
+"""Number of manifest lines written to the manifest file at once."""
+
+
+def _data_objects(ctx, coll):
+    """Generate the data objects of a collection in manifest order.
+
+    :param ctx:  Combined type of a callback and rei struct
+    :param coll: Collection to list data objects of
+
+    :returns: Generator of (path, size, checksum) tuples, with checksum None
+              if none of the replicas of the data object has a checksum
+    """
+    rows = itertools.chain(
+        genquery.row_iterator("COLL_NAME, ORDER(DATA_NAME), DATA_SIZE, DATA_CHECKSUM",
+                              "COLL_NAME = '{}'".format(coll),
+                              genquery.AS_LIST,
+                              ctx),
+        genquery.row_iterator("ORDER(COLL_NAME), ORDER(DATA_NAME), DATA_SIZE, DATA_CHECKSUM",
+                              "COLL_NAME like '{}/%'".format(coll),
+                              genquery.AS_LIST,
+                              ctx))
+
+    # Replicas of a data object are adjacent, use the first replica with a checksum.
+    for (coll_name, data_name), replicas in itertools.groupby(rows, lambda row: (row[0], row[1])):
+        replicas = list(replicas)
+        checksums = [row[3] for row in replicas if row[3]]
+        yield coll_name + "/" + data_name, int(replicas[0][2]), checksums[0] if checksums else None
+
+
 def manifest(ctx, coll):
     """Generate a BagIt manifest of collection.
 
     Manifest with a complete listing of each file name along with
     a corresponding checksum to permit data integrity checking.
+    Checksums missing from the catalog are computed while generating the
+    manifest and are stored in the catalog, so an interrupted run does not
+    need to compute them again.
 
     :param ctx:  Combined type of a callback and rei struct
     :param coll: Collection to generate manifest of
 
-    :returns: String with BagIt manifest
+    :returns: Generator of BagIt manifest lines
     """
     length = len(coll) + 1
-    return "\n".join([
-        data_object.decode_checksum(row[2]) + " " + (row[0] + "/" + row[1])[length:]
-        for row in itertools.chain(
-            genquery.row_iterator("COLL_NAME, ORDER(DATA_NAME), DATA_CHECKSUM",
-                                  "COLL_NAME = '{}'".format(coll),
-                                  genquery.AS_LIST,
-                                  ctx),
-            genquery.row_iterator("ORDER(COLL_NAME), ORDER(DATA_NAME), DATA_CHECKSUM",
-                                  "COLL_NAME like '{}/%'".format(coll),
-                                  genquery.AS_LIST,
-                                  ctx))
-        if row[0] != coll or not row[1].startswith("yoda-metadata")
-    ]) + "\n"
+    checksummed = 0
+    start = time.time()
+
+    for path, size, checksum in _data_objects(ctx, coll):
+        name = path[length:]
+        if "/" not in name and (name.startswith("yoda-metadata") or name == MANIFEST):
+            continue
+
+        if checksum is None:
+            checksum = msi.data_obj_chksum(ctx, path, "", irods_types.BytesBuf())['arguments'][2]
+            checksummed += size
+
+        yield data_object.decode_checksum(checksum) + " " + name + "\n"
+
+    if checksummed:
+        log.write(ctx, "Computed missing checksums of data package <{}>: {} at {}/s".format(
+                  coll, misc.human_readable_size(checksummed), misc.human_readable_size(checksummed / max(time.time() - start, 1))))
+
+
+def write_manifest(ctx, coll):
+    """Write the BagIt manifest of a collection to its manifest file.
+
+    The manifest is written in blocks while it is generated, instead of
+    being built in memory first.
+
+    :param ctx:  Combined type of a callback and rei struct
+    :param coll: Collection to write manifest of
+    """
+    path = coll + "/" + MANIFEST
+    if data_object.exists(ctx, path):
+        handle = msi.data_obj_open(ctx, 'openFlags=O_WRONLYO_TRUNC++++objPath=' + path, 0)['arguments'][1]
+    else:
+        handle = msi.data_obj_create(ctx, path, '', 0)['arguments'][2]
+
+    try:
+        lines = manifest(ctx, coll)
+        while True:
+            block = "".join(itertools.islice(lines, MANIFEST_WRITE_LINES))
+            if not block:
+                break
+            msi.data_obj_write(ctx, handle, block, 0)
+    finally:
+        msi.data_obj_close(ctx, handle, 0)
+
+    msi.data_obj_chksum(ctx, path, "", irods_types.BytesBuf())
 
 
 def status(ctx, coll):
@@ -53,25 +123,35 @@ def status(ctx, coll):
 
 
 def create(ctx, archive, coll, resource):
+    """Create a BagIt archive of a collection.
+
+    :param ctx:      Combined type of a callback and rei struct
+    :param archive:  Path of the archive to create
+    :param coll:     Collection to archive
+    :param resource: Resource to create the archive on
+
+    :raises Exception: if the archive could not be created
+    """
     # Create manifest file.
     log.write(ctx, "Creating manifest file for data package <{}>".format(coll))
-    data_object.write(ctx, coll + "/manifest-sha256.txt", manifest(ctx, coll))
-    msi.data_obj_chksum(ctx, coll + "/manifest-sha256.txt", "",
-                        irods_types.BytesBuf())
+    write_manifest(ctx, coll)
 
     try:
         # Create archive.
         log.write(ctx, "Creating archive file for data package <{}>".format(coll))
+        start = time.time()
         ret = msi.archive_create(ctx, archive, coll, resource, 0)
-    except Exception:
-        data_object.remove(ctx, coll + "/manifest-sha256.txt")
-        pass
-
-    # Remove manifest file.
-    data_object.remove(ctx, coll + "/manifest-sha256.txt")
+    finally:
+        # Remove manifest file.
+        data_object.remove(ctx, coll + "/" + MANIFEST)
 
     if ret < 0:
         raise Exception("Archive creation failed: {}".format(ret))
+
+    size = data_object.size(ctx, archive) or 0
+    log.write(ctx, "Created archive file for data package <{}>: {} at {}/s".format(
+              coll, misc.human_readable_size(size), misc.human_readable_size(size / max(time.time() - start, 1))))
+
     ctx.iiCopyACLsFromParent(archive, "default")
 
 
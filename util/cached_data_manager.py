@@ -116,7 +116,7 @@ class CachedDataManager(object):
            :param data: data for this key
         """
         cache_keyname = self._get_cache_keyname(keyname)
-        self._get_connection().set(cache_keyname, data)
+        self._get_connection().set(cache_keyname, data, ex=self._get_cache_ttl())
 
     def clear(self, ctx, keyname):
         """Clears cached data for a key if present.
@@ -135,3 +135,11 @@ class CachedDataManager(object):
                      the cache after retrieving data
         """
         return False
+
+    def _get_cache_ttl(self):
+        """This function controls how long cached data remains valid.
+
+           :returns: number of seconds after which cached data expires, or None
+                     if cached data does not expire
+        """
+        return None
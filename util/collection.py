@@ -13,7 +13,9 @@ if sys.version_info > (2, 7):
 import genquery
 import irods_types
 
+import constants
 import data_object
+import misc
 import msi
 
 
@@ -59,6 +61,66 @@ def size(ctx, path):
                                                         genquery.AS_LIST, ctx)), 0)
 
 
+def stats(ctx, path):
+    """Get size, data count, collection count and latest modify time of a collection.
+
+    :param ctx:  Combined type of a callback and rei struct
+    :param path: A collection path
+
+    :returns: Dict with the size in bytes ('size'), number of data objects
+              ('data_count') and subcollections ('collection_count') and the
+              latest modify time of the collection and its contents ('modify_time')
+              as a Unix timestamp
+    """
+    return multi_stats(ctx, [path])[path]
+
+
+def multi_stats(ctx, paths):
+    """Get statistics of multiple collections, using grouped queries.
+
+    Statistics are the same as returned by stats(), but the number of queries
+    depends on the number of collections divided by constants.GENQUERY_CHUNK_SIZE.
+
+    :param ctx:   Combined type of a callback and rei struct
+    :param paths: List of collection paths
+
+    :returns: Dict of collection path -> statistics
+    """
+    result = {path: {'size': 0, 'data_count': 0, 'collection_count': 0, 'modify_time': 0} for path in paths}
+
+    for chunk in misc.chunks(list(result), constants.GENQUERY_CHUNK_SIZE):
+        chunk = set(chunk)
+
+        def containing(coll_name):
+            """Yield the statistics of every requested collection that coll_name is in."""
+            while coll_name not in ('', '/'):
+                if coll_name in chunk:
+                    yield coll_name, result[coll_name]
+                coll_name = coll_name.rsplit('/', 1)[0]
+
+        # Match every collection and its subcollections in one condition,
+        # so that each collection and data object is returned only once.
+        condition = "COLL_NAME " + " || ".join("= '{0}' || like '{0}/%'".format(path) for path in chunk)
+
+        for row in genquery.row_iterator("COLL_NAME, COLL_MODIFY_TIME", condition, genquery.AS_LIST, ctx):
+            for path, coll_stats in containing(row[0]):
+                if path != row[0]:
+                    coll_stats['collection_count'] += 1
+                coll_stats['modify_time'] = max(coll_stats['modify_time'], int(row[1]))
+
+        # Replicas of a data object are adjacent when ordered by data id, only the first is counted.
+        previous_id = None
+        for row in genquery.row_iterator("COLL_NAME, ORDER(DATA_ID), DATA_SIZE, DATA_MODIFY_TIME", condition, genquery.AS_LIST, ctx):
+            for path, coll_stats in containing(row[0]):
+                if row[1] != previous_id:
+                    coll_stats['data_count'] += 1
+                    coll_stats['size'] += int(row[2])
+                coll_stats['modify_time'] = max(coll_stats['modify_time'], int(row[3]))
+            previous_id = row[1]
+
+    return result
+
+
 def data_count(ctx, path, recursive=True):
     """Get a collection's data count.
 
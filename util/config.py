@@ -147,7 +147,8 @@ config = Config(environment=None,
                 vault_copy_multithread_enabled=True,
                 user_max_connections_enabled=False,
                 user_max_connections_number=4,
-                python3_interpreter='/usr/local/bin/python3')
+                python3_interpreter='/usr/local/bin/python3',
+                api_metrics_file=None)
 
 # }}}
 
@@ -26,12 +26,24 @@ PROC_REVISION_CLEANUP      = "revision-cleanup"
 PROC_REVISION_CLEANUP_SCAN = "revision-cleanup-scan"
 """Process names of the revision cleanup jobs. Used by the spooling system"""
 
-SPOOL_PROCESSES = {PROC_REVISION_CLEANUP, PROC_REVISION_CLEANUP_SCAN}
+PROC_MAIL = "mail"
+"""Process name of mails that could not be sent yet. Used by the spooling system"""
+
+PROC_ARCHIVE_STAGING = "archive-staging"
+"""Process name of data package archives that are being staged from tape. Used by the spooling system"""
+
+PROC_ARCHIVE_MIGRATION = "archive-migration"
+"""Process name of data package archives that could not be moved to tape yet. Used by the spooling system"""
+
+SPOOL_PROCESSES = {PROC_REVISION_CLEANUP, PROC_REVISION_CLEANUP_SCAN, PROC_MAIL, PROC_ARCHIVE_STAGING, PROC_ARCHIVE_MIGRATION}
 """Set of process names recognized by the spooling system"""
 
 SPOOL_MAIN_DIRECTORY = "/var/lib/irods/yoda-spool"
 """Directory that is used for storing Yoda batch process spool data on the provider"""
 
+GENQUERY_CHUNK_SIZE = 32
+"""Maximum number of values in a single grouped query condition, e.g. `COLL_NAME in (...)`"""
+
 UUBLOCKLIST = ["._*", ".DS_Store"]
 """ List of file extensions not to be copied to revision"""
 
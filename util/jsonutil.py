@@ -15,6 +15,9 @@ import error
 import log
 import msi
 
+text_type = type(u'')
+"""Type of unicode strings (avoids the Python2-only name in the code below)."""
+
 
 class ParseError(error.UUError):
     """
@@ -56,9 +59,16 @@ def _demote_strings(json_data):
 
     :returns: JSON structure with unicode strings transformed to UTF-8 encoded strings
     """
-    return _fold(json_data,
-                 unicode=lambda x: x.encode('utf-8'),
-                 OrderedDict=lambda x: OrderedDict([(k.encode('utf-8'), v) for k, v in x.items()]))
+    # Not implemented with _fold, since this is called for every API request.
+    t = type(json_data)
+    if t is text_type:
+        return json_data.encode('utf-8')
+    elif t is OrderedDict:
+        return OrderedDict([(k.encode('utf-8'), _demote_strings(v)) for k, v in json_data.iteritems()])
+    elif t is list:
+        return [_demote_strings(v) for v in json_data]
+    else:
+        return json_data
 
 
 def _promote_strings(json_data):
@@ -101,13 +111,26 @@ def parse(text, want_bytes=True):
 
 def dump(data, **options):
     """Dump an object to a JSON string."""
+    options = {'indent': 4} if options == {} else options
+
+    # Fast path: data with only UTF-8 encoded strings (or only ASCII str
+    # mixed with unicode) can be dumped as is.
+    try:
+        text = json.dumps(data, ensure_ascii=False, encoding='utf-8', **options)
+        if type(text) is text_type:
+            return text.encode('utf-8')
+        text.decode('utf-8')  # Check that strings were proper UTF-8.
+        return text
+    except UnicodeDecodeError:
+        pass
+
     # json.dumps seems to not like mixed str/unicode input, so make sure
     # everything is of the same type first.
     data = _promote_strings(data)
     return json.dumps(data,
                       ensure_ascii=False,  # Don't unnecessarily use \u0000 escapes.
                       encoding='utf-8',
-                      **({'indent': 4} if options == {} else options)) \
+                      **options) \
                .encode('utf-8')  # turn unicode json string back into an encoded str
 
 
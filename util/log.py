@@ -1,11 +1,12 @@
 # -*- coding: utf-8 -*-
 """Logging facilities."""
 
-__copyright__ = 'Copyright (c) 2019-2022, Utrecht University'
+__copyright__ = 'Copyright (c) 2019-2024, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
-import inspect
 import sys
+import time
+from contextlib import contextmanager
 
 import rule
 from config import config
@@ -16,6 +17,42 @@ if 'unittest' not in sys.modules:
     # or some mocked object.
     import user
 
+# Maximum number of lines buffered before they are written to the log in buffered mode.
+BUFFER_LINES = 100
+
+# Maximum number of seconds lines are buffered before they are written to the log in buffered mode.
+BUFFER_SECONDS = 5
+
+
+class Logger(object):
+    """Logger with the name of the originating module bound at creation.
+
+    Use as: ``logger = log.Logger(__name__)`` at module level, and ``logger.write(ctx, 'Processed {}', path)``.
+    Arguments are formatted into the message only when it is actually written.
+    """
+
+    def __init__(self, name):
+        self.prefix = '[{}] '.format(name.replace("rules_uu.", ""))
+
+    def write(self, ctx, message, *args):
+        """Write a message to the log, including client name and originating module.
+
+        :param ctx:     Combined type of a callback and rei struct
+        :param message: Message to write to log, optionally a format string
+        :param args:    Arguments to format into the message
+        """
+        _write(ctx, self.prefix + (message.format(*args) if args else message))
+
+    def debug(self, ctx, message, *args):
+        """Write a message to the log, if in a development environment.
+
+        :param ctx:     Combined type of a callback and rei struct
+        :param message: Message to write to log, optionally a format string
+        :param args:    Arguments to format into the message
+        """
+        if config.environment == 'development':
+            _write(ctx, 'DEBUG: ' + self.prefix + (message.format(*args) if args else message))
+
 
 def write(ctx, message):
     """Write a message to the log, including client name and originating module.
@@ -23,9 +60,20 @@ def write(ctx, message):
     :param ctx:     Combined type of a callback and rei struct
     :param message: Message to write to log
     """
-    stack = inspect.stack()[1]
-    module = inspect.getmodule(stack[0])
-    _write(ctx, '[{}] {}'.format(module.__name__.replace("rules_uu.", ""), message))
+    # Only look up the calling frame, rather than inspecting the full stack.
+    module = sys._getframe(1).f_globals.get('__name__', '')
+    _write(ctx, '[{}] {}'.format(module.replace("rules_uu.", ""), message))
+
+
+def _client(ctx):
+    """Get the client name and zone prefix for log lines, cached per context."""
+    # Context attributes are looked up in __dict__ directly, because
+    # missing attributes are forwarded to the callback.
+    client = ctx.__dict__.get('_log_client')
+    if client is None:
+        client = '{{{}#{}}} '.format(*list(user.user_and_zone(ctx)))
+        ctx.__dict__['_log_client'] = client
+    return client
 
 
 def _write(ctx, message):
@@ -35,9 +83,54 @@ def _write(ctx, message):
     :param message: Message to write to log
     """
     if type(ctx) is rule.Context:
-        ctx.writeLine('serverLog', '{{{}#{}}} {}'.format(*list(user.user_and_zone(ctx)) + [message]))
-    else:
-        ctx.writeLine('serverLog', message)
+        message = _client(ctx) + message
+
+        buffer = ctx.__dict__.get('_log_buffer')
+        if buffer is not None:
+            if not buffer:
+                ctx.__dict__['_log_buffer_time'] = time.time()
+            buffer.append(message)
+            if len(buffer) >= BUFFER_LINES or time.time() - ctx.__dict__['_log_buffer_time'] >= BUFFER_SECONDS:
+                _flush(ctx)
+            return
+
+    ctx.writeLine('serverLog', message)
+
+
+def _flush(ctx):
+    """Write buffered log lines to the log in a single call."""
+    buffer = ctx.__dict__.get('_log_buffer')
+    if buffer:
+        ctx.writeLine('serverLog', '\n'.join(buffer))
+        del buffer[:]
+
+
+@contextmanager
+def buffered(ctx):
+    """Buffer log lines written within this context, and write them in batches.
+
+    Reduces the number of writeLine callbacks for jobs that log per object.
+    Buffered lines are written when the buffer is full (BUFFER_LINES), when the
+    oldest line has been buffered for BUFFER_SECONDS, and when leaving the context.
+
+    Note that a batch is a single server log record: only its first line has the
+    server log timestamp and prefix. Every line keeps its own client and module
+    prefix ("{user#zone} [module] "), so match on that when searching the log.
+
+    :param ctx: Combined type of a callback and rei struct
+    """
+    if type(ctx) is not rule.Context or '_log_buffer' in ctx.__dict__:
+        # Not a rule context, or already buffering.
+        yield
+        return
+
+    ctx.__dict__['_log_buffer'] = []
+    try:
+        yield
+    finally:
+        _flush(ctx)
+        del ctx.__dict__['_log_buffer']
+        ctx.__dict__.pop('_log_buffer_time', None)
 
 
 def write_stdout(ctx, message):
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""This file contains functions that implement cached storage of the groups
+   a user is a member of, so that pages that derive their content from group
+   memberships do not query the catalog on every request.
+"""
+
+__copyright__ = 'Copyright (c) 2024, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import json
+
+import genquery
+
+import cached_data_manager
+
+
+class MembershipDataManager(cached_data_manager.CachedDataManager):
+    """Group memberships of users, keyed by 'user#zone'.
+
+    Changes in group membership become visible once the cached memberships expire.
+    """
+
+    TTL = 60
+
+    def get(self, ctx, keyname):
+        """Retrieves data from the cache if possible, otherwise retrieves
+           the original.
+
+           :param ctx:     Combined type of a callback and rei struct
+           :param keyname: name of the user, formatted as 'user#zone'
+
+           :returns:       list of names of groups the user is a member of
+        """
+        return json.loads(super(MembershipDataManager, self).get(ctx, keyname))
+
+    def _get_context_string(self):
+        """ :returns: a string that identifies the particular type of data manager
+
+           :returns: context string for this type of data manager
+        """
+        return "membership"
+
+    def _get_original_data(self, ctx, keyname):
+        """This function is called when data needs to be retrieved from the original
+           (non-cached) location.
+
+           :param ctx:     Combined type of a callback and rei struct
+           :param keyname: name of the user, formatted as 'user#zone'
+
+           :returns:       JSON list of names of groups the user is a member of
+        """
+        user_name, user_zone = keyname.split('#', 1)
+        iter = genquery.row_iterator(
+            "USER_GROUP_NAME",
+            "USER_NAME = '{}' AND USER_ZONE = '{}'".format(user_name, user_zone),
+            genquery.AS_LIST, ctx)
+
+        return json.dumps(sorted(row[0] for row in iter))
+
+    def _should_populate_cache_on_get(self):
+        """This function controls whether the manager populates the cache
+           after retrieving original data.
+
+           :returns: Boolean value that states whether the cache should be populated when original data
+                     is retrieved.
+        """
+        return True
+
+    def _get_cache_ttl(self):
+        """This function controls how long cached data remains valid.
+
+           :returns: number of seconds after which cached memberships expire
+        """
+        return self.TTL
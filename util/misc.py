@@ -21,6 +21,27 @@ def last_run_time_acceptable(coll, found, last_run, config_backoff_time):
     return True
 
 
+def chunks(items, size):
+    """Split an iterable into lists of at most `size` items.
+
+    Used to keep lists of values in grouped queries (e.g. `COLL_NAME in (...)`) bounded.
+
+    :param items: Iterable to split
+    :param size:  Maximum number of items per chunk
+
+    :returns: Generator of lists of items
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+
+    if len(chunk) > 0:
+        yield chunk
+
+
 def human_readable_size(size_bytes):
     if size_bytes == 0:
         return "0 B"
@@ -1,26 +1,56 @@
 # -*- coding: utf-8 -*-
 """Experimental Python/Rule interface code."""
 
-__copyright__ = 'Copyright (c) 2019, Utrecht University'
+__copyright__ = 'Copyright (c) 2019-2024, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
 import json
 from enum import Enum
 
 
+# Callback functions that are counted as GenQuery executions and as further pages of results.
+GENQUERY_EXEC = frozenset(['msiExecGenQuery'])
+GENQUERY_PAGE = frozenset(['msiGetMoreRows'])
+
+# Callback functions that are not counted as msi calls: GenQuery plumbing and logging.
+UNCOUNTED = frozenset(['msiMakeGenQuery', 'msiAddSelectFieldToGenQuery', 'msiAddConditionToGenQuery',
+                       'msiGetContInxFromGenQueryOut', 'msiCloseGenQuery',
+                       'writeLine', 'writeString'])
+
+
 class Context(object):
     """Combined type of a callback and rei struct.
 
     `Context` can be treated as a rule engine callback for all intents and purposes.
     However @rule and @api functions that need access to the rei, can do so through this object.
+
+    When `counters` is set to a dict with 'genquery', 'genquery_pages' and 'msi' keys,
+    GenQuery executions, further pages of GenQuery results and other microservice
+    calls through the callback are counted in it (see api.make()).
     """
     def __init__(self, callback, rei):
         self.callback = callback
         self.rei      = rei
+        self.counters = None
 
     def __getattr__(self, name):
         """Allow accessing the callback directly."""
-        return getattr(self.callback, name)
+        f = getattr(self.callback, name)
+        if self.counters is None or name in UNCOUNTED:
+            return f
+
+        counters = self.counters
+        if name in GENQUERY_EXEC:
+            key = 'genquery'
+        elif name in GENQUERY_PAGE:
+            key = 'genquery_pages'
+        else:
+            key = 'msi'
+
+        def counted(*args):
+            counters[key] += 1
+            return f(*args)
+        return counted
 
 
 class Output(Enum):
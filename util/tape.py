@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""Functions for scheduling data on tape storage managed by DMF.
+
+Archives are staged from tape without waiting for the tape: every call to
+stage() requests the archives that are offline and reports which archives
+are online, so that callers can resume those and retry the others later.
+"""
+
+__copyright__ = 'Copyright (c) 2024, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+ONLINE_STATES = ("DUL", "REG", "INV")
+"""DMF states in which the data is available on disk."""
+
+STAGING_STATES = ("UNM", "MIG")
+"""DMF states in which the data is being moved between disk and tape."""
+
+OFFLINE_STATES = ("OFL", "PAR")
+"""DMF states in which the data has to be requested from tape."""
+
+RETRY_AFTER = 6 * 3600
+"""Number of seconds after which an offline archive is requested from tape again."""
+
+
+class TapeBackend(object):
+    """Interface to the dmattr, dmget and dmput commands of a tape storage system."""
+
+    def states(self, paths):
+        """Get the DMF states of files.
+
+        :param paths: List of physical paths
+
+        :raises Exception: if function has not been implemented in subclass.
+        """
+        raise Exception("States not implemented by TapeBackend.")
+
+    def get(self, paths):
+        """Request files to be staged from tape.
+
+        :param paths: List of physical paths
+
+        :raises Exception: if function has not been implemented in subclass.
+        """
+        raise Exception("Get not implemented by TapeBackend.")
+
+    def put(self, paths):
+        """Request files to be migrated to tape.
+
+        :param paths: List of physical paths
+
+        :raises Exception: if function has not been implemented in subclass.
+        """
+        raise Exception("Put not implemented by TapeBackend.")
+
+
+def parse_states(output, paths):
+    """Parse the output of dmattr for one or more files.
+
+    :param output: Output of dmattr, one state per line in the order of paths
+    :param paths:  List of physical paths passed to dmattr
+
+    :returns: Dict of path -> DMF state (None if unknown), or None if the output does not match the paths
+    """
+    if len(paths) == 1:
+        # Empty output means dmattr failed, so the file is not known to be online.
+        return {paths[0]: output.strip() or None}
+
+    states = [line.strip() for line in output.splitlines() if line.strip()]
+    if len(states) != len(paths):
+        return None
+
+    return dict(zip(paths, states))
+
+
+def stage(jobs, backend, now, retry_after=RETRY_AFTER):
+    """Request offline archives from tape and determine which archives are online.
+
+    Offline archives are requested in one batch. Archives that were requested
+    less than retry_after seconds ago are not requested again.
+
+    :param jobs:        List of dicts with the physical path of an archive ('path') and the time
+                        it was last requested from tape ('requested', None if never)
+    :param backend:     TapeBackend to use
+    :param now:         Current time as a Unix timestamp
+    :param retry_after: Number of seconds after which offline archives are requested again
+
+    :returns: Tuple of lists of jobs that are online, pending and failed, with the
+              DMF state of each job in 'state'
+    """
+    states = backend.states([job["path"] for job in jobs]) if jobs else {}
+    ready, pending, failed, request = [], [], [], []
+
+    for job in jobs:
+        job["state"] = states.get(job["path"])
+
+        if job["state"] in ONLINE_STATES:
+            ready.append(job)
+        elif job["state"] in STAGING_STATES:
+            pending.append(job)
+        elif job["state"] in OFFLINE_STATES:
+            if job.get("requested") is None or now - job["requested"] >= retry_after:
+                job["requested"] = now
+                request.append(job)
+            pending.append(job)
+        else:
+            failed.append(job)
+
+    if request:
+        backend.get([job["path"] for job in request])
+
+    return ready, pending, failed
@@ -106,3 +106,16 @@ def is_valid_schema_id(schema_id):
     if schema_id == "":
         return True
     return re.search(r"^[a-zA-Z0-9\-]+\-[0-9]+$", schema_id) is not None
+
+
+def schema_name_from_id(schema_id):
+    """Get the short name of a schema (e.g. 'default-3') from its schema id.
+
+    :param schema_id: Schema id, e.g. 'https://yoda.uu.nl/schemas/default-3/metadata.json'
+
+    :returns: Short name of the schema, or None if the schema id is missing or not a Yoda schema id
+    """
+    if schema_id is None:
+        return None
+    m = re.match(r'https://yoda.uu.nl/schemas/([^/]+)/metadata.json$', schema_id)
+    return m.group(1) if m else None
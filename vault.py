@@ -453,10 +453,10 @@ def api_vault_system_metadata(ctx, coll):
     system_metadata = {}
 
     # Package size.
-    data_count = collection.data_count(ctx, coll)
-    collection_count = collection.collection_count(ctx, coll)
-    size = collection.size(ctx, coll)
-    size_readable = misc.human_readable_size(size)
+    coll_stats = collection.stats(ctx, coll)
+    data_count = coll_stats['data_count']
+    collection_count = coll_stats['collection_count']
+    size_readable = misc.human_readable_size(coll_stats['size'])
     system_metadata["Data Package Size"] = "{} files, {} folders, total of {}".format(data_count, collection_count, size_readable)
 
     # Modified date.
@@ -1165,29 +1165,47 @@ def set_vault_permissions(ctx, coll, target):
     return True
 
 
-def reader_needs_access(ctx, group_name, coll):
-    """Return if research group has access to this group but readers do not"""
-    iter = genquery.row_iterator(
-        "COLL_ACCESS_USER_ID",
-        "COLL_NAME = '" + coll + "'",
-        genquery.AS_LIST, ctx
-    )
-    reader_found = False
-    research_found = False
+def vault_acl_snapshot(ctx, zone):
+    """Load the ACLs of all vault group collections and vault packages in a few queries.
 
-    for row in iter:
-        user_id = row[0]
-        user_name = user.name_from_id(ctx, user_id)
-        # Check if there are *any* readers
-        if user_name.startswith('read-'):
-            reader_found = True
-        elif user_name == group_name:
-            research_found = True
+    :param ctx:  Combined type of a callback and rei struct
+    :param zone: Zone
+
+    :returns: Dict of vault group collection -> dict of collection path (the vault group
+              collection itself and its vault packages) -> set of names of users and groups with access
+    """
+    user_names = {row[0]: row[1] for row in genquery.row_iterator("USER_ID, USER_NAME", "", genquery.AS_LIST, ctx)}
 
-    return not reader_found and research_found
+    snapshot = {}
+    conditions = [
+        # Vault group collections.
+        "COLL_PARENT_NAME = '/{0}/home' AND COLL_NAME like '/{0}/home/{1}%'".format(zone, constants.IIVAULTPREFIX),
+        # Vault packages directly beneath the vault group collections.
+        "COLL_PARENT_NAME like '/{0}/home/{1}%' AND COLL_PARENT_NAME not like '/{0}/home/{1}%/%'".format(zone, constants.IIVAULTPREFIX)
+    ]
+    for condition in conditions:
+        for row in genquery.row_iterator("COLL_NAME, COLL_ACCESS_USER_ID", condition, genquery.AS_LIST, ctx):
+            vault_path = '/'.join(row[0].split('/')[:4])
+            # ACLs of deleted users may remain in the catalog, these have no name.
+            snapshot.setdefault(vault_path, {}).setdefault(row[0], set()).add(user_names.get(row[1], ''))
 
+    return snapshot
 
-def set_reader_vault_permissions(ctx, group_name, zone, dry_run):
+
+def reader_needs_access(group_name, acl_names):
+    """Return if research group has access to this collection but readers do not
+
+    :param group_name: Research group name
+    :param acl_names:  Names of users and groups with access to the collection
+
+    :returns: Boolean whether readers need to be granted access
+    """
+    # Check if there are *any* readers
+    reader_found = any(name.startswith('read-') for name in acl_names)
+    return not reader_found and group_name in acl_names
+
+
+def set_reader_vault_permissions(ctx, group_name, zone, dry_run, snapshot):
     """Given a research group name, give reader group access to
     vault packages if they don't have that access already.
 
@@ -1195,6 +1213,7 @@ def set_reader_vault_permissions(ctx, group_name, zone, dry_run):
     :param group_name: Research group name
     :param zone:       Zone
     :param dry_run:    Whether to only print which groups would be changed without changing them
+    :param snapshot:   ACL snapshot of vault collections, see vault_acl_snapshot()
 
     :return: Boolean whether completed successfully or there were errors.
     """
@@ -1209,7 +1228,9 @@ def set_reader_vault_permissions(ctx, group_name, zone, dry_run):
     if collection.empty(ctx, vault_path):
         return True
 
-    if reader_needs_access(ctx, group_name, vault_path):
+    acls = snapshot.get(vault_path, {})
+
+    if reader_needs_access(group_name, acls.get(vault_path, set())):
         # Grant the research group readers read-only access to the collection
         # to enable browsing through the vault.
         try:
@@ -1222,14 +1243,8 @@ def set_reader_vault_permissions(ctx, group_name, zone, dry_run):
             no_errors = False
             log.write(ctx, "Failed to grant " + read_group_name + " read access to " + vault_path)
 
-    iter = genquery.row_iterator(
-        "COLL_NAME",
-        "COLL_PARENT_NAME = '{}'".format(vault_path),
-        genquery.AS_LIST, ctx
-    )
-    for row in iter:
-        target = row[0]
-        if reader_needs_access(ctx, group_name, target):
+    for target in sorted(coll for coll in acls if coll != vault_path):
+        if reader_needs_access(group_name, acls[target]):
             try:
                 if dry_run:
                     log.write(ctx, "Would have granted " + read_group_name + " read access to " + target)
@@ -1274,6 +1289,9 @@ def rule_vault_grant_readers_vault_access(ctx, dry_run, verbose):
 
     zone = user.zone(ctx)
 
+    # Load ACLs of all vault collections once, so that grants can be decided in memory.
+    snapshot = vault_acl_snapshot(ctx, zone)
+
     # Get the group names
     userIter = genquery.row_iterator(
         "USER_GROUP_NAME",
@@ -1285,7 +1303,7 @@ def rule_vault_grant_readers_vault_access(ctx, dry_run, verbose):
         name = row[0]
         if verbose:
             log.write(ctx, "{}: checking permissions".format(name))
-        if not set_reader_vault_permissions(ctx, name, zone, dry_run):
+        if not set_reader_vault_permissions(ctx, name, zone, dry_run, snapshot):
             no_errors = False
 
     message = ""
@@ -16,6 +16,7 @@ import meta
 import notifications
 import provenance
 from util import *
+from util.spool import get_spool_data, put_spool_data
 
 __all__ = ['api_vault_archive',
            'api_vault_archival_status',
@@ -23,7 +24,51 @@ __all__ = ['api_vault_archive',
            'rule_vault_archive',
            'rule_vault_create_archive',
            'rule_vault_extract_archive',
-           'rule_vault_update_archive']
+           'rule_vault_update_archive',
+           'rule_vault_process_archives']
+
+
+class DMFTape(tape.TapeBackend):
+    """Tape backend using the dmattr, dmget and dmput rules on the archive host."""
+
+    def __init__(self, ctx):
+        self._ctx = ctx
+
+    def _batches(self, paths):
+        """Split paths in arguments for the DMF commands.
+
+        Arguments are separated by spaces, so paths containing whitespace are
+        passed on their own.
+        """
+        plain = [path for path in paths if len(path.split()) == 1]
+        if plain:
+            yield plain, ' '.join(plain)
+        for path in paths:
+            if path not in plain:
+                yield [path], path
+
+    def _dmattr(self, paths, argument):
+        return tape.parse_states(self._ctx.dmattr(argument, config.data_package_archive_fqdn, "")["arguments"][2], paths)
+
+    def states(self, paths):
+        result = {}
+        for batch, argument in self._batches(paths):
+            states = self._dmattr(batch, argument)
+            if states is None:
+                # Output could not be matched to the paths, ask for every path separately.
+                states = {}
+                for path in batch:
+                    states.update(self._dmattr([path], path))
+            result.update(states)
+        return result
+
+    def get(self, paths):
+        for _, argument in self._batches(paths):
+            self._ctx.dmget(argument, config.data_package_archive_fqdn, "OFL")
+
+    def put(self, paths):
+        for _, argument in self._batches(paths):
+            self._ctx.dmput(argument, config.data_package_archive_fqdn, "REG")
 
 
 def package_system_metadata(ctx, coll):
@@ -91,7 +136,7 @@ def vault_archivable(ctx, coll):
                                           "META_COLL_ATTR_NAME = 'org_vault_status' AND COLL_NAME = '{}'".format(coll),
                                           genquery.AS_LIST,
                                           ctx):
-            coll_size = collection.size(ctx, coll)
+            coll_size = collection.stats(ctx, coll)['size']
 
             # Data package size is inside archive limits.
             if ((coll_size >= minimum and maximum < 0)
@@ -117,28 +162,24 @@ def create_archive(ctx, coll):
     data_object.copy(ctx, user_metadata, coll + "/archive/user-metadata.json")
     data_object.write(ctx, coll + "/archive/system-metadata.json",
                       jsonutil.dump(system_metadata))
-    msi.data_obj_chksum(ctx, coll + "/archive/system-metadata.json", "",
-                        irods_types.BytesBuf())
     data_object.write(ctx, coll + "/archive/provenance-log.json",
                       jsonutil.dump(provenance_log))
-    msi.data_obj_chksum(ctx, coll + "/archive/provenance-log.json", "",
-                        irods_types.BytesBuf())
 
     # create bagit archive
     bagit.create(ctx, coll + "/archive.tar", coll + "/archive", config.data_package_archive_resource)
     msi.data_obj_chksum(ctx, coll + "/archive.tar", "", irods_types.BytesBuf())
-    log.write(ctx, "Move archive of data package <{}> to tape".format(coll))
-    ctx.dmput(package_archive_path(ctx, coll), config.data_package_archive_fqdn, "REG")
 
 
-def extract_archive(ctx, coll):
-    while True:
-        state = ctx.dmattr(package_archive_path(ctx, coll), config.data_package_archive_fqdn, "")["arguments"][2]
-        if state not in ("UNM", "MIG"):
-            break
-        time.sleep(10)
+def extract_archive(ctx, coll, state):
+    """Extract the archive of a data package that has been staged from tape.
 
-    if state not in ("DUL", "REG", "INV"):
+    :param ctx:   Combined type of a callback and rei struct
+    :param coll:  Collection of vault data package
+    :param state: DMF state of the archive
+
+    :raises Exception: if the archive is not available on disk
+    """
+    if state not in tape.ONLINE_STATES:
         log.write(ctx, "Archive of data package <{}> is not available, state is <{}>".format(coll, state))
         raise Exception("Archive is not available")
 
@@ -209,7 +250,6 @@ def vault_unarchive(ctx, actor, coll):
         avu.set_on_coll(ctx, coll, constants.IIARCHIVEATTRNAME, "extract")
         provenance.log_action(ctx, actor, coll, "unarchive scheduled", False)
         log.write(ctx, "Request retrieval of data package <{}> from tape".format(coll))
-        ctx.dmget(package_archive_path(ctx, coll), config.data_package_archive_fqdn, "OFL")
 
         # Send notifications to datamanagers.
         datamanagers = folder.get_datamanagers(ctx, coll)
@@ -226,14 +266,14 @@ def vault_unarchive(ctx, actor, coll):
         return "Failure"
 
 
-def vault_extract_archive(ctx, coll):
+def vault_extract_archive(ctx, coll, state):
     if vault_archival_status(ctx, coll) != "extract":
         return "Invalid"
     try:
         log.write(ctx, "Start unarchival of data package <{}>".format(coll))
         avu.set_on_coll(ctx, coll, constants.IIARCHIVEATTRNAME, "extracting")
 
-        extract_archive(ctx, coll)
+        extract_archive(ctx, coll, state)
         collection.rename(ctx, coll + "/archive/data", coll + "/original")
         ctx.iiCopyACLsFromParent(coll + "/original", "recursive")
         collection.remove(ctx, coll + "/archive")
@@ -255,15 +295,16 @@ def vault_extract_archive(ctx, coll):
 def update(ctx, coll, attr):
     if pathutil.info(coll).space == pathutil.Space.VAULT and attr not in (constants.IIARCHIVEATTRNAME, constants.UUPROVENANCELOG) and vault_archival_status(ctx, coll) == "archived":
         avu.set_on_coll(ctx, coll, constants.IIARCHIVEATTRNAME, "update")
-        ctx.dmget(package_archive_path(ctx, coll), config.data_package_archive_fqdn, "OFL")
 
 
-def vault_update_archive(ctx, coll):
+def vault_update_archive(ctx, coll, state):
+    if vault_archival_status(ctx, coll) != "update":
+        return "Invalid"
     try:
         log.write(ctx, "Start update of archived data package <{}>".format(coll))
         avu.set_on_coll(ctx, coll, constants.IIARCHIVEATTRNAME, "updating")
 
-        extract_archive(ctx, coll)
+        extract_archive(ctx, coll, state)
         data_object.remove(ctx, coll + "/archive.tar")
 
         create_archive(ctx, coll)
@@ -279,6 +320,100 @@ def vault_update_archive(ctx, coll):
         return "Failure"
 
 
+def vault_process_archives(ctx, packages, complete=False):
+    """Process data packages scheduled for archival, extraction or update in one batch.
+
+    New archives are moved to tape in one batch. Archives that could not be
+    moved are kept in the migration spool and retried by a later run.
+    Archives to extract or update are requested from tape in one batch.
+    Packages whose archive is not online yet are kept in the staging spool
+    and resumed by a later run, instead of waiting for the tape.
+
+    :param ctx:      Combined type of a callback and rei struct
+    :param packages: List of (collection, action) tuples, with action one of
+                     'archive', 'extract' and 'update'
+    :param complete: Whether packages contains all scheduled packages, so that staging
+                     of archives of other packages can be discarded
+
+    :returns: Dict of collection -> status of the package, 'Pending' if its archive is not online yet
+    """
+    with provenance.batch(ctx):
+        return _process_archives(ctx, packages, complete)
+
+
+def _process_archives(ctx, packages, complete):
+    """Process archive jobs, see vault_process_archives()."""
+    backend = DMFTape(ctx)
+    result = {}
+    to_tape = []
+
+    for coll, action in packages:
+        if action == "archive":
+            result[coll] = vault_create_archive(ctx, coll)
+            if result[coll] == "Success":
+                to_tape.append(coll)
+
+    # Resume staging of archives requested by earlier runs.
+    staging = {}
+    while True:
+        job = get_spool_data(constants.PROC_ARCHIVE_STAGING)
+        if job is None:
+            break
+        staging[job["coll"]] = job
+
+    jobs = []
+    for coll, action in packages:
+        if action in ("extract", "update"):
+            job = staging.get(coll) or {"coll": coll, "path": package_archive_path(ctx, coll), "requested": None}
+            job["action"] = action
+            jobs.append(job)
+
+    try:
+        ready, pending, failed = tape.stage(jobs, backend, int(time.time()))
+    except Exception as e:
+        # Put the drained jobs back, so that their request times are kept.
+        # The packages are still scheduled, so they are retried by a later run.
+        log.write(ctx, "Could not request states of archives from tape: {}".format(e))
+        put_spool_data(constants.PROC_ARCHIVE_STAGING, list(staging.values()))
+        ready, failed = [], []
+        for job in jobs:
+            result[job["coll"]] = "Pending"
+    else:
+        for job in pending:
+            result[job["coll"]] = "Pending"
+        if not complete:
+            pending += [job for coll, job in staging.items() if coll not in result]
+        put_spool_data(constants.PROC_ARCHIVE_STAGING, pending)
+
+    # Failed jobs are processed as well, so that their status reflects the failure.
+    for job in ready + failed:
+        if job["action"] == "extract":
+            result[job["coll"]] = vault_extract_archive(ctx, job["coll"], job["state"])
+        else:
+            result[job["coll"]] = vault_update_archive(ctx, job["coll"], job["state"])
+            if result[job["coll"]] == "Success":
+                to_tape.append(job["coll"])
+
+    # Retry moving archives to tape that failed in earlier runs.
+    while True:
+        job = get_spool_data(constants.PROC_ARCHIVE_MIGRATION)
+        if job is None:
+            break
+        if job["coll"] not in to_tape and vault_archival_status(ctx, job["coll"]) == "archived":
+            to_tape.append(job["coll"])
+
+    if to_tape:
+        log.write(ctx, "Move archives of {} data package(s) to tape".format(len(to_tape)))
+        try:
+            backend.put([package_archive_path(ctx, coll) for coll in to_tape])
+        except Exception as e:
+            for coll in to_tape:
+                log.write(ctx, "Archive of data package <{}> could not be moved to tape, retrying in a later run: {}".format(coll, e))
+            put_spool_data(constants.PROC_ARCHIVE_MIGRATION, [{"coll": coll} for coll in to_tape])
+
+    return result
+
+
 @api.make()
 def api_vault_archive(ctx, coll):
     """Request to archive vault data package.
@@ -353,14 +488,38 @@ def rule_vault_archive(ctx, actor, coll, action):
 
 @rule.make(inputs=[0], outputs=[1])
 def rule_vault_create_archive(ctx, coll):
-    return vault_create_archive(ctx, coll)
+    return vault_process_archives(ctx, [(coll, "archive")])[coll]
 
 
 @rule.make(inputs=[0], outputs=[1])
 def rule_vault_extract_archive(ctx, coll):
-    return vault_extract_archive(ctx, coll)
+    return vault_process_archives(ctx, [(coll, "extract")])[coll]
 
 
 @rule.make(inputs=[0], outputs=[1])
 def rule_vault_update_archive(ctx, coll):
-    return vault_update_archive(ctx, coll)
+    return vault_process_archives(ctx, [(coll, "update")])[coll]
+
+
+@rule.make(inputs=[], outputs=[0])
+def rule_vault_process_archives(ctx):
+    """Process all data packages scheduled for archival, extraction or update.
+
+    :param ctx: Combined type of a callback and rei struct
+
+    :returns: Number of packages processed, not counting packages waiting for tape
+    """
+    if user.user_type(ctx) != 'rodsadmin':
+        log.write(ctx, "Vault archive - Insufficient permissions - should only be called by rodsadmin")
+        return 0
+
+    packages = [(row[0], row[1]) for row in genquery.row_iterator(
+                "COLL_NAME, META_COLL_ATTR_VALUE",
+                "META_COLL_ATTR_NAME = '{}' AND META_COLL_ATTR_VALUE in ('archive', 'extract', 'update')".format(constants.IIARCHIVEATTRNAME),
+                genquery.AS_LIST, ctx)]
+
+    result = vault_process_archives(ctx, packages, complete=True)
+    for coll, status in sorted(result.items()):
+        log.write(ctx, "Vault archive - {}: {}".format(coll, status))
+
+    return len([status for status in result.values() if status != "Pending"])